@@ -9,30 +9,58 @@ written by Henning Jacobs <henning@jacobs1.de>
 
 from __future__ import print_function
 
+__version__ = '0.8.2'
+
 try:
     from StringIO import StringIO
     BytesIO = StringIO
 except ImportError:
     # Python 3
     from io import StringIO, BytesIO
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from multiprocessing.pool import ThreadPool
 
-from tempfile import NamedTemporaryFile
-from xml.etree.ElementTree import ElementTree
+from xml.etree.ElementTree import iterparse
 from xml.etree.ElementTree import fromstring as xmlfromstring
 import argparse
+import ast
+import atexit
+import codecs
 import contextlib
 import csv
 import fnmatch
+import hashlib
+import importlib
+import io
+import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
+import resource
+import signal
+import socket
+import struct
 import subprocess
 import sys
+import tarfile
 import tempfile
+import threading
+import time
+import tokenize
+import traceback
 import shutil
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # Python 2 with the scandir backport
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 if sys.version_info.major == 2:
     # Pythontidy is only supported on Python2
     from pythontidy import PythonTidy
@@ -41,12 +69,107 @@ running_on_py3 = sys.version_info.major == 3
 
 
 NOT_SPACE = re.compile('[^ ]')
+# glob patterns matching by file extension only, e.g. "*.py"
+EXTENSION_GLOB = re.compile(r'^\*(\.[^*?\[]+)$')
+# maximum number of glob patterns combined into one regex by GlobMatcher
+GLOB_REGEX_GROUPS = 90
 
 TRAILING_WHITESPACE_CHARS = set([b' ', b'\t'])
+UTF8_BOM = b'\xef\xbb\xbf'
 INDENTATION = '    '
 
 DEFAULT_CONFIG_PATHS = ['~/.codevalidatorrc', '/etc/codevalidatorrc']
 
+# number of files validated together (handed to a worker process at once with -j), rules with a _batch_ function
+# (e.g. jalopy) run their external tool only once per batch
+BATCH_SIZE = 32
+
+# rules whose fixer writes bytes (the others write native strings), streamed into a temporary file next to the fixed
+# file (see fix_file)
+BYTES_FIXES = set(['jalopy', 'xmlfmt'])
+
+# number of batches per worker process submitted ahead of the results merged in order (see _run_jobs)
+JOBS_AHEAD = 2
+
+# maximum number of bytes of file paths passed to one run of an external linter (see lint_sources)
+ARGV_MAX_BYTES = 128 * 1024
+
+# "<line>:<column>: <message>" (column is optional) following the file path in the output of linters
+LOCATION_MESSAGE = re.compile(r'^(\d+):(?:(\d+):)? ?(.*)$')
+
+# files on disk of at least this size are only read into memory when a rule needs all contents at once, the others
+# read them in chunks of CHUNK_SIZE bytes (see SourceFile)
+LARGE_FILE_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# JSON files of at least this size are checked by the streaming syntax check (see json_syntax_error) in constant
+# memory instead of json.loads, whose objects take about 10x the file size. Measured for an array of small nested
+# records: json.loads 0.2s/+80 MB (8 MB file), 2.5s/+650 MB (64 MB), streaming 2.1s and 16s in constant memory.
+# Streaming is 2-10x slower (depending on the nesting), so it is only used where the memory matters
+JSON_STREAM_SIZE = 32 * 1024 * 1024
+
+# XML files of at least this size are pretty-printed by streaming (see _fix_xmlfmt_stream)
+XML_STREAM_SIZE = 8 * 1024 * 1024
+# number of children of the root element serialized at once by the streaming pretty-printer
+XML_STREAM_BATCH = 256
+
+# implicitly typed YAML scalars constructed by the syntax check (constructor method by tag), scalars with the other
+# tags cannot fail to construct (see _needs_yaml_loading)
+YAML_CONSTRUCTORS = {
+    'tag:yaml.org,2002:float': 'construct_yaml_float',
+    'tag:yaml.org,2002:int': 'construct_yaml_int',
+    'tag:yaml.org,2002:timestamp': 'construct_yaml_timestamp',
+}
+YAML_PLAIN_TAGS = frozenset(['tag:yaml.org,2002:bool', 'tag:yaml.org,2002:null', 'tag:yaml.org,2002:str'])
+# YAML documents nested deeper are loaded by the syntax check
+YAML_NESTING_LIMIT = 64
+
+# number of bytes read at once by the streaming JSON syntax check, and kept at least to match a token
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_LOOKAHEAD = 16
+
+JSON_WHITESPACE = br'[ \t\n\r]*'
+# (unrolled, i.e. without backtracking on unterminated strings)
+JSON_STRING = br'"[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"'
+# numbers and literals (including the non-standard ones accepted by the json module)
+JSON_SCALAR = br'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null|NaN|Infinity|-Infinity'
+
+
+def _json_value_pattern(depth):
+    '''return the regex pattern of JSON values with at most depth levels of nested arrays and objects'''
+
+    if depth == 0:
+        return b'(?:' + JSON_STRING + b'|' + JSON_SCALAR + b')'
+    value = _json_value_pattern(depth - 1)
+    member = JSON_STRING + JSON_WHITESPACE + b':' + JSON_WHITESPACE + value
+    return (b'(?:' + JSON_STRING + b'|' + JSON_SCALAR + b'|\\[' + JSON_WHITESPACE + b'(?:' + value + JSON_WHITESPACE +
+            b'(?:,' + JSON_WHITESPACE + value + JSON_WHITESPACE + b')*)?\\]|\\{' + JSON_WHITESPACE + b'(?:' + member +
+            JSON_WHITESPACE + b'(?:,' + JSON_WHITESPACE + member + JSON_WHITESPACE + b')*)?\\})')
+
+# the streaming JSON syntax check matches whole values and runs of array items or object members (each followed
+# by a comma) at once, only deeper nested or larger values are checked token by token (compiled on first use)
+JSON_VALUE = _json_value_pattern(2)
+JSON_ITEMS = b'(?:' + JSON_WHITESPACE + JSON_VALUE + JSON_WHITESPACE + b',)*'
+JSON_MEMBERS = (b'(?:' + JSON_WHITESPACE + JSON_STRING + JSON_WHITESPACE + b':' + JSON_WHITESPACE + JSON_VALUE +
+                JSON_WHITESPACE + b',)*')
+
+# error message for the expected next token of the streaming JSON syntax check
+JSON_EXPECTED = {
+    'value': 'Expecting value',
+    'value_or_close': 'Expecting value',
+    'key': 'Expecting property name enclosed in double quotes',
+    'key_or_close': 'Expecting property name enclosed in double quotes',
+    'colon': "Expecting ':' delimiter",
+    'comma_or_close': "Expecting ',' delimiter",
+    'end': 'Extra data',
+}
+
+# seconds to wait for a started nailgun server to accept connections
+NAILGUN_START_TIMEOUT = 30
+
+# minimum number of seconds between two evictions of least recently used result cache entries
+CACHE_PRUNE_INTERVAL = 3600
+
 DEFAULT_RULES = [
     'utf8',
     'nobom',
@@ -55,6 +178,9 @@ DEFAULT_RULES = [
     'notrailingws',
 ]
 
+# rules computed together by a single scan of the file contents (scan_bytes)
+SCANNED_RULES = frozenset(['utf8', 'nobom', 'notabs', 'nocr', 'notrailingws'])
+
 DEFAULT_CONFIG = {
     'exclude_dirs': ['.svn', '.git'],
     'exclude_files': ['.*.swp'],
@@ -98,6 +224,18 @@ DEFAULT_CONFIG = {
     'options': {'phpcs': {'standard': 'PSR', 'encoding': 'UTF-8'}, 'pep8': {'max_line_length': 120, 'ignore': 'N806',
                 'passes': 5}, 'jalopy': {'classpath': '/opt/jalopy/lib/jalopy-1.9.4.jar:/opt/jalopy/lib/jh.jar'}},
     'dir_rules': {'db_diffs': ['sql_diff_dir', 'sql_diff_sql'], 'database': ['database_dir']},
+    'cache_dir': None,
+    'cache_size': 64 * 1024 * 1024,
+    'index_file': None,
+    'ignore_files': ['.gitignore', '.cvignore'],
+    'use_ignore_files': False,
+    # number of files validated concurrently by each process (while external tools run)
+    'threads': 4,
+    # maximum number of concurrently running processes of an external tool (over all jobs), e.g. {"java": 4}
+    'tool_limits': {'java': 4},
+    # limits of each external tool process by rule ("*" for all rules): wall-clock "timeout" in seconds,
+    # "memory" (address space) in bytes and "cpu" time in seconds, e.g. {"puppet": {"timeout": 60, "cpu": 30}}
+    'rule_limits': {'*': {'timeout': 600}},
     'create_backup': True,
     'backup_filename': '.{original}.pre-cvfix',
     'verbose': 0,
@@ -107,6 +245,37 @@ DEFAULT_CONFIG = {
 
 CONFIG = DEFAULT_CONFIG
 
+# external tool (command line printing its version) or Python module used by a rule,
+# its version is part of the result cache key
+TOOL_VERSIONS = {
+    'coffeelint': ['coffeelint', '--version'],
+    'erb': ['ruby', '--version'],
+    'jshint': ['jshint', '--version'],
+    'pep8': 'pep8',
+    'phpcs': ['phpcs', '--version'],
+    'puppet': ['puppet', '--version'],
+    'pyflakes': 'pyflakes',
+    'rubocop': ['rubocop', '--version'],
+    'ruby': ['ruby', '--version'],
+    'sql_semi_colon': 'sqlparse',
+    'xmlfmt': 'lxml.etree',
+    'yaml': 'yaml',
+}
+
+# rules whose result does not only depend on the file contents (rubocop reads .rubocop.yml files)
+UNCACHED_RULES = set(['rubocop'])
+
+# implementations (modules) of the parsers used by rules, the fastest first; the last one is the reference whose
+# results and error messages are reported. A faster parser may only decide documents it accepts exactly like the
+# reference: expat (without building a tree) does for XML without DOCTYPE. orjson, lxml and LibYAML do not (they
+# differ for deep nesting, multibyte encodings, names and many YAML details), so JSON is parsed by the json module (with
+# its C scanner if compiled) and YAML by the pure Python parser of PyYAML
+PARSER_BACKENDS = OrderedDict([
+    ('json', ['json']),
+    ('xml', ['xml.parsers.expat', 'xml.etree.ElementTree']),
+    ('yaml', ['yaml']),
+])
+
 # base directory where we can find our config folder
 # NOTE: to support symlinking codevalidator.py into /usr/local/bin/
 # we use realpath to resolve the symlink back to our base directory
@@ -114,6 +283,51 @@ BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
 STDIN_CONTENTS = None
 
+# results of batched rules for the current batch of files, keyed by rule, file name and digest of the contents
+BATCH_RESULTS = {}
+
+NAILGUN_POOL = None
+
+# semaphore limiting the concurrently running processes for each external tool with a limit (see tool_limits)
+TOOL_SLOTS = None
+
+# processes of the external tools running in this process (see run_tool), killed when it is interrupted
+RUNNING_TOOLS = set()
+
+# (process ID, ThreadPool) validating the files of a batch concurrently
+THREAD_POOL = None
+
+# pep8.StyleGuide for each set of pep8 rule options (see get_pep8_style)
+PEP8_STYLES = {}
+
+# port of the managed nailgun server to run Jalopy on in this process (see NailgunPool)
+NAILGUN_PORT = None
+
+# ports of the nailgun servers managed by the server process (see serve), used by the request handlers
+NAILGUN_PORTS = None
+
+# configuration file loaded by the server process (see serve), requests without -c do not read the default ones again
+SERVER_CONFIG = None
+
+RESULT_CACHE = None
+
+FILE_INDEX = None
+
+# configuration options which do not influence validation results (not part of the FileIndex configuration digest)
+RUNTIME_OPTIONS = set([
+    'backup_filename',
+    'cache_dir',
+    'cache_size',
+    'create_backup',
+    'filter_mode',
+    'index_file',
+    'quiet',
+    'rule_limits',
+    'threads',
+    'tool_limits',
+    'verbose',
+])
+
 
 class BaseException(Exception):
 
@@ -138,775 +352,3066 @@ class ExecutionError(BaseException):
     pass
 
 
-def indent_xml(elem, level=0):
-    """xmlindent from http://infix.se/2007/02/06/gentlemen-indent-your-xml"""
-
-    i = '\n' + level * INDENTATION
-    if len(elem):
-        if not elem.text or not elem.text.strip():
-            elem.text = i + INDENTATION
-        for e in elem:
-            indent_xml(e, level + 1)
-            if not e.tail or not e.tail.strip():
-                e.tail = i + INDENTATION
-        if not e.tail or not e.tail.strip():
-            e.tail = i
-    else:
-        if level and (not elem.tail or not elem.tail.strip()):
-            elem.tail = i
-
-
-def message(msg):
-    """simple decorator to attach a error message to a validation function"""
-
-    def wrap(f):
-        f.message = msg
-        return f
+class ToolTimeoutError(ExecutionError):
 
-    return wrap
+    '''external tool killed after exceeding its timeout (see rule_limits), only fails the current rule'''
 
+    pass
 
-def is_python3(fd):
-    '''check first line of file object whether it contains "python3" (shebang)'''
 
-    line = fd.readline()
-    fd.seek(0)
-    return b'python3' in line
+class ResultCache(object):
 
+    '''persistent cache of rule results, stored as one JSON file per key below path
 
-@message('has invalid file path (file name or extension is not allowed)')
-def _validate_invalidpath(fd):
-    return False
+    Entries are written atomically (temporary file + rename), so multiple (parallel) runs can share the cache.
+    The modification time of an entry is updated on every hit, prune() evicts the least recently used entries.
+    '''
 
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
 
-@message('contains tabs')
-def _validate_notabs(fd):
-    '''
-    >>> _validate_notabs(BytesIO(b'foo'))
-    True
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
 
-    >>> _validate_notabs(BytesIO(b'a\\tb'))
-    False
-    '''
-    return b'\t' not in fd.read()
+    def get(self, key):
+        fn = self._entry_path(key)
+        try:
+            with open(fn, 'rb') as fd:
+                entry = json.loads(fd.read().decode('utf-8'))
+            os.utime(fn, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, key, entry):
+        fn = self._entry_path(key)
+        dirname = os.path.dirname(fn)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        except OSError:
+            # directory was created by a concurrent run
+            pass
+        try:
+            fd, tmp_fn = tempfile.mkstemp(prefix='.tmp', dir=dirname)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(json.dumps(entry).encode('utf-8'))
+                os.rename(tmp_fn, fn)
+            except:
+                os.unlink(tmp_fn)
+                raise
+        except (IOError, OSError) as e:
+            logging.warning('Failed to write result cache entry %s: %s', fn, e)
+
+    def prune(self):
+        '''evict least recently used entries until the cache is not larger than max_size bytes
+
+        Walking the cache is expensive, so this is done at most every CACHE_PRUNE_INTERVAL seconds.
+        '''
+
+        stamp = os.path.join(self.path, '.last-prune')
+        try:
+            if time.time() - os.path.getmtime(stamp) < CACHE_PRUNE_INTERVAL:
+                return
+        except OSError:
+            pass
+        if not os.path.isdir(self.path):
+            return
+        with open(stamp, 'wb'):
+            pass
+        entries = []
+        total_size = 0
+        for root, dirnames, filenames in os.walk(self.path):
+            for fn in filenames:
+                path = os.path.join(root, fn)
+                if path == stamp:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total_size += st.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total_size -= size
 
 
-def _fix_notabs(src, dst):
-    original = src.read()
-    fixed = original.replace(b'\t', b' ' * 4)
-    dst.write(fixed.decode())
+def get_result_cache():
+    '''return the ResultCache configured by the "cache_dir" option (None if caching is disabled)'''
 
+    global RESULT_CACHE
+    if RESULT_CACHE is None and CONFIG.get('cache_dir'):
+        RESULT_CACHE = ResultCache(os.path.expanduser(CONFIG['cache_dir']), CONFIG.get('cache_size'))
+    return RESULT_CACHE
 
-@message('contains carriage return (CR)')
-def _validate_nocr(fd):
-    return b'\r' not in fd.read()
 
+_TOOL_VERSIONS = {}
 
-def _fix_nocr(src, dst):
-    original = src.read()
-    fixed = original.replace(b'\r', b'')
-    dst.write(fixed.decode())
 
+def _tool_version(rule):
+    '''return version of the external tool or Python module used by rule (None if unknown)'''
 
-@message('is not UTF-8 encoded')
-def _validate_utf8(fd):
-    '''
-    >>> _validate_utf8(BytesIO(b'foo'))
-    True
+    if rule not in _TOOL_VERSIONS:
+        tool = TOOL_VERSIONS.get(rule)
+        version = None
+        try:
+            if isinstance(tool, list):
+                po = subprocess.Popen(tool, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                version = po.communicate()[0].decode('utf-8', 'replace').strip()
+            elif tool:
+                version = getattr(importlib.import_module(tool), '__version__', None)
+        except Exception:
+            # the rule itself will fail if its tool is not available
+            pass
+        _TOOL_VERSIONS[rule] = version
+    return _TOOL_VERSIONS[rule]
+
+
+class FileIndex(object):
+
+    '''stat-based index of validated files and their errors (similar to GIT's index)
+
+    Files whose size, modification time and inode did not change since they were recorded are not read again,
+    their recorded errors are reported instead. Entries of files modified at or after the time the index was written
+    are "racily clean", for them the digest of the contents is compared.
+    All entries are discarded if the configuration or the codevalidator version changes, entries of deleted files
+    when the index is saved.
     '''
-    try:
-        fd.read().decode('utf-8')
-    except UnicodeDecodeError:
-        return False
-    return True
 
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        # files validated in this run
+        self.seen = set()
+        # files with a modification time not before this (the index file's mtime) are racily clean
+        self.racy_limit = 0
+        self.signature = [__version__, _config_digest()]
+        try:
+            with open(path, 'rb') as fd:
+                data = json.loads(fd.read().decode('utf-8'))
+            if data.get('signature') == self.signature:
+                self.entries = data['entries']
+                self.racy_limit = _mtime_ns(os.stat(path))
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    def update(self, fname, entry):
+        self.seen.add(fname)
+        if entry:
+            self.entries[fname] = entry
+        else:
+            self.entries.pop(fname, None)
 
-@message('is not ASCII encoded')
-def _validate_ascii(fd):
-    try:
-        fd.read().decode('ascii')
-    except UnicodeDecodeError:
-        return False
-    return True
+    def save(self):
+        '''write the index atomically (temporary file + rename) without the entries of deleted files'''
 
+        for fname in set(self.entries) - self.seen:
+            # files not validated in this run (e.g. validating only some files) are kept while they exist
+            if not os.path.exists(fname):
+                del self.entries[fname]
+        fd, tmp_fn = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps({'signature': self.signature, 'entries': self.entries}).encode('utf-8'))
+            os.rename(tmp_fn, self.path)
+        except:
+            os.unlink(tmp_fn)
+            raise
 
-@message('has UTF-8 byte order mark (BOM)')
-def _validate_nobom(fd):
-    return not fd.read(3).startswith(b'\xef\xbb\xbf')
 
+def get_file_index():
+    '''return the FileIndex configured by the "index_file" option (None if disabled)'''
 
-@message('contains invalid indentation (not 4 spaces)')
-def _validate_indent4(fd):
-    for line in fd:
-        g = NOT_SPACE.search(line)
-        if g and g.start(0) % 4 != 0:
-            if g.group(0) == '*' and g.start(0) - 1 % 4 == 0:
-                # hack to exclude block comments aligned on "*"
-                pass
-            else:
-                return False
-    return True
+    global FILE_INDEX
+    if FILE_INDEX is None and CONFIG.get('index_file'):
+        FILE_INDEX = FileIndex(os.path.expanduser(CONFIG['index_file']))
+    return FILE_INDEX
 
 
-@message('contains lines with trailing whitespace')
-def _validate_notrailingws(fd):
-    '''
-    >>> _validate_notrailingws(BytesIO(b''))
-    True
+def _config_digest():
+    '''SHA-1 hex digest of all configuration options influencing validation results'''
 
-    >>> _validate_notrailingws(BytesIO(b'a '))
-    False
-    '''
-    for line in fd:
-        if line.rstrip(b'\n\r')[-1:] in TRAILING_WHITESPACE_CHARS:
-            return False
-    return True
+    config = dict((key, val) for key, val in CONFIG.items() if key not in RUNTIME_OPTIONS)
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
 
 
-def _fix_notrailingws(src, dst):
-    for line in src:
-        dst.write(line.rstrip())
-        dst.write('\n')
+def _mtime_ns(st):
+    '''modification time of a stat result in nanoseconds (Python 2 has no st_mtime_ns)'''
 
+    if hasattr(st, 'st_mtime_ns'):
+        return st.st_mtime_ns
+    return int(st.st_mtime * 1000000000)
 
-@message('is not well-formatted (pretty-printed) XML')
-def _validate_xmlfmt(fd):
-    source = StringIO(fd.read())
-    formatted = StringIO()
-    _fix_xmlfmt(source, formatted)
-    return source.getvalue() == formatted.getvalue()
 
+def _digest(data):
+    '''SHA-1 hex digest of the given file contents'''
 
-@message('is not valid XML')
-def _validate_xml(fd):
-    tree = ElementTree()
-    try:
-        tree.parse(fd)
-    except Exception as e:
-        _detail('%s: %s' % (e.__class__.__name__, e))
-        return False
-    return True
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
 
 
-def _fix_xmlfmt(src, dst):
-    from lxml import etree
-    parser = etree.XMLParser(resolve_entities=False)
-    tree = etree.parse(src, parser)
-    indent_xml(tree.getroot())
-    tree.write(dst, encoding='utf-8', xml_declaration=True)
-    dst.write('\n')
+def _digest_chunks(chunks):
+    '''SHA-1 hex digest of the file contents given in chunks (like _digest of the joined chunks)'''
 
+    sha = hashlib.sha1()
+    for chunk in chunks:
+        sha.update(chunk)
+    return sha.hexdigest()
 
-@message('is not valid JSON')
-def _validate_json(fd):
-    '''
-    >>> _validate_json(BytesIO(b''))
-    False
 
-    >>> _validate_json(BytesIO(b'""'))
-    True
+def _cache_key(digest, rule, options):
     '''
-    try:
-        json.loads(fd.read().decode('utf-8'))
-    except Exception as e:
-        _detail('%s: %s' % (e.__class__.__name__, e))
-        return False
-    return True
+    >>> len(_cache_key('da39a3ee5e6b4b0d3255bfef95601890afd80709', 'invalidpath', None))
+    40
+    '''
+    key = json.dumps([__version__, digest, rule, options, _tool_version(rule)], sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
 
-@message('is not valid YAML')
-def _validate_yaml(fd):
-    '''
-    >>> _validate_yaml(BytesIO(b'a: b'))
-    True
+def _glob_regex(pattern):
+    '''translate a glob pattern into a regular expression without anchors (like fnmatch.translate)
 
-    >>> _validate_yaml(BytesIO(b'a: [b'))
-    False
+    >>> _glob_regex('*.p[!y]?')
+    '.*\\\\.p[^y].'
     '''
-    import yaml
-    try:
-        # Using safeloader because it supports recursive nodes
-        loader = yaml.SafeLoader(fd)
-        # Support random tags
-        loader.add_multi_constructor('!', (lambda _, tag, _2: tag))
-        while loader.check_data():
-            loader.get_data()
-    except Exception as e:
-        _detail('%s: %s' % (e.__class__.__name__, e))
-        return False
-    return True
 
+    i, n = 0, len(pattern)
+    res = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            res.append('.*')
+        elif c == '?':
+            res.append('.')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                res.append('\\[')
+            else:
+                stuff = pattern[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if stuff[0] == '!':
+                    stuff = '^' + stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = '\\' + stuff
+                res.append('[%s]' % stuff)
+        else:
+            res.append(re.escape(c))
+    return ''.join(res)
 
-@message('is not PythonTidy formatted')
-def _validate_pythontidy(fd):
-    if is_python3(fd) or running_on_py3:
-        # PythonTidy supports Python 2 only
-        return True
-    source = StringIO(fd.read())
-    if len(source.getvalue()) < 4:
-        # small or empty files are ignored
-        return True
-    formatted = StringIO()
-    PythonTidy.tidy_up(source, formatted)
-    return source.getvalue() == formatted.getvalue()
 
+class GlobMatcher(object):
 
-@message('is not pep8 formatted')
-def _validate_pep8(fd, options={}):
-    import pep8
+    '''match names against a list of glob patterns (with fnmatch semantics) compiled once
 
-    # if user doesn't define a new value use the pep8 default
-    max_line_length = options.get('max_line_length', pep8.MAX_LINE_LENGTH)
+    Plain "*.ext" patterns are looked up by file extension, all other patterns are combined into a single regex.
 
-    pep8style = pep8.StyleGuide(max_line_length=max_line_length)
-    check = pep8style.input_file(fd.name)
-    return check == 0
+    >>> matcher = GlobMatcher(['*.xml', '*.py', '*pom.xml', '* *'])
+    >>> matcher.indexes('my project/pom.xml')
+    [0, 2, 3]
+    >>> matcher.match('setup.py'), matcher.match('README')
+    (True, False)
+    '''
 
+    def __init__(self, patterns):
+        self.patterns = [os.path.normcase(pattern) for pattern in patterns]
+        # last extension -> list of (suffix, index)
+        self.extensions = defaultdict(list)
+        # every optional lookahead sets its (empty) group if the pattern matches
+        lookaheads = []
+        indexes = []
+        for i, pattern in enumerate(self.patterns):
+            m = EXTENSION_GLOB.match(pattern)
+            if m:
+                suffix = m.group(1)
+                self.extensions[suffix.rsplit('.', 1)[-1]].append((suffix, i))
+            else:
+                lookaheads.append('(?:(?=%s\\Z)())?' % _glob_regex(pattern))
+                indexes.append(i)
+        # list of (combined regex, index of the pattern for each group),
+        # split as Python 2 supports only 100 groups per regex
+        self.regexes = []
+        for start in range(0, len(lookaheads), GLOB_REGEX_GROUPS):
+            regex = re.compile(''.join(lookaheads[start:start + GLOB_REGEX_GROUPS]), re.DOTALL)
+            self.regexes.append((regex, indexes[start:start + GLOB_REGEX_GROUPS]))
 
-def __jalopy(original, options, use_nailgun=True):
-    # a temporary destination dir is needed with nailgun to prevent multiple jalopy instances from interfering
-    # with each other, a temporary directory
-    dest_dir = tempfile.mkdtemp('cvjalopy')
-    jalopy_config = options.get('config')
-    java_bin = options.get('java_bin', '/usr/bin/java')
-    ng_bin = options.get('ng_bin', '/usr/bin/ng-nailgun')
-    classpath = options.get('classpath')
+    def indexes(self, name):
+        '''return the indexes of all patterns matching name (in ascending order)'''
 
-    if use_nailgun and os.path.isfile(ng_bin):
-        java_bin = ng_bin
-        # loglevel has to be WARN or otherwise we get exceptions when running multiple instances
-        jalopy = [java_bin, 'Jalopy', '--loglevel', 'WARN']
-    elif os.path.isfile(java_bin):
-        jalopy = [java_bin, '-classpath', classpath, 'Jalopy']
-        if not classpath:
-            raise ConfigurationError('Jalopy classpath not set')
-    else:
-        raise ConfigurationError('Jalopy java_bin option is invalid, %s does not exist' % java_bin)
+        name = os.path.normcase(name)
+        result = [i for suffix, i in self.extensions.get(name.rsplit('.', 1)[-1], ()) if name.endswith(suffix)]
+        for regex, indexes in self.regexes:
+            groups = regex.match(name).groups()
+            result.extend(indexes[j] for j, group in enumerate(groups) if group is not None)
+        if self.regexes:
+            result.sort()
+        return result
 
-    _env = {}
-    _env.update(os.environ)
-    _env['LANG'] = 'en_US.utf8'
-    _env['LC_ALL'] = 'en_US.utf8'
-    try:
-        with NamedTemporaryFile(suffix='.java', delete=False) as f:
-            f.write(original)
-            f.flush()
-            destination = ['--flatdest', dest_dir]
-            config = (['--convention', jalopy_config] if jalopy_config else [])
-            cmd = jalopy + destination + config + [f.name]
-            j = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=_env)
-            stdout, stderr = j.communicate()
-            if stderr or '[ERROR]' in stdout:
-                if stderr.strip().decode() == 'connect: Connection refused':
-                    # Fallback
-                    return __jalopy(original, options, use_nailgun=False)
-                raise ExecutionError('Failed to execute Jalopy: %s%s' % (stderr.decode(), stdout.decode()))
-            if '[WARN]' in stdout:
-                logging.info('Jalopy reports warnings: %s', stdout)
-            name = os.path.basename(f.name)
-            result = open(os.path.join(dest_dir, name)).read()
-    except:
-        result = ''
-    finally:
-        shutil.rmtree(dest_dir, True)
-    return result
+    def match(self, name):
+        '''check whether name matches any of the patterns'''
 
+        return bool(self.indexes(name))
 
-@message('is not Jalopy formatted')
-def _validate_jalopy(fd, options={}):
-    original = fd.read()
-    result = __jalopy(original, options)
-    return original == result
 
+_GLOB_MATCHERS = {}
 
-def _fix_jalopy(src, dst, options={}):
-    original = src.read()
-    result = __jalopy(original, options)
-    dst.write(result)
 
+def compile_globs(patterns):
+    '''return the GlobMatcher for the given patterns (compiled only once)'''
 
-def _fix_pythontidy(src, dst):
-    PythonTidy.tidy_up(src, dst)
+    key = tuple(patterns)
+    matcher = _GLOB_MATCHERS.get(key)
+    if matcher is None:
+        matcher = _GLOB_MATCHERS[key] = GlobMatcher(key)
+    return matcher
 
 
-def _fix_pep8(src, dst, options={}):
-    import autopep8
-    if type(src) is file:
-        source = src.read()
-    else:
-        source = src.getvalue()
+def matching_rules(fname):
+    '''return the rule lists of all patterns in CONFIG['rules'] matching fname (in configuration order)'''
 
-    class OptionsClass(object):
+    patterns = list(CONFIG['rules'])
+    return [CONFIG['rules'][patterns[i]] for i in compile_globs(patterns).indexes(fname)]
 
-        '''Helper class for autopep8 options, just return None for unknown/new options'''
 
-        select = options.get('select')
-        ignore = options.get('ignore')
-        pep8_passes = options.get('passes')
-        max_line_length = options.get('max_line_length')
-        verbose = False
-        aggressive = True
+class SourceFile(BytesIO):
 
-        def __getattr__(self, name):
-            return self.__dict__.get(name)
+    '''in-memory file object with the contents of a file to validate
 
-    fixed = autopep8.fix_code(source, options=OptionsClass())
-    dst.write(fixed)
+    All rules validating a file share its SourceFile, i.e. the file is read only once and the contents are not copied.
+    Artifacts derived from the contents (decoded text, parsed documents, ..) are computed on first use and shared
+    between rules as well (see memoize). The path is the file on disk having the contents (None for contents read
+    from STDIN or the GIT object store).
 
+    Large files (data None, see LARGE_FILE_SIZE) are read from path on first use of data or of the file object, rules
+    checking the contents in chunks (see chunks and stream) do not read them into memory at all.
+    '''
 
-@message('is not phpcs (%(standard)s standard) formatted')
-def _validate_phpcs(fd, options):
-    """validate a PHP file to conform to PHP_CodeSniffer standards
+    def __init__(self, name, data, path=None):
+        BytesIO.__init__(self, data or b'')
+        self.name = name
+        self._data = data
+        self.path = path
+        self._memo = {}
 
-    Needs a locally installed phpcs ("pear install PHP_CodeSniffer").
-    Look at https://github.com/klaussilveira/phpcs-psr to get the PSR standard (sniffs)."""
+    @property
+    def data(self):
+        if self._data is None:
+            with open(self.path, 'rb') as fd:
+                self._data = fd.read()
+            position = BytesIO.tell(self)
+            BytesIO.__init__(self, self._data)
+            BytesIO.seek(self, position)
+        return self._data
 
-    po = subprocess.Popen('phpcs -n --report=csv --standard=%s --encoding=%s -' % (options['standard'],
-                          options['encoding']), shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                          stderr=subprocess.PIPE)
-    output, stderr = po.communicate(input=fd.read())
-    reader = csv.DictReader(output.split('\n'), delimiter=',', doublequote=False, escapechar='\\')
-    valid = True
-    for row in reader:
-        valid = False
-        _detail(row['Message'], line=row['Line'], column=row['Column'])
-    return valid
+    def _load(self):
+        '''return the file object with the contents read into memory (see data)'''
 
+        if self._data is None:
+            self.data
+        return self
 
-@message('has jshint warnings/errors')
-def _validate_jshint(fd, options=None):
-    cfgfile = os.path.join(BASE_DIR, 'config/jshint.json')
-    po = subprocess.Popen([
-        'jshint',
-        '--reporter=jslint',
-        '--config',
-        cfgfile,
-        '-',
-    ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, stderr = po.communicate(input=fd.read())
-    tree = xmlfromstring(output)
-    has_errors = False
-    for elem in tree.findall('.//issue'):
-        _detail(elem.attrib['reason'], line=elem.attrib['line'], column=elem.attrib['char'])
-        has_errors = True
-    return not has_errors
+    def read(self, *args):
+        return BytesIO.read(self._load(), *args)
 
+    def readline(self, *args):
+        return BytesIO.readline(self._load(), *args)
 
-@message('fails coffeelint validation')
-def _validate_coffeelint(fd, options=None):
-    """validate a CoffeeScript file
+    def readlines(self, *args):
+        return BytesIO.readlines(self._load(), *args)
 
-    Needs a locally installed coffeelint ("npm install -g coffeelint").
-    """
+    def __next__(self):
+        return BytesIO.__next__(self._load())
 
-    cfgfile = os.path.join(BASE_DIR, 'config/coffeelint.json')
-    po = subprocess.Popen('coffeelint --reporter csv -s -f %s' % cfgfile, shell=True, stdin=subprocess.PIPE,
-                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, stderr = po.communicate(input=fd.read())
-    valid = True
-    if stderr:
-        valid = False
-        _detail(stderr)
-    for row in output.split('\n'):
-        if row and row != 'path,lineNumber,lineNumberEnd,level,message':
-            valid = False
-            cols = row.split(',')
-            if len(cols) > 3:
-                _detail(cols[3], line=cols[1])
-    return valid
+    def next(self):
+        return BytesIO.next(self._load())
 
+    def getvalue(self):
+        return BytesIO.getvalue(self._load())
 
-@message('fails puppet parser validation')
-def _validate_puppet(fd):
-    _env = {}
-    _env.update(os.environ)
-    _env['HOME'] = '/tmp'
-    _env['PATH'] = '/bin:/sbin:/usr/bin:/usr/sbin'
-    with tempfile.NamedTemporaryFile() as f:
-        f.write(fd.read())
-        f.flush()
-        cmd = 'puppet parser validate --color=false --confdir=/tmp --vardir=/tmp %s' % (f.name, )
-        po = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_env)
-        output, stderr = po.communicate()
-        retcode = po.poll()
-        valid = True
-        if output or retcode != 0:
-            valid = False
-            _detail('puppet parser exited with %d: %s' % (retcode, re.sub('[^A-Za-z0-9 .:-]', '', output)))
-        return valid
+    def seek(self, *args):
+        return BytesIO.seek(self._load() if args[1:2] == (os.SEEK_END, ) else self, *args)
 
+    @property
+    def size(self):
+        return (os.path.getsize(self.path) if self._data is None else len(self._data))
 
-@message('is not valid ruby')
-def _validate_ruby(fd):
-    p0 = subprocess.Popen(["ruby", "-c"], stdin=fd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, stderr = p0.communicate()
-    retcode = p0.poll()
-    if output.strip() != 'Syntax OK' or retcode != 0:
-        _detail("ruby parser exited with %d: %s" % (retcode, stderr))
+    def memoize(self, key, func):
+        '''return func(self), computed only once per key (a raised exception is memoized and raised again)'''
+
+        if key not in self._memo:
+            try:
+                self._memo[key] = (func(self), None)
+            except Exception as e:
+                self._memo[key] = (None, e)
+        value, error = self._memo[key]
+        if error is not None:
+            raise error
+        return value
+
+    @property
+    def digest(self):
+        return self.memoize('digest', lambda source: _digest_chunks(source.chunks()))
+
+    @property
+    def text(self):
+        return self.memoize('text', lambda source: source.data.decode('utf-8'))
+
+    def chunks(self):
+        '''generate the contents in chunks, read from path (see CHUNK_SIZE) unless they are in memory already'''
+
+        if self._data is not None:
+            yield self._data
+            return
+        with open(self.path, 'rb') as fd:
+            for chunk in iter(lambda: fd.read(CHUNK_SIZE), b''):
+                yield chunk
+
+    def stream(self):
+        '''return a new independent file object on the contents (reading from path unless they are in memory)'''
+
+        if self._data is None:
+            return open(self.path, 'rb')
+        stream = BytesIO(self.data)
+        if self.name is not None:
+            stream.name = self.name
+        return stream
+
+
+def _source(fd):
+    '''return file object fd as SourceFile (reading it into a new one if necessary)'''
+
+    if isinstance(fd, SourceFile):
+        return fd
+    return SourceFile(getattr(fd, 'name', None), fd.read())
+
+
+@contextlib.contextmanager
+def source_paths(fds):
+    '''yield the paths of files on disk with the contents of the file objects fds (for external tools)
+
+    In-memory sources are written to temporary files with the same base names.
+    '''
+
+    paths = [getattr(fd, 'path', getattr(fd, 'name', None)) for fd in fds]
+    tmpdir = None
+    try:
+        for i, fd in enumerate(fds):
+            if paths[i] is None:
+                tmpdir = tmpdir or tempfile.mkdtemp(prefix='codevalidator')
+                # a directory per file as the base names are not unique
+                paths[i] = os.path.join(tmpdir, str(i), os.path.basename(fd.name))
+                os.mkdir(os.path.dirname(paths[i]))
+                with open(paths[i], 'wb') as f:
+                    f.write(_source(fd).data)
+        yield paths
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+
+@contextlib.contextmanager
+def source_path(fd):
+    '''yield the path of a file on disk with the contents of fd (see source_paths)'''
+
+    with source_paths([fd]) as paths:
+        yield paths[0]
+
+
+def get_tool_slots():
+    '''return the semaphores of the external tools with a limit (see tool_limits option)'''
+
+    global TOOL_SLOTS
+    if TOOL_SLOTS is None:
+        TOOL_SLOTS = dict((tool, multiprocessing.BoundedSemaphore(limit))
+                          for tool, limit in (CONFIG.get('tool_limits') or {}).items())
+    return TOOL_SLOTS
+
+
+def get_rule_limits(rule):
+    '''return the process limits of external tools run for the given rule (see rule_limits option)'''
+
+    limits = CONFIG.get('rule_limits') or {}
+    result = dict(limits.get('*') or {})
+    result.update(limits.get(rule) or {})
+    return result
+
+
+def _process_options(limits):
+    '''return the Popen arguments starting an external tool in its own process group with the resource limits
+
+    A timed out tool is killed together with its children. preexec_fn is not safe while other threads run, so it is
+    only used to apply memory or cpu limits (and on Python 2, which lacks start_new_session).
+    '''
+
+    rlimits = [(limit, limits[key]) for key, limit in (('memory', resource.RLIMIT_AS), ('cpu', resource.RLIMIT_CPU))
+               if limits.get(key)]
+    if not rlimits and running_on_py3:
+        return {'start_new_session': True}
+
+    def preexec():
+        os.setsid()
+        for limit, value in rlimits:
+            resource.setrlimit(limit, (value, value))
+    return {'preexec_fn': preexec}
+
+
+def _kill_tool(po):
+    '''kill an external tool together with its children (its process group, see _process_options)'''
+
+    try:
+        os.killpg(po.pid, signal.SIGKILL)
+    except OSError:
+        # already terminated
+        pass
+
+
+def _kill_running_tools():
+    '''kill the external tools still running when this process is interrupted or terminated'''
+
+    for po in list(RUNNING_TOOLS):
+        _kill_tool(po)
+
+
+# e.g. tools run by the ThreadPool when Ctrl-C ends the main thread
+atexit.register(_kill_running_tools)
+
+
+def _kill_timed_out(po, timed_out):
+    timed_out.append(True)
+    _kill_tool(po)
+
+
+def run_tool(cmd, rule, input=None, env=None):
+    '''run an external tool once a slot for it is free (see tool_limits) and return exit code, output and errors
+
+    The process is limited by the rule's rule_limits, ToolTimeoutError is raised if it had to be killed.
+    '''
+
+    limits = get_rule_limits(rule)
+    slot = get_tool_slots().get(os.path.basename(cmd[0]))
+    if slot:
+        slot.acquire()
+    try:
+        options = _process_options(limits)
+        po = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                              **options)
+        # in its own process group the tool does not get the Ctrl-C of the terminal, it is killed instead
+        RUNNING_TOOLS.add(po)
+        timed_out = []
+        timer = (threading.Timer(limits['timeout'], _kill_timed_out, (po, timed_out)) if limits.get('timeout')
+                 else None)
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            output, stderr = po.communicate(input or b'')
+        except KeyboardInterrupt:
+            _kill_tool(po)
+            po.wait()
+            raise
+        finally:
+            RUNNING_TOOLS.discard(po)
+            if timer:
+                timer.cancel()
+    finally:
+        if slot:
+            slot.release()
+    if timed_out:
+        raise ToolTimeoutError('{0} killed after timeout of {1} seconds'.format(cmd[0], limits['timeout']))
+    return po.returncode, output, stderr
+
+
+def _argv_chunks(paths, max_bytes=ARGV_MAX_BYTES):
+    '''split the paths into chunks with at most max_bytes of arguments
+
+    >>> list(_argv_chunks(['a.py', 'b.py', 'c.py'], 10))
+    [['a.py', 'b.py'], ['c.py']]
+    '''
+
+    chunk = []
+    size = 0
+    for path in paths:
+        if chunk and size + len(path) + 1 > max_bytes:
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(path)
+        size += len(path) + 1
+    if chunk:
+        yield chunk
+
+
+def _parse_locations(output, paths):
+    '''parse "<path>:<line>[:<column>]: <message>" lines (as printed by most linters) of the given paths
+
+    >>> list(_parse_locations('a:b.py:3:7: undefined name\\n  x = y\\nc.py:1: unused', ['a:b.py', 'c.py']))
+    [('a:b.py', 'undefined name', 3, 7), ('c.py', 'unused', 1, None)]
+    '''
+
+    for line in output.splitlines():
+        for path in paths:
+            if line.startswith(path + ':'):
+                match = LOCATION_MESSAGE.match(line[len(path) + 1:])
+                if match:
+                    yield path, match.group(3), int(match.group(1)), (int(match.group(2)) if match.group(2) else None)
+                    break
+
+
+def lint_sources(rule, sources, options=None):
+    '''run the external linter of rule (see the linter decorator) for several files at once
+
+    The files are passed in chunks (see ARGV_MAX_BYTES), the output is mapped back to the files.
+    Returns a (valid, details) tuple for each file.
+    '''
+
+    command, parse, env = globals()['_validate_' + rule].linter
+    cmd = command(options or {})
+    if env:
+        env = dict(os.environ, **env)
+    details = defaultdict(list)
+    with source_paths(sources) as paths:
+        for chunk in _argv_chunks(paths):
+            returncode, output, stderr = run_tool(cmd + chunk, rule, env=env)
+            output = output.decode('utf-8', 'replace')
+            stderr = stderr.decode('utf-8', 'replace')
+            # linters may print absolute or resolved paths
+            known_paths = {}
+            for path in chunk:
+                for variant in path, os.path.abspath(path), os.path.realpath(path):
+                    known_paths.setdefault(variant, path)
+            records = list(parse(output, stderr, list(known_paths)))
+            if not records and returncode != 0:
+                records.append((None, '{0} exited with {1}: {2}'.format(cmd[0], returncode, stderr or output),
+                               None, None))
+            for path, message, line, column in records:
+                path = known_paths.get(path)
+                if path is None:
+                    if len(chunk) > 1:
+                        raise ExecutionError('Cannot assign output of {0} to a file: {1}'.format(cmd[0], message))
+                    path = chunk[0]
+                details[path].append((message, line, column))
+        return [(not details[path], details[path]) for path in paths]
+
+
+def run_linter(rule, fd, options=None):
+    '''validate a single file with the external linter of rule (results of a batch run are used if available)'''
+
+    source = _source(fd)
+    result = _batch_result(rule, source.name, source.digest)
+    if result is not None:
+        valid, details = result
+    else:
+        valid, details = lint_sources(rule, [source], options)[0]
+    for message, line, column in details:
+        _detail(message, line, column)
+    return valid
+
+
+_BACKENDS = {}
+
+
+def get_backend(kind):
+    '''return (name, implementation) of the first available parser backend of kind (probed once, see PARSER_BACKENDS)
+
+    >>> get_backend('xml')[0]
+    'xml.parsers.expat'
+    '''
+
+    if kind not in _BACKENDS:
+        # the rules fail with the ImportError of the reference if no backend is available
+        _BACKENDS[kind] = (None, None)
+        for name in PARSER_BACKENDS[kind]:
+            try:
+                _BACKENDS[kind] = (name, importlib.import_module(name))
+                break
+            except ImportError:
+                pass
+    return _BACKENDS[kind]
+
+
+def backends_report():
+    '''return lines describing the parser backend chosen for each kind (see --backends)'''
+
+    lines = []
+    for kind, names in PARSER_BACKENDS.items():
+        name = get_backend(kind)[0]
+        missing = names[:names.index(name)] if name else names
+        line = '{0}: {1}'.format(kind, name or 'not available')
+        if name == 'json' and not getattr(importlib.import_module('json.scanner'), 'c_make_scanner', None):
+            line += ' (without C speedups)'
+        elif name == 'xml.parsers.expat':
+            line += ' (documents without DOCTYPE, others: {0})'.format(names[-1])
+        if missing:
+            line += ' (not installed: {0})'.format(', '.join(missing))
+        lines.append(line)
+    return lines
+
+
+def iterparse_xml(stream):
+    '''generate (path, element) at the end of each element of the XML document parsed incrementally from stream
+
+    The path is the list of tags from the root element (reused, do not keep it). The element has its text and
+    attributes, but its children are already cleared and it is cleared afterwards, so the used memory does not grow
+    with the size of the document.
+
+    >>> [(list(path), elem.text) for path, elem in iterparse_xml(BytesIO(b'<a><b>x</b><c><b>y</b></c></a>'))]
+    [(['a', 'b'], 'x'), (['a', 'c', 'b'], 'y'), (['a', 'c'], None), (['a'], None)]
+    '''
+
+    path = []
+    parents = []
+    for event, elem in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem.tag)
+            parents.append(elem)
+            continue
+        parents.pop()
+        yield path, elem
+        path.pop()
+        elem.clear()
+        if parents:
+            # all children of the parent have ended
+            del parents[-1][:]
+
+
+class _DoctypeFound(Exception):
+    pass
+
+
+def _expat_accepts(source):
+    '''return whether expat accepts a SourceFile without DOCTYPE as well-formed XML (without building a tree)
+
+    ElementTree accepts exactly the same documents without DOCTYPE (it parses with expat as well), documents with
+    DOCTYPE (entities, external subsets) or errors are left to it.
+
+    >>> _expat_accepts(SourceFile(None, b'<a><b/></a>')), _expat_accepts(SourceFile(None, b'<a>'))
+    (True, False)
+    >>> _expat_accepts(SourceFile(None, b'<!DOCTYPE a><a/>'))
+    False
+    '''
+
+    from xml.parsers import expat
+
+    def doctype(*args):
+        raise _DoctypeFound()
+
+    # namespace processing like ElementTree
+    parser = expat.ParserCreate(None, '}')
+    parser.StartDoctypeDeclHandler = doctype
+    try:
+        with contextlib.closing(source.stream()) as stream:
+            parser.ParseFile(stream)
+    except Exception:
         return False
     return True
 
 
-@message('is not rubocop formatted ruby code')
-def _validate_rubocop(fd):
-    p0 = subprocess.Popen(["rubocop", "--format", "emacs", fd.name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, stderr = p0.communicate()
-    retcode = p0.poll()
-    if retcode != 0:
-        _detail("rubocop exited with %d: \n%s" % (retcode, output))
+def _check_xml(source):
+    '''check that a SourceFile is well-formed XML (raises the parse error of ElementTree)
+
+    Both parsers read the file incrementally (from disk for large files, see SourceFile), no tree is kept.
+    '''
+
+    if get_backend('xml')[0] == 'xml.parsers.expat' and _expat_accepts(source):
+        return
+    with contextlib.closing(source.stream()) as stream:
+        for path, elem in iterparse_xml(stream):
+            pass
+
+
+def _load_yaml(source):
+    '''load the YAML documents of a SourceFile with the safe loader accepting any "!" tag (raises the YAML error)'''
+
+    import yaml
+    # Using safeloader because it supports recursive nodes
+    loader = yaml.SafeLoader(source.stream())
+    try:
+        # Support random tags
+        loader.add_multi_constructor('!', (lambda _, tag, _2: tag))
+        while loader.check_data():
+            loader.get_data()
+    finally:
+        loader.dispose()
+
+
+def _needs_yaml_loading(source):
+    '''check the YAML documents of a SourceFile from the parse events (raises the YAML error)
+
+    Aliases and anchors are checked like the composer does, implicitly typed scalars are constructed one by one.
+    Returns True if the result may still differ from _load_yaml: for explicit tags (other than "!" ones), scalars
+    which cannot be constructed, collections as mapping keys and deep nesting (the composer recurses per level).
+
+    >>> _needs_yaml_loading(SourceFile(None, b'a: !custom [1, 2.5, {b: 2001-12-14}]\\n---\\n- &x c\\n- *x'))
+    False
+    >>> _needs_yaml_loading(SourceFile(None, b'a: 2001-13-14'))
+    True
+    >>> _needs_yaml_loading(SourceFile(None, b'? [a]\\n: b'))
+    True
+    '''
+
+    import yaml
+    resolver = yaml.resolver.Resolver()
+    constructor = yaml.constructor.SafeConstructor()
+    loader = yaml.BaseLoader(source.stream())
+    try:
+        # (start mark, whether it is a collection) of the anchors of the current document
+        anchors = {}
+        # None for each open sequence, whether the next node is a key for each open mapping
+        collections = []
+        while loader.check_event():
+            event = loader.get_event()
+            if isinstance(event, yaml.CollectionEndEvent):
+                collections.pop()
+                continue
+            elif isinstance(event, yaml.DocumentEndEvent):
+                anchors = {}
+                continue
+            elif not isinstance(event, yaml.NodeEvent):
+                continue
+            is_key = bool(collections) and collections[-1] is True
+            if collections and collections[-1] is not None:
+                collections[-1] = not collections[-1]
+            if isinstance(event, yaml.AliasEvent):
+                if event.anchor not in anchors:
+                    raise yaml.composer.ComposerError(None, None, 'found undefined alias %r' % event.anchor,
+                                                      event.start_mark)
+                if is_key and anchors[event.anchor][1]:
+                    return True
+                continue
+            if event.anchor is not None:
+                if event.anchor in anchors:
+                    raise yaml.composer.ComposerError('found duplicate anchor %r; first occurrence' % event.anchor,
+                                                      anchors[event.anchor][0], 'second occurrence', event.start_mark)
+                anchors[event.anchor] = (event.start_mark, not isinstance(event, yaml.ScalarEvent))
+            tag = event.tag
+            if tag is not None and not tag.startswith('!'):
+                return True
+            if isinstance(event, yaml.ScalarEvent):
+                if tag is None or tag == '!':
+                    tag = resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+                construct = YAML_CONSTRUCTORS.get(tag)
+                if construct:
+                    try:
+                        getattr(constructor, construct)(yaml.ScalarNode(tag, event.value))
+                    except Exception:
+                        return True
+                elif not tag.startswith('!') and tag not in YAML_PLAIN_TAGS:
+                    return True
+            elif is_key or len(collections) >= YAML_NESTING_LIMIT:
+                return True
+            else:
+                collections.append(True if isinstance(event, yaml.MappingStartEvent) else None)
         return False
-    return True
+    finally:
+        loader.dispose()
 
 
-@message('is not valid ERB template')
-def _validate_erb(fd):
-    p1 = subprocess.Popen([
-        'erb',
-        '-P',
-        '-x',
-        '-T',
-        '-',
-    ], stdin=fd, stdout=subprocess.PIPE)
-    p2 = subprocess.Popen(['ruby', '-c'], stdin=p1.stdout, stdout=subprocess.PIPE)
-    p1.stdout.close()
-    output, stderr = p2.communicate()
-    retcode = p2.poll()
-    if output.strip() != 'Syntax OK' or retcode != 0:
+def _check_yaml(source):
+    '''check the YAML documents of a SourceFile like _load_yaml, loading them only if necessary'''
+
+    if _needs_yaml_loading(source):
+        _load_yaml(source)
+
+
+def indent_xml(elem, level=0):
+    """xmlindent from http://infix.se/2007/02/06/gentlemen-indent-your-xml (without recursion)
+
+    >>> from xml.etree.ElementTree import tostring
+    >>> root = xmlfromstring('<a><b><c/></b><d/></a>')
+    >>> indent_xml(root)
+    >>> print(tostring(root).decode())
+    <a>
+        <b>
+            <c />
+        </b>
+        <d />
+    </a>
+    """
+
+    if level and not len(elem) and (not elem.tail or not elem.tail.strip()):
+        elem.tail = '\n' + level * INDENTATION
+    # (element, level, iterator over the remaining children) of the current path, the tails of the children are
+    # indented by their parent
+    stack = []
+    while True:
+        if len(elem):
+            if not elem.text or not elem.text.strip():
+                elem.text = '\n' + (level + 1) * INDENTATION
+            stack.append((elem, level, iter(elem)))
+        while stack:
+            elem, level, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if not elem[-1].tail.strip():
+                    elem[-1].tail = '\n' + level * INDENTATION
+                continue
+            if not child.tail or not child.tail.strip():
+                child.tail = '\n' + (level + 1) * INDENTATION
+            elem, level = child, level + 1
+            break
+        else:
+            return
+
+
+def message(msg):
+    """simple decorator to attach a error message to a validation function"""
+
+    def wrap(f):
+        f.message = msg
+        return f
+
+    return wrap
+
+
+def linter(command, parse, env=None):
+    """decorator to attach the command line of an external linter accepting many files to a validation function
+
+    command(options) returns the command line (the file paths are appended), parse(output, stderr, paths) generates
+    (path, message, line, column) tuples for the problems found, path is None if unknown. The environment variables
+    env are set for the linter. Files are validated in batches (see lint_sources)."""
+
+    def wrap(f):
+        f.linter = (command, parse, env)
+        return f
+
+    return wrap
+
+
+def is_python3(fd):
+    '''check first line of file object whether it contains "python3" (shebang)'''
+
+    line = fd.readline()
+    fd.seek(0)
+    return b'python3' in line
+
+
+def scan_bytes(data, rules):
+    '''compute the results of the given SCANNED_RULES for the file contents at once (without reading them again)
+
+    Returns a dict with the result of each rule. Every rule is a substring search or decode in C.
+
+    >>> sorted(scan_bytes(b'a \\tb\\r\\n', ['nocr', 'notabs', 'notrailingws', 'utf8']).items())
+    [('nocr', False), ('notabs', False), ('notrailingws', True), ('utf8', True)]
+
+    >>> scan_bytes(b'a\\n \\r\\n', ['notrailingws'])
+    {'notrailingws': False}
+    '''
+
+    return scan_chunks([data], rules)
+
+
+def scan_chunks(chunks, rules):
+    '''compute the results of the given SCANNED_RULES for the file contents given in chunks (see scan_bytes)
+
+    >>> chunks = [b'\\xef\\xbb\\xbfa \\r', b'\\r\\nb\\xc3', b'\\xa4']
+    >>> sorted(scan_chunks(chunks, ['nobom', 'notrailingws', 'utf8']).items())
+    [('nobom', False), ('notrailingws', False), ('utf8', True)]
+    '''
+
+    results = dict((rule, True) for rule in rules)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    # last byte of the previous chunk (without carriage returns), whitespace if the line ends in this chunk
+    last = b''
+    for i, chunk in enumerate(chunks):
+        if i == 0 and 'nobom' in results:
+            results['nobom'] = not chunk.startswith(UTF8_BOM)
+        if 'notabs' in results and b'\t' in chunk:
+            results['notabs'] = False
+        cr = b'\r' in chunk
+        if 'nocr' in results and cr:
+            results['nocr'] = False
+        if results.get('notrailingws'):
+            # carriage returns before the end of a line are ignored (like _validate_notrailingws)
+            lines = (chunk.replace(b'\r', b'') if cr else chunk)
+            if b' \n' in lines or b'\t\n' in lines or last in (b' ', b'\t') and lines.startswith(b'\n'):
+                results['notrailingws'] = False
+            last = lines[-1:] or last
+        if results.get('utf8'):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError:
+                results['utf8'] = False
+        if not any(results.values()):
+            # all rules failed already, the rest of the file cannot change that
+            break
+    if 'notrailingws' in results and last in (b' ', b'\t'):
+        results['notrailingws'] = False
+    if results.get('utf8'):
+        try:
+            decoder.decode(b'', True)
+        except UnicodeDecodeError:
+            results['utf8'] = False
+    return results
+
+
+@message('has invalid file path (file name or extension is not allowed)')
+def _validate_invalidpath(fd):
+    return False
+
+
+@message('contains tabs')
+def _validate_notabs(fd):
+    '''
+    >>> _validate_notabs(BytesIO(b'foo'))
+    True
+
+    >>> _validate_notabs(BytesIO(b'a\\tb'))
+    False
+    '''
+    return b'\t' not in fd.read()
+
+
+def _fix_notabs(src, dst):
+    original = src.read()
+    fixed = original.replace(b'\t', b' ' * 4)
+    dst.write(fixed.decode())
+
+
+@message('contains carriage return (CR)')
+def _validate_nocr(fd):
+    return b'\r' not in fd.read()
+
+
+def _fix_nocr(src, dst):
+    original = src.read()
+    fixed = original.replace(b'\r', b'')
+    dst.write(fixed.decode())
+
+
+@message('is not UTF-8 encoded')
+def _validate_utf8(fd):
+    '''
+    >>> _validate_utf8(BytesIO(b'foo'))
+    True
+    '''
+    try:
+        fd.read().decode('utf-8')
+    except UnicodeDecodeError:
         return False
     return True
 
 
-@message('has incomplete Maven POM description')
-def _validate_pomdesc(fd):
-    """check Maven POM for title, description and organization"""
-
-    NS = '{http://maven.apache.org/POM/4.0.0}'
-    PROJECT_NAME_REGEX = re.compile(r'^[a-z][a-z0-9-]*$')
-    tree = ElementTree()
+@message('is not ASCII encoded')
+def _validate_ascii(fd):
     try:
-        elem = tree.parse(fd)
-    except Exception as e:
-        _detail('%s: %s' % (e.__class__.__name__, e))
+        fd.read().decode('ascii')
+    except UnicodeDecodeError:
         return False
-    # group = elem.findtext(NS + 'groupId')
-    name = elem.findtext(NS + 'artifactId')
-    # ver = elem.findtext(NS + 'version')
-    title = elem.findtext(NS + 'name')
-    if title == '${project.artifactId}':
-        title = name
-    description = elem.findtext(NS + 'description')
-    organization = elem.findtext(NS + 'organization/' + NS + 'name')
+    return True
+
+
+@message('has UTF-8 byte order mark (BOM)')
+def _validate_nobom(fd):
+    return not fd.read(3).startswith(b'\xef\xbb\xbf')
+
+
+@message('contains invalid indentation (not 4 spaces)')
+def _validate_indent4(fd):
+    for line in fd:
+        g = NOT_SPACE.search(line)
+        if g and g.start(0) % 4 != 0:
+            if g.group(0) == '*' and g.start(0) - 1 % 4 == 0:
+                # hack to exclude block comments aligned on "*"
+                pass
+            else:
+                return False
+    return True
+
+
+@message('contains lines with trailing whitespace')
+def _validate_notrailingws(fd):
+    '''
+    >>> _validate_notrailingws(BytesIO(b''))
+    True
+
+    >>> _validate_notrailingws(BytesIO(b'a '))
+    False
+    '''
+    for line in fd:
+        if line.rstrip(b'\n\r')[-1:] in TRAILING_WHITESPACE_CHARS:
+            return False
+    return True
+
+
+def _fix_notrailingws(src, dst):
+    for line in src:
+        dst.write(line.rstrip())
+        dst.write('\n')
+
+
+@message('is not well-formatted (pretty-printed) XML')
+def _validate_xmlfmt(fd):
+    """
+    >>> _validate_xmlfmt(BytesIO(b"<?xml version='1.0' encoding='UTF-8'?>\\n<a>\\n    <b/>\\n</a>\\n"))
+    True
+    >>> _validate_xmlfmt(BytesIO(b"<?xml version='1.0' encoding='UTF-8'?>\\n<a>\\n  <b/>\\n</a>\\n"))
+    False
+    >>> current_result().details[-1]
+    ('differs from the pretty-printed XML', 3, None)
+    """
+    source = _source(fd)
+    # the formatted document is compared while it is written (instead of keeping a formatted copy)
+    with contextlib.closing(source.stream()) as src, contextlib.closing(source.stream()) as expected:
+        comparison = _Comparison(expected)
+        try:
+            _fix_xmlfmt(src, comparison)
+            comparison.close()
+        except _Comparison.Mismatch:
+            _detail('differs from the pretty-printed XML', _offset_location(expected, comparison.offset)[0])
+            return False
+    return True
+
+
+@message('is not valid XML')
+def _validate_xml(fd):
+    try:
+        _source(fd).memoize('xml', _check_xml)
+    except Exception as e:
+        _detail('%s: %s' % (e.__class__.__name__, e))
+        return False
+    return True
+
+
+def _fix_xmlfmt(src, dst):
+    src.seek(0, os.SEEK_END)
+    size = src.tell()
+    src.seek(0)
+    if size >= XML_STREAM_SIZE and _fix_xmlfmt_stream(src, dst):
+        return
+    src.seek(0)
+    from lxml import etree
+    parser = etree.XMLParser(resolve_entities=False, no_network=True)
+    tree = etree.parse(src, parser)
+    indent_xml(tree.getroot())
+    tree.write(dst, encoding='utf-8', xml_declaration=True)
+    dst.write(b'\n')
+
+
+def _xml_text(text):
+    '''return text serialized (escaped) like lxml writes element text and tails with UTF-8 encoding'''
+
+    from lxml import etree
+    elem = etree.Element('x')
+    elem.text = text
+    return etree.tostring(elem, encoding='utf-8', xml_declaration=False)[3:-4]
+
+
+def _fix_xmlfmt_stream(src, dst):
+    '''write the document of src pretty-printed like _fix_xmlfmt, holding only one child of the root element at a time
+
+    The document is parsed incrementally and each child of the root element is indented and written when the next
+    one starts (i.e. its tail is known). Returns False without writing anything for documents with a DOCTYPE.
+    '''
+
+    from lxml import etree
+    # number of open elements
+    depth = 0
+    root = head = wrapper = previous = None
+    children = False
+    prolog = []
+    for event, node in etree.iterparse(src, events=('start', 'end', 'comment', 'pi'), resolve_entities=False,
+                                       no_network=True):
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root = node
+                docinfo = root.getroottree().docinfo
+                if docinfo.doctype or docinfo.internalDTD or docinfo.xml_version != '1.0':
+                    return False
+                dst.write(b"<?xml version='1.0' encoding='UTF-8'?>\n" + b''.join(prolog))
+                # the start tag of the root element (without the children parsed ahead)
+                data = etree.tostring(root, encoding='utf-8', xml_declaration=False)
+                end = data.index(b'>')
+                head = (data[:end - 1] + b'>' if data[end - 1:end] == b'/' else data[:end + 1])
+                # children are serialized in an element with the namespaces of the root element (see above)
+                wrapper = etree.Element(root.tag, nsmap=root.nsmap)
+            if depth != 2:
+                continue
+        elif event == 'end':
+            depth -= 1
+            if depth == 1:
+                previous = node
+            elif depth == 0:
+                if not children:
+                    dst.write(etree.tostring(root, encoding='utf-8', xml_declaration=False, with_tail=False))
+                    continue
+                _add_xmlfmt_child(previous, wrapper, True)
+                _write_xmlfmt_children(wrapper, dst)
+                dst.write(b'</' + re.match(br'<([^\s>/]+)', head).group(1) + b'>')
+            continue
+        elif depth == 0:
+            # comment or processing instruction before or after the root element
+            if root is None:
+                prolog.append(etree.tostring(node, encoding='utf-8', xml_declaration=False))
+            else:
+                dst.write(etree.tostring(node, encoding='utf-8', xml_declaration=False))
+            continue
+        elif depth > 1:
+            continue
+        # a child of the root element starts (an element) or is complete (comment or processing instruction)
+        if not children:
+            children = True
+            text = (root.text if root.text and root.text.strip() else '\n' + INDENTATION)
+            dst.write(head + _xml_text(text))
+        elif previous is not None:
+            _add_xmlfmt_child(previous, wrapper, False)
+            if len(wrapper) >= XML_STREAM_BATCH:
+                _write_xmlfmt_children(wrapper, dst)
+        previous = (node if event != 'start' else None)
+        if getattr(dst, 'differs', False):
+            # compared with the original contents, the first difference is known (see _Comparison)
+            return True
+    dst.write(b'\n')
+    return True
+
+
+def _add_xmlfmt_child(child, wrapper, last):
+    '''indent a (complete) child of the root element like indent_xml and move it to the wrapper element'''
+
+    indent_xml(child, 1)
+    if not child.tail or not child.tail.strip():
+        child.tail = '\n' + INDENTATION
+    if last and not child.tail.strip():
+        child.tail = '\n'
+    # moved out of the document, i.e. it is freed after writing
+    wrapper.append(child)
+
+
+def _write_xmlfmt_children(wrapper, dst):
+    '''write the children of the wrapper element (with tails) and remove them'''
+
+    from lxml import etree
+    data = etree.tostring(wrapper, encoding='utf-8', xml_declaration=False)
+    dst.write(data[data.index(b'>') + 1:data.rindex(b'</')])
+    del wrapper[:]
+
+
+class _Comparison(object):
+
+    """file-like object comparing the written data with the expected contents (a file), stops at the first difference
+
+    Written data is not kept, the expected contents are read as far as written. Raising the difference from write()
+    would make libxml2 report a flush error, so close() raises it (any data written after the difference is ignored).
+    """
+
+    class Mismatch(Exception):
+
+        pass
+
+    def __init__(self, expected):
+        self.expected = expected
+        # number of matching bytes written so far (offset of the first difference)
+        self.offset = 0
+        self.differs = False
+
+    def write(self, data):
+        if self.differs:
+            return
+        data = bytes(data)
+        expected = self.expected.read(len(data))
+        if expected != data:
+            self.offset += len(os.path.commonprefix([expected, data]))
+            self.differs = True
+        else:
+            self.offset += len(data)
+
+    def close(self):
+        """check that exactly the expected contents were written"""
+
+        if self.differs or self.expected.read(1):
+            raise _Comparison.Mismatch()
+
+
+def json_syntax_error(fd):
+    '''check the syntax of the JSON document in file object fd in constant memory (no objects are built)
+
+    The file is read in chunks. Returns None for a valid document, otherwise the error message and its byte offset.
+
+    >>> json_syntax_error(BytesIO(b' {"a": [1, -2.5e3, "x\\\\u00e4", {}, [[[[]]]], null]} '))
+    >>> json_syntax_error(BytesIO(b'{"a": [1 2]}'))
+    ("Expecting ',' delimiter", 9)
+    >>> json_syntax_error(BytesIO(b'{"a": 1,}'))
+    ('Expecting property name enclosed in double quotes', 8)
+    >>> json_syntax_error(BytesIO(b'[true] x'))
+    ('Extra data', 7)
+    >>> json_syntax_error(BytesIO(b'["a\\xff"]'))
+    ('Invalid UTF-8', 3)
+    >>> json_syntax_error(BytesIO(b''))
+    ('Expecting value', 0)
+    '''
+
+    space, string_body, value, items, members = [re.compile(pattern) for pattern in (
+        JSON_WHITESPACE, JSON_STRING[1:-1], JSON_VALUE, JSON_ITEMS, JSON_MEMBERS)]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buf, base, pos = b'', 0, 0
+    eof = need_more = False
+    string_start = None
+    # open arrays and objects
+    stack = []
+    expect = 'value'
+    while True:
+        if need_more or (not eof and len(buf) - pos < JSON_LOOKAHEAD):
+            chunk = fd.read(JSON_CHUNK_SIZE)
+            eof, need_more = not chunk, False
+            pending = decoder.getstate()[0]
+            try:
+                # only checks the encoding, the decoded text is dropped
+                decoder.decode(chunk, eof)
+            except UnicodeDecodeError as e:
+                return 'Invalid UTF-8', base + len(buf) - len(pending) + e.start
+            base += pos
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if string_start is not None:
+            # continue a string larger than the lookahead
+            pos = string_body.match(buf, pos).end()
+            if not eof and len(buf) - pos < JSON_LOOKAHEAD:
+                need_more = True
+                continue
+            if pos == len(buf):
+                return 'Unterminated string starting', string_start
+            if buf[pos:pos + 1] != b'"':
+                return ('Invalid \\escape' if buf[pos:pos + 1] == b'\\' else 'Invalid control character'), base + pos
+            pos += 1
+            token, offset, string_start = b'"', string_start, None
+        else:
+            if stack and expect in (('value', 'value_or_close') if stack[-1] == b'[' else ('key', 'key_or_close')):
+                end = (items if stack[-1] == b'[' else members).match(buf, pos).end()
+                if end > pos:
+                    pos = end
+                    expect = ('value' if stack[-1] == b'[' else 'key')
+                    continue
+            pos = space.match(buf, pos).end()
+            if pos == len(buf):
+                if eof:
+                    return (None if expect == 'end' else (JSON_EXPECTED[expect], base + pos))
+                need_more = True
+                continue
+            token, offset = buf[pos:pos + 1], base + pos
+            if token in b']},:':
+                pos += 1
+            else:
+                match = value.match(buf, pos)
+                if match and (len(buf) - match.end() >= JSON_LOOKAHEAD or eof):
+                    # a complete string, scalar or nested array/object
+                    pos = match.end()
+                    token = (b'"' if token == b'"' else b'v')
+                elif match and not eof:
+                    # a number might continue in the next chunk (e.g. "1." or "1e+")
+                    need_more = True
+                    continue
+                elif token in b'[{':
+                    pos += 1
+                elif token == b'"':
+                    string_start = offset
+                    pos += 1
+                    continue
+                elif not eof and len(buf) - pos < JSON_LOOKAHEAD:
+                    need_more = True
+                    continue
+                else:
+                    return JSON_EXPECTED[expect], offset
+        if expect in ('value', 'value_or_close') and token in (b'[', b'{'):
+            stack.append(token)
+            expect = ('value_or_close' if token == b'[' else 'key_or_close')
+            continue
+        if expect in ('value', 'value_or_close') and token in (b'"', b'v'):
+            pass
+        elif expect in ('key', 'key_or_close') and token == b'"':
+            expect = 'colon'
+            continue
+        elif expect == 'colon' and token == b':':
+            expect = 'value'
+            continue
+        elif expect == 'comma_or_close' and token == b',':
+            expect = ('value' if stack[-1] == b'[' else 'key')
+            continue
+        elif (expect == 'value_or_close' and token == b']' or expect == 'key_or_close' and token == b'}' or
+              expect == 'comma_or_close' and token == (b']' if stack[-1] == b'[' else b'}')):
+            stack.pop()
+        else:
+            return JSON_EXPECTED[expect], offset
+        # a value is complete
+        expect = ('comma_or_close' if stack else 'end')
+
+
+def _offset_location(fd, offset):
+    '''return line and column (in bytes) of the byte offset in file object fd
+
+    >>> _offset_location(BytesIO(b'ab\\ncd'), 4)
+    (2, 2)
+    '''
+
+    fd.seek(0)
+    line, line_start, read = 1, 0, 0
+    while read < offset:
+        chunk = fd.read(min(JSON_CHUNK_SIZE, offset - read))
+        if not chunk:
+            break
+        line += chunk.count(b'\n')
+        newline = chunk.rfind(b'\n')
+        if newline >= 0:
+            line_start = read + newline + 1
+        read += len(chunk)
+    return line, offset - line_start + 1
+
+
+@message('is not valid JSON')
+def _validate_json(fd, options={}):
+    '''
+    >>> _validate_json(BytesIO(b''))
+    False
+
+    >>> _validate_json(BytesIO(b'""'))
+    True
+
+    >>> _validate_json(BytesIO(b'[1,\\n 2,]'), {'stream_size': 0})
+    False
+    >>> current_result().details[-1]
+    ('Expecting value at byte offset 7', 2, 4)
+    '''
+    source = _source(fd)
+    if source.size >= options.get('stream_size', JSON_STREAM_SIZE):
+        # large files are only checked for valid syntax (in constant memory, read from disk if not in memory yet)
+        with contextlib.closing(source.stream()) as stream:
+            error = json_syntax_error(stream)
+            if error:
+                message, offset = error
+                line, column = _offset_location(stream, offset)
+                _detail('{0} at byte offset {1}'.format(message, offset), line, column)
+                return False
+        return True
+    try:
+        source.memoize('json', lambda source: json.loads(source.text))
+    except Exception as e:
+        _detail('%s: %s' % (e.__class__.__name__, e))
+        return False
+    return True
+
+
+@message('is not valid YAML')
+def _validate_yaml(fd):
+    '''
+    >>> _validate_yaml(BytesIO(b'a: b'))
+    True
+
+    >>> _validate_yaml(BytesIO(b'a: [b'))
+    False
+
+    >>> _validate_yaml(BytesIO(b'a: &x !custom [b, *x]\\n---\\nc: *x'))
+    False
+    >>> current_result().details[-1][0].splitlines()[0]
+    "ComposerError: found undefined alias 'x'"
+    '''
+    # a missing PyYAML is an error of the run (not cached), not an invalid file
+    import yaml  # noqa
+    try:
+        _source(fd).memoize('yaml', _check_yaml)
+    except Exception as e:
+        _detail('%s: %s' % (e.__class__.__name__, e))
+        return False
+    return True
+
+
+@message('is not PythonTidy formatted')
+def _validate_pythontidy(fd):
+    if is_python3(fd) or running_on_py3:
+        # PythonTidy supports Python 2 only
+        return True
+    source = StringIO(fd.read())
+    if len(source.getvalue()) < 4:
+        # small or empty files are ignored
+        return True
+    formatted = StringIO()
+    PythonTidy.tidy_up(source, formatted)
+    return source.getvalue() == formatted.getvalue()
+
+
+def get_pep8_style(options):
+    '''return the pep8.StyleGuide for the given pep8 rule options (created once, shared by threads and workers)'''
+
+    key = json.dumps(options, sort_keys=True)
+    if key not in PEP8_STYLES:
+        import pep8
+
+        class DetailReport(pep8.BaseReport):
+
+            '''pep8 report adding the violations as details of the current result'''
+
+            def error(self, line_number, offset, text, check):
+                code = pep8.BaseReport.error(self, line_number, offset, text, check)
+                if code:
+                    _detail(text, line_number, offset + 1)
+                return code
+
+        # if user doesn't define a new value use the pep8 default
+        max_line_length = options.get('max_line_length', pep8.MAX_LINE_LENGTH)
+        PEP8_STYLES[key] = pep8.StyleGuide(max_line_length=max_line_length, reporter=DetailReport)
+    return PEP8_STYLES[key]
+
+
+def _python_lines(source):
+    '''return the lines of a SourceFile with Python code (decoded according to its encoding declaration on Python 3)
+
+    >>> _python_lines(SourceFile('a.py', b'a = 1\\nb = 2')) == ['a = 1\\n', 'b = 2']
+    True
+    '''
+
+    lines = source.stream().readlines()
+    if running_on_py3:
+        encoding = tokenize.detect_encoding(iter(lines).__next__)[0]
+        lines = [line.decode(encoding, 'replace') for line in lines]
+    return lines
+
+
+@message('is not pep8 formatted')
+def _validate_pep8(fd, options={}):
+    import pep8
+
+    style = get_pep8_style(options)
+    lines = _source(fd).memoize('python_lines', _python_lines)
+    # a report for each file, the style guide is shared by concurrently validated files
+    checker = pep8.Checker(getattr(fd, 'name', None) or 'stdin', lines=lines, options=style.options,
+                           report=style.options.reporter(style.options))
+    return checker.check_all() == 0
+
+
+def _jalopy_env():
+    env = {}
+    env.update(os.environ)
+    env['LANG'] = 'en_US.utf8'
+    env['LC_ALL'] = 'en_US.utf8'
+    return env
+
+
+def _free_port():
+    '''return a currently unused local TCP port'''
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def _accepts_connections(port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(1)
+    try:
+        sock.connect(('127.0.0.1', port))
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+class NailgunPool(object):
+
+    '''local nailgun servers with Jalopy on their classpath, to run Jalopy in a warm JVM
+
+    Enabled by the "nailgun_jar" option of the jalopy rule. Servers are started on first use, health-checked (and
+    restarted if necessary) whenever a port is handed out and all of them are stopped after being idle for
+    "nailgun_idle_timeout" seconds (default: 300) or when the process exits.
+    '''
+
+    def __init__(self, options, size):
+        self.options = options
+        # (process, port) for each slot
+        self.servers = [None] * size
+        self.lock = threading.Lock()
+        self.idle_timer = None
+        self.owner = os.getpid()
+
+    def _healthy(self, server):
+        return server is not None and server[0].poll() is None and _accepts_connections(server[1])
+
+    def _start(self, slot):
+        port = _free_port()
+        classpath = os.pathsep.join([self.options['nailgun_jar'], self.options.get('classpath') or ''])
+        cmd = [self.options.get('java_bin', '/usr/bin/java'), '-cp', classpath, '-server',
+               'com.martiansoftware.nailgun.NGServer', '127.0.0.1:{0}'.format(port)]
+        logging.debug('Starting nailgun server on port %s..', port)
+        with open(os.devnull, 'wb') as devnull:
+            process = subprocess.Popen(cmd, stdout=devnull, stderr=devnull, env=_jalopy_env())
+        self.servers[slot] = (process, port)
+
+    def _stop(self, slot):
+        process, port = self.servers[slot]
+        self.servers[slot] = None
+        if process.poll() is None:
+            logging.debug('Stopping nailgun server on port %s..', port)
+            process.terminate()
+            process.wait()
+
+    def port(self, slot):
+        '''return the port of the server for the given slot (modulo pool size), None if it could not be started'''
+
+        with self.lock:
+            slot %= len(self.servers)
+            server = self.servers[slot]
+            if server is not None and not self._healthy(server):
+                logging.info('Restarting nailgun server on port %s', server[1])
+                self._stop(slot)
+            # start all servers at once, they are needed anyway and the JVMs start in parallel
+            for i, server in enumerate(self.servers):
+                if server is None:
+                    self._start(i)
+            process, port = self.servers[slot]
+            deadline = time.time() + NAILGUN_START_TIMEOUT
+            while not _accepts_connections(port):
+                if process.poll() is not None or time.time() > deadline:
+                    logging.info('Failed to start nailgun server on port %s', port)
+                    self._stop(slot)
+                    return None
+                time.sleep(0.1)
+            if self.idle_timer:
+                self.idle_timer.cancel()
+            self.idle_timer = threading.Timer(self.options.get('nailgun_idle_timeout', 300), self.stop)
+            self.idle_timer.daemon = True
+            self.idle_timer.start()
+            return port
+
+    def ports(self):
+        '''return the ports of all servers (see port)'''
+
+        return [self.port(slot) for slot in range(len(self.servers))]
+
+    def stop(self):
+        '''stop all servers (only in the process which started them)'''
+
+        with self.lock:
+            if os.getpid() != self.owner:
+                return
+            for slot, server in enumerate(self.servers):
+                if server is not None:
+                    self._stop(slot)
+
+
+def get_nailgun_pool(size=1):
+    '''return the NailgunPool configured by the jalopy options (None if nailgun servers are not managed)'''
+
+    global NAILGUN_POOL
+    options = CONFIG.get('options', {}).get('jalopy') or {}
+    if NAILGUN_POOL is None and options.get('nailgun_jar'):
+        NAILGUN_POOL = NailgunPool(options, size)
+        atexit.register(NAILGUN_POOL.stop)
+    return NAILGUN_POOL
+
+
+def _nailgun_port(jobs, slot):
+    '''return the port of the managed nailgun server for a batch of jobs (None if not needed or not managed)'''
+
+    if not any(_needs_rule(job[0], 'jalopy') for job in jobs):
+        return None
+    if NAILGUN_PORTS:
+        return NAILGUN_PORTS[slot % len(NAILGUN_PORTS)]
+    pool = get_nailgun_pool()
+    return (pool.port(slot) if pool else None)
+
+
+def __jalopy(originals, options, use_nailgun=True):
+    '''format the contents of several Java files with a single Jalopy run and return the formatted contents'''
+
+    jalopy_config = options.get('config')
+    java_bin = options.get('java_bin', '/usr/bin/java')
+    ng_bin = options.get('ng_bin', '/usr/bin/ng-nailgun')
+    classpath = options.get('classpath')
+
+    if use_nailgun and NAILGUN_PORT and os.path.isfile(ng_bin):
+        jalopy = [ng_bin, '--nailgun-port', str(NAILGUN_PORT), 'Jalopy', '--loglevel', 'WARN']
+    elif use_nailgun and os.path.isfile(ng_bin):
+        java_bin = ng_bin
+        # loglevel has to be WARN or otherwise we get exceptions when running multiple instances
+        jalopy = [java_bin, 'Jalopy', '--loglevel', 'WARN']
+    elif os.path.isfile(java_bin):
+        jalopy = [java_bin, '-classpath', classpath, 'Jalopy']
+        if not classpath:
+            raise ConfigurationError('Jalopy classpath not set')
+    else:
+        raise ConfigurationError('Jalopy java_bin option is invalid, %s does not exist' % java_bin)
+
+    # all files of the batch need unique names as the (temporary) destination dir is flat,
+    # it also prevents multiple jalopy instances from interfering with each other when using nailgun
+    src_dir = tempfile.mkdtemp('cvjalopy')
+    dest_dir = tempfile.mkdtemp('cvjalopy')
+    try:
+        names = []
+        for i, original in enumerate(originals):
+            names.append(os.path.join(src_dir, 'Source{0}.java'.format(i)))
+            with open(names[-1], 'wb') as f:
+                f.write(original)
+        destination = ['--flatdest', dest_dir]
+        config = (['--convention', jalopy_config] if jalopy_config else [])
+        cmd = jalopy + destination + config + names
+        returncode, stdout, stderr = run_tool(cmd, 'jalopy', env=_jalopy_env())
+        if stderr or b'[ERROR]' in stdout:
+            if stderr.strip().decode() == 'connect: Connection refused':
+                # Fallback
+                return __jalopy(originals, options, use_nailgun=False)
+            raise ExecutionError('Failed to execute Jalopy: %s%s' % (stderr.decode(), stdout.decode()))
+        if b'[WARN]' in stdout:
+            logging.info('Jalopy reports warnings: %s', stdout)
+        results = []
+        for name in names:
+            with open(os.path.join(dest_dir, os.path.basename(name)), 'rb') as f:
+                results.append(f.read())
+        return results
+    finally:
+        shutil.rmtree(src_dir, True)
+        shutil.rmtree(dest_dir, True)
+
+
+def _batch_jalopy(sources, options={}):
+    return __jalopy([source.data for source in sources], options)
+
+
+def _jalopy(fd, options):
+    '''return the Jalopy formatted contents of a Java file (empty if Jalopy failed)'''
+
+    original = fd.read()
+    result = _batch_result('jalopy', getattr(fd, 'name', None), _digest(original))
+    if result is not None:
+        return result
+    try:
+        return __jalopy([original], options)[0]
+    except (ConfigurationError, ToolTimeoutError):
+        raise
+    except Exception:
+        return ''
+
+
+@message('is not Jalopy formatted')
+def _validate_jalopy(fd, options={}):
+    result = _jalopy(fd, options)
+    fd.seek(0)
+    return fd.read() == result
+
+
+def _fix_jalopy(src, dst, options={}):
+    result = _jalopy(src, options)
+    dst.write(result)
+
+
+def _fix_pythontidy(src, dst):
+    PythonTidy.tidy_up(src, dst)
+
+
+def _fix_pep8(src, dst, options={}):
+    import autopep8
+    if type(src) is file:
+        source = src.read()
+    else:
+        source = src.getvalue()
+
+    class OptionsClass(object):
+
+        '''Helper class for autopep8 options, just return None for unknown/new options'''
+
+        select = options.get('select')
+        ignore = options.get('ignore')
+        pep8_passes = options.get('passes')
+        max_line_length = options.get('max_line_length')
+        verbose = False
+        aggressive = True
+
+        def __getattr__(self, name):
+            return self.__dict__.get(name)
+
+    fixed = autopep8.fix_code(source, options=OptionsClass())
+    dst.write(fixed)
+
+
+def _parse_phpcs(output, stderr, paths):
+    reader = csv.DictReader(output.splitlines(), delimiter=',', doublequote=False, escapechar='\\')
+    for row in reader:
+        yield row['File'], row['Message'], int(row['Line']), int(row['Column'])
+
+
+@message('is not phpcs (%(standard)s standard) formatted')
+@linter(lambda options: ['phpcs', '-n', '--report=csv', '--standard=' + options['standard'],
+        '--encoding=' + options['encoding']], _parse_phpcs)
+def _validate_phpcs(fd, options):
+    """validate a PHP file to conform to PHP_CodeSniffer standards
+
+    Needs a locally installed phpcs ("pear install PHP_CodeSniffer").
+    Look at https://github.com/klaussilveira/phpcs-psr to get the PSR standard (sniffs)."""
+
+    return run_linter('phpcs', fd, options)
+
+
+def _parse_jshint(output, stderr, paths):
+    tree = xmlfromstring(output.encode('utf-8'))
+    for file_elem in tree.findall('file'):
+        for elem in file_elem.findall('issue'):
+            yield file_elem.attrib['name'], elem.attrib['reason'], int(elem.attrib['line']), int(elem.attrib['char'])
+
+
+@message('has jshint warnings/errors')
+@linter(lambda options: ['jshint', '--reporter=jslint', '--config', os.path.join(BASE_DIR, 'config/jshint.json')],
+        _parse_jshint)
+def _validate_jshint(fd, options=None):
+    return run_linter('jshint', fd, options)
+
+
+def _parse_coffeelint(output, stderr, paths):
+    if stderr:
+        yield None, stderr, None, None
+    for row in csv.DictReader(output.splitlines()):
+        yield row['path'], row['message'], int(row['lineNumber']), None
+
+
+@message('fails coffeelint validation')
+@linter(lambda options: ['coffeelint', '--reporter', 'csv', '-f', os.path.join(BASE_DIR, 'config/coffeelint.json')],
+        _parse_coffeelint)
+def _validate_coffeelint(fd, options=None):
+    """validate a CoffeeScript file
+
+    Needs a locally installed coffeelint ("npm install -g coffeelint").
+    """
+
+    return run_linter('coffeelint', fd, options)
+
+
+# location of a puppet parser error, e.g. "(file: /x.pp, line: 3, column: 5)" or "at /x.pp:3:5"
+PUPPET_LOCATION = re.compile(r'\(file: (?P<path>.+?), line: (?P<line>\d+)(?:, column: (?P<column>\d+))?\)|'
+                             r' at (?P<path2>\S+?):(?P<line2>\d+)(?::(?P<column2>\d+))?$')
+
+
+def _parse_puppet(output, stderr, paths):
+    for line in (output + stderr).splitlines():
+        if not line.strip():
+            continue
+        match = PUPPET_LOCATION.search(line)
+        if not match:
+            yield None, line, None, None
+            continue
+        path, lineno, column = (match.group('path', 'line', 'column') if match.group('path') else
+                                match.group('path2', 'line2', 'column2'))
+        yield path, line, int(lineno), (int(column) if column else None)
+
+
+@message('fails puppet parser validation')
+@linter(lambda options: ['puppet', 'parser', 'validate', '--color=false', '--confdir=/tmp', '--vardir=/tmp'],
+        _parse_puppet, env={'HOME': '/tmp', 'PATH': '/bin:/sbin:/usr/bin:/usr/sbin'})
+def _validate_puppet(fd):
+    return run_linter('puppet', fd)
+
+
+@message('is not valid ruby')
+def _validate_ruby(fd):
+    retcode, output, stderr = run_tool(["ruby", "-c"], 'ruby', input=fd.read())
+    if output.strip() != b'Syntax OK' or retcode != 0:
+        _detail("ruby parser exited with %d: %s" % (retcode, stderr.decode('utf-8', 'replace')))
+        return False
+    return True
+
+
+@message('is not rubocop formatted ruby code')
+@linter(lambda options: ['rubocop', '--format', 'emacs'], lambda output, stderr, paths: _parse_locations(output, paths))
+def _validate_rubocop(fd):
+    return run_linter('rubocop', fd)
+
+
+@message('is not valid ERB template')
+def _validate_erb(fd):
+    # the Ruby code generated from the template is checked
+    retcode, code, stderr = run_tool([
+        'erb',
+        '-P',
+        '-x',
+        '-T',
+        '-',
+    ], 'erb', input=fd.read())
+    retcode, output, stderr = run_tool(['ruby', '-c'], 'erb', input=code)
+    if output.strip() != b'Syntax OK' or retcode != 0:
+        return False
+    return True
+
+
+@message('has incomplete Maven POM description')
+def _validate_pomdesc(fd):
+    """check Maven POM for title, description and organization"""
+
+    NS = '{http://maven.apache.org/POM/4.0.0}'
+    PROJECT_NAME_REGEX = re.compile(r'^[a-z][a-z0-9-]*$')
+    # paths (below the project element) of the checked texts
+    paths = {
+        (NS + 'artifactId', ): 'name',
+        (NS + 'name', ): 'title',
+        (NS + 'description', ): 'description',
+        (NS + 'organization', NS + 'name'): 'organization',
+    }
+    texts = {}
+    try:
+        with contextlib.closing(_source(fd).stream()) as stream:
+            for path, elem in iterparse_xml(stream):
+                key = paths.get(tuple(path[1:]))
+                if key and key not in texts:
+                    texts[key] = elem.text or ''
+                    if len(texts) == len(paths):
+                        # the rest of the POM is not needed
+                        break
+    except Exception as e:
+        _detail('%s: %s' % (e.__class__.__name__, e))
+        return False
+    name = texts.get('name')
+    title = texts.get('title')
+    if title == '${project.artifactId}':
+        title = name
+    description = texts.get('description')
+    organization = texts.get('organization')
+
+    if not name or not PROJECT_NAME_REGEX.match(name):
+        _detail('has invalid name (does not match %s)' % PROJECT_NAME_REGEX.pattern)
+    if not title:
+        _detail('is missing title (<name>...</name>)')
+    elif title.lower() == name.lower():
+        _detail('has same title as name/artifactId')
+    if not description:
+        _detail('is missing description (<description>..</description>)')
+    elif len(description.split()) < 3:
+        _detail('has a too short description')
+    if not organization:
+        _detail('is missing organization (<organization><name>..</name></organization>)')
+    return not current_result().details
+
+
+@message('SQL file ends without a semicolon')
+def _validate_sql_semi_colon(fd, options={}):
+    import sqlparse
+    sql = fd.read()
+    sql_without_comments = sqlparse.format(sql, strip_comments=True).strip()
+    return (sql_without_comments[-1] == ';' if sql_without_comments else True)
+
+
+def _fix_sql_semi_colon(src, dst, options={}):
+    original = src.read()
+    dst.write(original)
+    dst.write('''
+;
+''')
+
+
+@message('doesn\'t pass Pyflakes validation')
+def _validate_pyflakes(fd, options={}):
+    '''
+    >>> _validate_pyflakes(BytesIO(b'import os\\n'))
+    False
+    >>> current_result().details[-1]
+    ("'os' imported but unused", 1, 1)
+    '''
+    from pyflakes import checker
+
+    try:
+        tree = ast.parse(_source(fd).data, getattr(fd, 'name', None) or '<stdin>')
+    except SyntaxError as e:
+        _detail(e.msg, e.lineno, e.offset)
+        return False
+    messages = checker.Checker(tree, getattr(fd, 'name', None) or '<stdin>').messages
+    for message in sorted(messages, key=lambda message: (message.lineno, getattr(message, 'col', 0))):
+        column = getattr(message, 'col', None)
+        _detail(message.message % message.message_args, message.lineno, (None if column is None else column + 1))
+    return not messages
+
+
+@message('contains syntax errors')
+def _validate_database_dir(fd, options={}):
+    fname = fd.name
+    if 'database/lounge' in fname or not fnmatch.fnmatch(fname, '*.sql'):
+        return True
+    pgsqlparser_bin = options.get('pgsql-parser-bin', '/opt/codevalidator/PgSqlParser')
+    if not os.path.isfile(pgsqlparser_bin):
+        raise ExecutionError('PostgreSQL parser binary not found, please set "pgsql-parser-bin" option')
+
+    try:
+        with source_path(fd) as path:
+            return_code = run_tool([
+                pgsqlparser_bin,
+                '-q',
+                '-c',
+                '-i',
+                path,
+            ], 'database_dir')[0]
+        return return_code == 0
+    except ToolTimeoutError:
+        raise
+    except:
+        return False
+
+
+def _validate_sql_diff_dir(fd, options=None):
+    fname = fd.name
+    allowed_file_types = [
+        '*.sql_diff',
+        '*.py',
+        '*.yml',
+        '*.txt',
+        '*.md',
+    ]
+    if not any(fnmatch.fnmatch(fname, each) for each in allowed_file_types):
+        return 'dbdiffs and migration scripts should use .sql_diff, .py, .yml, .md or .txt extension'
+
+    dirs = get_dirs(fname)
+    basedir = dirs[-2]
+    filename = dirs[-1]
+
+    if not re.match('^[A-Z]+-[0-9]+', basedir):
+        return 'Patch should be located in directory with the name of the jira ticket'
+
+    if not filename.startswith(basedir):
+        return 'Filename should start with the parent directory name'
+
+    return True
+
+
+def _validate_sql_diff_sql(fd, options=None):
+    head, filename = os.path.split(fd.name)
+
+    if filename.endswith('.py') or filename.endswith('.yml'):
+        return True
+
+    sql = fd.read().decode('utf-8', 'replace')
+    has_set_role = re.search('[Ss][Ee][Tt] +[Rr][Oo][Ll][Ee] +[Tt][Oo] +zalando(_admin)?\s*', sql)
+    has_set_project_schema_owner_role = \
+        re.search('''^ *select zz_utils\.set_project_schema_owner_role\('\w+'\);''',
+                  sql, re.MULTILINE + re.IGNORECASE)
+    if not (has_set_role or has_set_project_schema_owner_role):
+        return 'set role to zalando; or SELECT zz_utils.set_project_schema_owner_role(); must be present in db diff'
+
+    if re.search('^ *\\\\cd +', sql, re.MULTILINE):
+        return "\cd : is not allowed in db diffs anymore"
+
+    for m in re.finditer('^ *\\\\i +([^\s]+)', sql, re.MULTILINE):
+        if not m.group(1).startswith('database/'):
+            return 'include path (\i ) should starts with `database/` directory'
+
+    if fnmatch.fnmatch(filename, '*rollback*'):
+        if not fnmatch.fnmatch(filename, '*.rollback.sql_diff'):
+            return 'rollback script should have .rollback.sql_diff extension'
+        patch_name = filename.replace('.rollback.sql_diff', '')
+        re_patch_name = re.escape(patch_name)
+        pattern = \
+            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.unregister_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
+        if not re.search(pattern, sql, re.MULTILINE):
+            return 'unregister patch not found or patch name does not match with filename'
+    else:
+        patch_name = filename.replace('.sql_diff', '')
+        re_patch_name = re.escape(patch_name)
+        pattern = \
+            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.register_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
+        if not re.search(pattern, sql, re.MULTILINE):
+            return 'register patch not found or patch name does not match with filename'
+
+    return True
+
+
+VALIDATION_ERRORS = []
+VALIDATION_DETAILS = []
+
+
+class ValidationResult(object):
+
+    '''errors, details and output messages collected while validating files'''
+
+    def __init__(self, errors=None, details=None, messages=None):
+        self.errors = ([] if errors is None else errors)
+        self.details = ([] if details is None else details)
+        # output messages are printed directly if None
+        self.messages = messages
+        # (rule, message, details) of each error, used to replay errors of unchanged files (FileIndex)
+        self.verdicts = []
+        # set if a rule could not be executed, i.e. verdicts are not reproducible
+        self.incomplete = False
+
+
+# result of the serial code path, i.e. the module-global VALIDATION_ERRORS and VALIDATION_DETAILS lists
+GLOBAL_RESULT = ValidationResult(VALIDATION_ERRORS, VALIDATION_DETAILS)
+
+_LOCAL = threading.local()
+
+
+def current_result():
+    '''return the ValidationResult errors and details are currently collected in'''
+
+    return getattr(_LOCAL, 'result', None) or GLOBAL_RESULT
+
+
+@contextlib.contextmanager
+def collect_results():
+    '''collect errors, details and output messages into a fresh ValidationResult (instead of the module globals)'''
+
+    previous = getattr(_LOCAL, 'result', None)
+    _LOCAL.result = result = ValidationResult(messages=[])
+    try:
+        yield result
+    finally:
+        _LOCAL.result = previous
+
+
+def _error(fname, rule, func, message=None):
+    '''output the collected error messages and also print details if verbosity > 0'''
+
+    if not message:
+        message = func.message
+    details = current_result().details
+    _report(fname, rule, message % CONFIG.get('options', {}).get(rule, {}), details[:])
+    details[:] = []
+
+
+def _report(fname, rule, message, details):
+    '''output the error message of a rule and its details and record the error'''
+
+    result = current_result()
+    notify('{0}: {1}'.format(fname, message))
+    if CONFIG['verbose']:
+        for detail, line, column in details:
+            if line and column:
+                notify('  line {0}, col {1}: {2}'.format(line, column, detail))
+            elif line:
+                notify('  line {0}: {1}'.format(line, detail))
+            else:
+                notify('  {0}'.format(detail))
+    result.errors.append((fname, rule))
+    result.verdicts.append((rule, message, details))
+
+
+def _detail(message, line=None, column=None):
+    current_result().details.append((message, line, column))
+
+
+def validate_file_dir_rules(fname, source=None):
+    '''validate a file with the rules of its directories, returns the SourceFile (None if there are no such rules)'''
+
+    fullpath = os.path.abspath(fname)
+    dirs = get_dirs(fullpath)
+    dirrules = sum([CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in dirs], [])
+    if dirrules and source is None:
+        source = read_source(fname)
+    for rule in dirrules:
+        logging.debug('Validating %s with %s..', fname, rule)
+        source.seek(0)
+        func = globals().get('_validate_' + rule)
+        if not func:
+            notify(rule, 'does not exist')
+            current_result().incomplete = True
+            continue
+        options = CONFIG.get('options', {}).get(rule)
+        try:
+            if options:
+                res = func(source, options)
+            else:
+                res = func(source)
+        except ToolTimeoutError as e:
+            current_result().incomplete = True
+            _error(fname, rule, func, 'TIMEOUT validating {0}: {1}'.format(rule, e))
+        except Exception as e:
+
+            current_result().incomplete = True
+            _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
+        else:
+            if not res:
+                _error(fname, rule, func)
+            elif type(res) == str:
+                _error(fname, rule, func, res)
+    return source
+
+
+def open_file_for_read(fn):
+    global STDIN_CONTENTS
+    if CONFIG['filter_mode']:
+        if STDIN_CONTENTS is None:
+            STDIN_CONTENTS = StringIO(sys.stdin.read())
+            STDIN_CONTENTS.name = fn
+
+        @contextlib.contextmanager
+        def stdin_wrapper():
+            STDIN_CONTENTS.seek(0)
+            yield STDIN_CONTENTS
+        return stdin_wrapper()
+    else:
+        return open(fn, 'rb')
+
+
+def open_file_for_write(fn):
+    if CONFIG['filter_mode']:
+        return sys.stdout
+    else:
+        return open(fn, 'wb')
+
+
+def notify(*args):
+    if not CONFIG['quiet']:
+        messages = current_result().messages
+        if messages is None:
+            print(*args)
+        else:
+            messages.append(' '.join(str(arg) for arg in args))
+
+
+def read_source(fname):
+    '''read the contents of the given file (STDIN in filter mode) into a SourceFile'''
+
+    with open_file_for_read(fname) as fd:
+        if not CONFIG['filter_mode'] and os.fstat(fd.fileno()).st_size >= LARGE_FILE_SIZE:
+            # read on first use (if a rule needs all contents in memory)
+            return SourceFile(fname, None, fname)
+        data = fd.read()
+    if not isinstance(data, bytes):
+        # filter mode reads decoded STDIN on Python 3
+        data = data.encode('utf-8')
+    return SourceFile(fname, data, (None if CONFIG['filter_mode'] else fname))
+
+
+def _names_file(fname, entry):
+    '''check whether the result or details of a cache entry contain the name of the file (fname or its basename)
+
+    >>> _names_file('src/a.py', {'result': False, 'details': [('a.py:1: unused import', 1, None)]})
+    True
+    >>> _names_file('src/a.py', {'result': False, 'details': [('unused import', 1, None)]})
+    False
+    '''
+
+    # compared in JSON (like stored in the cache) to handle text and byte strings alike
+    return json.dumps(os.path.basename(fname))[1:-1] in json.dumps([entry['result'], entry['details']])
+
+
+def validate_file_with_rules(fname, rules, source=None):
+    cache = get_result_cache()
+    scanned_rules = SCANNED_RULES.intersection(rules)
+    if source is None:
+        source = read_source(fname)
+    digest = (source.digest if cache else None)
+    scanned = (scan_chunks(source.chunks(), scanned_rules) if len(scanned_rules) > 1 else {})
+    for rule in rules:
+        logging.debug('Validating %s with %s..', fname, rule)
+        source.seek(0)
+        func = globals().get('_validate_' + rule)
+        if not func:
+            notify(rule, 'does not exist')
+            current_result().incomplete = True
+            continue
+        options = CONFIG.get('options', {}).get(rule)
+        details = current_result().details
+        first_detail = len(details)
+        key = (_cache_key(digest, rule, options) if cache and rule not in UNCACHED_RULES | set(scanned) else None)
+        entry = (cache.get(key) if key else None)
+        if entry and entry.get('name', fname) != fname:
+            # the details name another file with the same contents
+            entry = None
+        try:
+            if rule in scanned:
+                res = scanned[rule]
+            elif entry:
+                logging.debug('Using cached result of %s for %s', rule, fname)
+                res = entry['result']
+                details.extend(tuple(detail) for detail in entry['details'])
+            elif options:
+                res = func(source, options)
+            else:
+                res = func(source)
+        except ToolTimeoutError as e:
+            current_result().incomplete = True
+            _error(fname, rule, func, 'TIMEOUT validating {0}: {1}'.format(rule, e))
+        except Exception as e:
+            current_result().incomplete = True
+            _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
+        else:
+            if key and not entry:
+                entry = {'result': res, 'details': details[first_detail:]}
+                if _names_file(fname, entry):
+                    entry['name'] = fname
+                cache.put(key, entry)
+            if not res:
+                _error(fname, rule, func)
+            elif type(res) == str:
+                _error(fname, rule, func, res)
+
+
+def is_excluded(fname):
+    '''check whether the file is excluded from validation by the exclude_dirs or exclude_files options'''
+
+    for exclude in CONFIG['exclude_dirs']:
+        if '/%s/' % exclude in fname:
+            return True
+    head, tail = os.path.split(fname)
+    return compile_globs(CONFIG['exclude_files']).match(tail)
+
+
+def has_rules(fname):
+    '''check whether any rule (of the file name pattern or of a directory) validates the file'''
+
+    if is_excluded(fname):
+        return False
+    dirs = get_dirs(os.path.abspath(fname))
+    return bool(matching_rules(fname)) or any(CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in dirs)
+
+
+def validate_file(fname, source=None):
+    '''validate a file with all matching rules, the file is read only once (unless source is given)'''
+
+    if is_excluded(fname):
+        return
+    source = validate_file_dir_rules(fname, source)
+    for rules in matching_rules(fname):
+        if source is None:
+            source = read_source(fname)
+        validate_file_with_rules(fname, rules, source)
+
+
+def _gitignore_regex(pattern):
+    '''translate a .gitignore pattern into a regex matching paths relative to the directory of the ignore file
+
+    >>> [bool(re.match(_gitignore_regex(p), 'doc/a/b.txt')) for p in ['*.txt', '/*.txt', 'doc/**/*.txt', 'a']]
+    [True, False, True, False]
+    '''
+
+    # patterns with a slash (not at the end) are relative to the ignore file's directory
+    anchored = '/' in pattern
+    if pattern.startswith('/'):
+        pattern = pattern[1:]
+    res = [('' if anchored else '(?:.*/)?')]
+    i, n = 0, len(pattern)
+    while i < n:
+        at_component_start = (i == 0 or pattern[i - 1] == '/')
+        if at_component_start and pattern.startswith('**/', i):
+            res.append('(?:.*/)?')
+            i += 3
+        elif at_component_start and i + 2 == n and pattern.startswith('**', i):
+            res.append('.*')
+            i += 2
+        else:
+            c = pattern[i]
+            i += 1
+            if c == '*':
+                res.append('[^/]*')
+            elif c == '?':
+                res.append('[^/]')
+            elif c == '\\' and i < n:
+                res.append(re.escape(pattern[i]))
+                i += 1
+            elif c == '[' and pattern.find(']', i + 1) > 0:
+                j = pattern.find(']', i + 1)
+                stuff = pattern[i:j].replace('\\', '\\\\')
+                i = j + 1
+                if stuff[0] == '!':
+                    stuff = '^' + stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = '\\' + stuff
+                res.append('[%s]' % stuff)
+            else:
+                res.append(re.escape(c))
+    res.append('\\Z')
+    return ''.join(res)
+
+
+class IgnoreFile(object):
+
+    '''patterns of a .gitignore (or .cvignore) file, matched against paths relative to the file's directory'''
+
+    def __init__(self, lines):
+        # list of (regex, negate, directories only)
+        self.patterns = []
+        for line in lines:
+            line = line.rstrip('\n\r')
+            if not line or line.startswith('#'):
+                continue
+            pattern = line.rstrip(' ')
+            if pattern.endswith('\\') and len(pattern) < len(line):
+                # escaped trailing space
+                pattern += ' '
+            negate = pattern.startswith('!')
+            if negate:
+                pattern = pattern[1:]
+            dirs_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if pattern:
+                self.patterns.append((re.compile(_gitignore_regex(pattern), re.DOTALL), negate, dirs_only))
+
+    @classmethod
+    def read(cls, fname):
+        with open(fname, 'rb') as fd:
+            return cls(fd.read().decode('utf-8', 'replace').splitlines())
+
+    def match(self, path, is_dir):
+        '''return True if path is ignored, False if it is negated ("!") or None if no pattern matches'''
+
+        for regex, negate, dirs_only in reversed(self.patterns):
+            if (is_dir or not dirs_only) and regex.match(path):
+                return not negate
+        return None
+
+
+def _read_ignore_files(directory, names):
+    '''return a list of (IgnoreFile, path prefix) for all configured ignore files in directory'''
+
+    ignores = []
+    for name in CONFIG['ignore_files']:
+        if name in names:
+            try:
+                ignores.append((IgnoreFile.read(os.path.join(directory, name)), ''))
+            except (IOError, OSError) as e:
+                logging.warning('Failed to read ignore file %s: %s', os.path.join(directory, name), e)
+    return ignores
+
+
+def _parent_ignore_files(path):
+    '''return a list of (IgnoreFile, path prefix) for ignore files in the parent directories of path
+
+    Parent directories are only considered up to the root of the GIT repository containing path.
+    '''
+
+    path = os.path.abspath(path)
+    ignores = []
+    prefix = ''
+    while not os.path.exists(os.path.join(path, '.git')):
+        parent, name = os.path.split(path)
+        if not name:
+            # not within a GIT repository
+            return []
+        prefix = name + '/' + prefix
+        path = parent
+        ignores[:0] = [(ignore_file, prefix) for ignore_file, _ in _read_ignore_files(path, os.listdir(path))]
+    return ignores
+
+
+def _is_ignored(name, is_dir, ignores):
+    '''check whether name is ignored by the given list of (IgnoreFile, path prefix) (innermost last)'''
+
+    for ignore_file, prefix in reversed(ignores):
+        ignored = ignore_file.match(prefix + name, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+class _DirEntry(object):
+
+    '''minimal replacement of os.DirEntry for Python 2 without the scandir backport'''
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+def _scandir(path):
+    if scandir is None:
+        return [_DirEntry(path, name) for name in os.listdir(path)]
+    return list(scandir(path))
+
+
+def walk_directory(path, exclude_patterns, include_patterns):
+    '''generate DirEntry objects for all files below path which should be validated (in os.walk order)
+
+    Directories are pruned before descending into them if they match an "exclude_dirs" pattern or if an exclude
+    pattern matches all of their contents (i.e. the pattern ends with "*" like "node_modules/*").
+    With the "use_ignore_files" option, files and directories ignored by .gitignore/.cvignore files
+    ("ignore_files" option) in the walked directories and their parents (up to the GIT root) are skipped as well.
+    '''
+
+    exclude_patterns = [os.path.join(path, pattern) for pattern in exclude_patterns or []]
+    include_patterns = [os.path.join(path, pattern) for pattern in include_patterns or []]
+    excluded = compile_globs(exclude_patterns)
+    included = compile_globs(include_patterns)
+    excluded_dirs = compile_globs(CONFIG['exclude_dirs'])
+    # include patterns might match files in excluded directories, so we cannot prune them in that case
+    pruned = compile_globs([] if include_patterns else [pattern for pattern in exclude_patterns
+                                                        if pattern.endswith('*')])
+    use_ignore_files = CONFIG.get('use_ignore_files')
+    # stack of directories to walk with the list of (IgnoreFile, path prefix) applying to them
+    stack = [(path, (_parent_ignore_files(path) if use_ignore_files else []))]
+    while stack:
+        directory, ignores = stack.pop()
+        try:
+            entries = _scandir(directory)
+        except OSError:
+            # unreadable directories are ignored (like os.walk does)
+            continue
+        if use_ignore_files:
+            ignores = ignores + _read_ignore_files(directory, set(entry.name for entry in entries))
+        dirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if ignores and _is_ignored(entry.name, is_dir, ignores):
+                continue
+            if is_dir:
+                if not (entry.is_symlink() or excluded_dirs.match(entry.name) or pruned.match(entry.path + os.sep)):
+                    subdir_ignores = [(ignore_file, prefix + entry.name + '/') for ignore_file, prefix in ignores]
+                    dirs.append((entry.path, subdir_ignores))
+                continue
+            match_excluded = excluded.match(entry.path)
+            match_included = included.match(entry.path)
+
+            if exclude_patterns:
+                validate = not match_excluded or match_included
+            else:
+                validate = match_included or not include_patterns
+
+            if validate:
+                yield entry
+        stack.extend(reversed(dirs))
+
+
+def iter_directory(path, exclude_patterns, include_patterns):
+    '''generate the names of all files below path which should be validated'''
+
+    for entry in walk_directory(path, exclude_patterns, include_patterns):
+        yield entry.path
+
+
+def validate_directory(path, exclude_patterns, include_patterns):
+    for fname in iter_directory(path, exclude_patterns, include_patterns):
+        validate_file(fname)
+
+
+def _index_stat(st):
+    '''return the stat information recorded in FileIndex entries'''
+
+    return [st.st_size, _mtime_ns(st), st.st_ino]
+
+
+def _is_unchanged(entry, stat, racy_limit):
+    '''check whether a file with the given (recorded) stat is unchanged since its FileIndex entry was written'''
+
+    return entry is not None and entry['stat'] == stat and stat[1] < racy_limit
+
+
+def validate_indexed_file(fname, entry, racy_limit, st=None, source=None):
+    '''validate a file unless its FileIndex entry is still up to date and return the new entry
+
+    Returns None if the file could not be validated completely (e.g. because an external tool is missing).
+    The stat result st and the SourceFile of the file can be passed if already known (e.g. from a DirEntry).
+    '''
+
+    if not has_rules(fname):
+        # not read at all (like by validate_file)
+        return None
+    if st is None:
+        st = os.stat(fname)
+    stat = _index_stat(st)
+    if _is_unchanged(entry, stat, racy_limit):
+        logging.debug('Using indexed result for unchanged file %s', fname)
+        verdicts = entry['verdicts']
+    else:
+        if source is None:
+            source = read_source(fname)
+        digest = source.digest
+        if entry and entry['digest'] == digest:
+            logging.debug('Using indexed result for file %s with unchanged contents', fname)
+            verdicts = entry['verdicts']
+        else:
+            result = current_result()
+            first_verdict = len(result.verdicts)
+            validate_file(fname, source)
+            if result.incomplete:
+                return None
+            return {'stat': stat, 'digest': digest, 'verdicts': result.verdicts[first_verdict:]}
+    for rule, message, details in verdicts:
+        _report(fname, rule, message, details)
+    return {'stat': stat, 'digest': entry['digest'], 'verdicts': verdicts}
+
+
+class GitCatFile(object):
+
+    '''long-running "git cat-file --batch" process reading objects from the GIT object store'''
+
+    def __init__(self):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, name):
+        '''return the contents of the given object (None if it does not exist)'''
+
+        self.process.stdin.write(name.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            # "<name> missing"
+            return None
+        data = self.process.stdout.read(int(header[2]))
+        # skip the newline terminating the contents
+        self.process.stdout.read(1)
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def _git_diff_command(revisions):
+    '''return the "git diff" command listing files changed in revisions ("--cached" for the staged changes)'''
+
+    cmd = ['git', 'diff', '--raw', '-z', '--no-abbrev', '--no-renames', '--diff-filter=ACMT']
+    if revisions == '--cached':
+        return cmd + ['--cached']
+    if '..' in revisions:
+        return cmd + [revisions]
+    # a single revision: changes up to HEAD
+    return cmd + [revisions, 'HEAD']
+
+
+def iter_git_sources(revisions, pathspecs=None):
+    '''generate SourceFile objects for all files changed in the given GIT revision range (or staged changes)
+
+    The contents are read straight from the GIT object store by a single "git cat-file" process, i.e. no checkout
+    is needed. File names are relative to the repository root.
+    '''
+
+    cmd = _git_diff_command(revisions) + ['--'] + (pathspecs or [])
+    po = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output, stderr = po.communicate()
+    if po.returncode != 0:
+        raise ExecutionError('Failed to execute {0}: {1}'.format(' '.join(cmd), stderr.decode('utf-8', 'replace')))
+    # ":<src mode> <dst mode> <src sha1> <dst sha1> <status>\0<path>\0" for each file
+    fields = output.split(b'\0')
+    cat_file = GitCatFile()
+    try:
+        for meta, path in zip(fields[0::2], fields[1::2]):
+            dst_mode, dst_sha1 = meta.split()[1:4:2]
+            # skip symbolic links and submodules
+            if dst_mode not in (b'100644', b'100755'):
+                continue
+            if not isinstance(path, str):
+                path = path.decode('utf-8')
+            data = cat_file.read(dst_sha1.decode('ascii'))
+            if data is not None:
+                yield SourceFile(path, data)
+    finally:
+        cat_file.close()
+
+
+def iter_manifest_sources(stream):
+    '''generate SourceFile objects from a manifest stream
+
+    The manifest consists of a record for each file: a header line "<length> <path>" followed by the length bytes
+    of the file contents.
+
+    >>> for source in iter_manifest_sources(BytesIO(b'3 a.txt\\nfoo0 b c.txt\\n')):
+    ...     print(source.name, len(source.data))
+    a.txt 3
+    b c.txt 0
+    '''
 
-    if not name or not PROJECT_NAME_REGEX.match(name):
-        _detail('has invalid name (does not match %s)' % PROJECT_NAME_REGEX.pattern)
-    if not title:
-        _detail('is missing title (<name>...</name>)')
-    elif title.lower() == name.lower():
-        _detail('has same title as name/artifactId')
-    if not description:
-        _detail('is missing description (<description>..</description>)')
-    elif len(description.split()) < 3:
-        _detail('has a too short description')
-    if not organization:
-        _detail('is missing organization (<organization><name>..</name></organization>)')
-    return not VALIDATION_DETAILS
+    while True:
+        header = stream.readline()
+        if not header.strip():
+            if header:
+                # ignore empty lines between records
+                continue
+            break
+        length, _, path = header.rstrip(b'\n').partition(b' ')
+        if not length.isdigit() or not path:
+            raise ExecutionError('Invalid manifest header (expected "<length> <path>"): {0}'.format(
+                                 header.rstrip(b'\n').decode('utf-8', 'replace')))
+        data = stream.read(int(length))
+        if len(data) != int(length):
+            raise ExecutionError('Unexpected end of manifest while reading {0}'.format(path.decode('utf-8')))
+        yield SourceFile(path.decode('utf-8'), data)
 
 
-@message('SQL file ends without a semicolon')
-def _validate_sql_semi_colon(fd, options={}):
-    import sqlparse
-    sql = fd.read()
-    sql_without_comments = sqlparse.format(sql, strip_comments=True).strip()
-    return (sql_without_comments[-1] == ';' if sql_without_comments else True)
+def iter_tar_sources(stream):
+    '''generate SourceFile objects for the regular files in a (optionally compressed) tar stream'''
 
+    with tarfile.open(fileobj=stream, mode='r|*') as tar:
+        for member in tar:
+            if member.isfile():
+                yield SourceFile(member.name, tar.extractfile(member).read())
 
-def _fix_sql_semi_colon(src, dst, options={}):
-    original = src.read()
-    dst.write(original)
-    dst.write('''
-;
-''')
 
+STDIN_FORMATS = {'manifest': iter_manifest_sources, 'tar': iter_tar_sources}
 
-@message('doesn\'t pass Pyflakes validation')
-def _validate_pyflakes(fd, options={}):
-    proc = subprocess.Popen(['pyflakes', fd.name], stderr=subprocess.PIPE)
-    proc.wait()
-    errors = proc.stderr.read().decode().splitlines()
-    for message in errors:
-        error = message.message % message.message_args
-        _detail(error, line=message.lineno)
-    return proc.returncode == 0
 
+def _terminate_worker(signum, frame):
+    '''kill the running external tools of a worker process terminated by the pool (e.g. after Ctrl-C) and exit'''
 
-@message('contains syntax errors')
-def _validate_database_dir(fname, options={}):
-    if 'database/lounge' in fname or not fnmatch.fnmatch(fname, '*.sql'):
-        return True
-    pgsqlparser_bin = options.get('pgsql-parser-bin', '/opt/codevalidator/PgSqlParser')
-    if not os.path.isfile(pgsqlparser_bin):
-        raise ExecutionError('PostgreSQL parser binary not found, please set "pgsql-parser-bin" option')
+    _kill_running_tools()
+    os._exit(1)
 
-    try:
-        with open(os.devnull, 'w') as devnull:
-            return_code = subprocess.call([
-                pgsqlparser_bin,
-                '-q',
-                '-c',
-                '-i',
-                fname,
-            ], stderr=devnull)
-        return return_code == 0
-    except:
-        return False
 
+def _init_worker(config, tool_slots):
+    '''initialize a worker process of the validation pool with the configuration and tool slots of the parent'''
 
-def _validate_sql_diff_dir(fname, options=None):
-    allowed_file_types = [
-        '*.sql_diff',
-        '*.py',
-        '*.yml',
-        '*.txt',
-        '*.md',
-    ]
-    if not any(fnmatch.fnmatch(fname, each) for each in allowed_file_types):
-        return 'dbdiffs and migration scripts should use .sql_diff, .py, .yml, .md or .txt extension'
+    global TOOL_SLOTS
+    # let the parent process handle Ctrl-C (it terminates the pool)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate_worker)
+    CONFIG.update(config)
+    TOOL_SLOTS = tool_slots
 
-    dirs = get_dirs(fname)
-    basedir = dirs[-2]
-    filename = dirs[-1]
 
-    if not re.match('^[A-Z]+-[0-9]+', basedir):
-        return 'Patch should be located in directory with the name of the jira ticket'
+def _is_batched(rule):
+    '''check whether rule can run for several files at once (has a _batch_ function or an external linter)'''
 
-    if not filename.startswith(basedir):
-        return 'Filename should start with the parent directory name'
+    return '_batch_' + rule in globals() or hasattr(globals().get('_validate_' + rule), 'linter')
 
-    return True
 
+def _batch_rules():
+    '''return the configured rules which can run for several files at once'''
 
-def _validate_sql_diff_sql(fname, options=None):
-    head, filename = os.path.split(fname)
+    return sorted(set(rule for rules in CONFIG['rules'].values() for rule in rules if _is_batched(rule)))
 
-    if filename.endswith('.py') or filename.endswith('.yml'):
-        return True
 
-    sql = open(fname).read()
-    has_set_role = re.search('[Ss][Ee][Tt] +[Rr][Oo][Ll][Ee] +[Tt][Oo] +zalando(_admin)?\s*', sql)
-    has_set_project_schema_owner_role = \
-        re.search('''^ *select zz_utils\.set_project_schema_owner_role\('\w+'\);''',
-                  sql, re.MULTILINE + re.IGNORECASE)
-    if not (has_set_role or has_set_project_schema_owner_role):
-        return 'set role to zalando; or SELECT zz_utils.set_project_schema_owner_role(); must be present in db diff'
+def _run_batch(rule, sources):
+    '''run rule for several SourceFiles at once and record the results in BATCH_RESULTS
 
-    if re.search('^ *\\\\cd +', sql, re.MULTILINE):
-        return "\cd : is not allowed in db diffs anymore"
+    If the batch fails, nothing is recorded, i.e. the files are validated separately. If it times out, the
+    ToolTimeoutError is recorded for all files instead (the tool would most likely hang again for each file).
+    '''
 
-    for m in re.finditer('^ *\\\\i +([^\s]+)', sql, re.MULTILINE):
-        if not m.group(1).startswith('database/'):
-            return 'include path (\i ) should starts with `database/` directory'
+    if len(sources) < 2:
+        return
+    options = CONFIG.get('options', {}).get(rule)
+    func = globals().get('_batch_' + rule)
+    logging.debug('Running %s for a batch of %s files..', rule, len(sources))
+    try:
+        if func is None:
+            results = lint_sources(rule, sources, options)
+        else:
+            results = (func(sources, options) if options else func(sources))
+    except ToolTimeoutError as e:
+        results = [e] * len(sources)
+    except Exception as e:
+        logging.debug('Batch of %s failed, running it for each file: %s', rule, e)
+        return
+    for source, result in zip(sources, results):
+        BATCH_RESULTS[(rule, source.name, source.digest)] = result
 
-    if fnmatch.fnmatch(filename, '*rollback*'):
-        if not fnmatch.fnmatch(filename, '*.rollback.sql_diff'):
-            return 'rollback script should have .rollback.sql_diff extension'
-        patch_name = filename.replace('.rollback.sql_diff', '')
-        re_patch_name = re.escape(patch_name)
-        pattern = \
-            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.unregister_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
-        if not re.search(pattern, sql, re.MULTILINE):
-            return 'unregister patch not found or patch name does not match with filename'
-    else:
-        patch_name = filename.replace('.sql_diff', '')
-        re_patch_name = re.escape(patch_name)
-        pattern = \
-            '^ *[Ss][Ee][Ll][Ee][Cc][Tt] +_v\.register_patch *\( *\\\'{patch_name}\\\''.format(patch_name=re_patch_name)
-        if not re.search(pattern, sql, re.MULTILINE):
-            return 'register patch not found or patch name does not match with filename'
 
-    return True
+def _batch_result(rule, fname, digest):
+    '''return the result of rule for the file from a batch run (None if there is none)
 
+    Raises the ToolTimeoutError if the batch timed out.
+    '''
 
-VALIDATION_ERRORS = []
-VALIDATION_DETAILS = []
+    result = BATCH_RESULTS.get((rule, fname, digest))
+    if isinstance(result, ToolTimeoutError):
+        raise result
+    return result
 
 
-def _error(fname, rule, func, message=None):
-    '''output the collected error messages and also print details if verbosity > 0'''
+def _needs_rule(fname, rule):
+    '''check whether the file is validated with the given rule'''
 
-    if not message:
-        message = func.message
-    notify('{0}: {1}'.format(fname, message % CONFIG.get('options', {}).get(rule, {})))
-    if CONFIG['verbose']:
-        for message, line, column in VALIDATION_DETAILS:
-            if line and column:
-                notify('  line {0}, col {1}: {2}'.format(line, column, message))
-            elif line:
-                notify('  line {0}: {1}'.format(line, message))
-            else:
-                notify('  {0}'.format(message))
-    VALIDATION_DETAILS[:] = []
-    VALIDATION_ERRORS.append((fname, rule))
+    return not is_excluded(fname) and any(rule in rules for rules in matching_rules(fname))
 
 
-def _detail(message, line=None, column=None):
-    VALIDATION_DETAILS.append((message, line, column))
+def prefetch_batch(jobs):
+    '''read the files of a batch of jobs (see _file_job) needing batched rules and run these rules once for all files
 
+    The batched rules run concurrently in the ThreadPool (see _thread_pool) before the files are validated.
+    Files which are unchanged according to the FileIndex or have a cached result are skipped.
+    Returns the SourceFile read for each job (None if it was not read).
+    '''
 
-def validate_file_dir_rules(fname):
-    fullpath = os.path.abspath(fname)
-    dirs = get_dirs(fullpath)
-    dirrules = sum([CONFIG['dir_rules'][rule] for rule in CONFIG['dir_rules'] if rule in dirs], [])
-    for rule in dirrules:
-        logging.debug('Validating %s with %s..', fname, rule)
-        func = globals().get('_validate_' + rule)
-        if not func:
-            notify(rule, 'does not exist')
-            continue
+    BATCH_RESULTS.clear()
+    sources = [(SourceFile(job[0], job[1]) if job[1] is not None else None) for job in jobs]
+    cache = get_result_cache()
+    batches = []
+    for rule in _batch_rules():
         options = CONFIG.get('options', {}).get(rule)
-        try:
-            if options:
-                res = func(fname, options)
-            else:
-                res = func(fname)
-        except Exception as e:
+        batch = []
+        for i, (fname, data, entry, racy_limit, st) in enumerate(jobs):
+            if not _needs_rule(fname, rule):
+                continue
+            try:
+                if sources[i] is None:
+                    if racy_limit is not None and _is_unchanged(entry, _index_stat(st or os.stat(fname)), racy_limit):
+                        continue
+                    sources[i] = read_source(fname)
+            except EnvironmentError:
+                # reported when validating the file
+                continue
+            digest = sources[i].digest
+            if entry and entry['digest'] == digest:
+                continue
+            if cache and rule not in UNCACHED_RULES and cache.get(_cache_key(digest, rule, options)):
+                continue
+            batch.append(sources[i])
+        batches.append((rule, batch))
+    pool = _thread_pool()
+    if pool and len(batches) > 1:
+        # the tools of different rules run concurrently (limited by their tool_limits slots)
+        pool.map(lambda args: _run_batch(*args), batches, 1)
+    else:
+        for rule, batch in batches:
+            _run_batch(rule, batch)
+    return sources
 
-            _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
+
+def _validate_file_job(job, source=None):
+    '''validate a single (indexed) file, e.g. in a worker process, and return its index entry and ValidationResult'''
+
+    fname, data, entry, racy_limit, st = job
+    if source is None and data is not None:
+        source = SourceFile(fname, data)
+    with collect_results() as result:
+        if racy_limit is None:
+            validate_file(fname, source)
+            entry = None
         else:
-            if not res:
-                _error(fname, rule, func)
-            elif type(res) == str:
-                _error(fname, rule, func, res)
+            entry = validate_indexed_file(fname, entry, racy_limit, st, source)
+    return fname, entry, result
 
 
-def open_file_for_read(fn):
-    global STDIN_CONTENTS
-    if CONFIG['filter_mode']:
-        if STDIN_CONTENTS is None:
-            STDIN_CONTENTS = StringIO(sys.stdin.read())
-            STDIN_CONTENTS.name = fn
+def _thread_pool():
+    '''return the ThreadPool of this process validating files concurrently (None if the threads option is 1)'''
 
-        @contextlib.contextmanager
-        def stdin_wrapper():
-            STDIN_CONTENTS.seek(0)
-            yield STDIN_CONTENTS
-        return stdin_wrapper()
-    else:
-        return open(fn, 'rb')
+    global THREAD_POOL
+    threads = CONFIG.get('threads') or 1
+    if threads > 1 and (THREAD_POOL is None or THREAD_POOL[0] != os.getpid()):
+        # a pool inherited from the parent process has no threads
+        THREAD_POOL = (os.getpid(), ThreadPool(threads))
+    return (THREAD_POOL[1] if threads > 1 else None)
 
 
-def open_file_for_write(fn):
-    if CONFIG['filter_mode']:
-        return sys.stdout
-    else:
-        return open(fn, 'wb')
+def _validate_batch_job(args):
+    '''validate a batch of files (see prefetch_batch), e.g. in a worker process, and return their results
 
+    The files are validated concurrently by the threads of the process, i.e. while a rule waits for an external tool
+    other rules can run. The number of concurrently running processes of a tool is limited by its tool_limits slot.
+    '''
 
-def notify(*args):
-    if not CONFIG['quiet']:
-        print(*args)
+    global NAILGUN_PORT
+    jobs, NAILGUN_PORT = args
+    args = list(zip(jobs, prefetch_batch(jobs)))
+    pool = _thread_pool()
+    if pool:
+        return pool.map(lambda arg: _validate_file_job(*arg), args, 1)
+    return [_validate_file_job(job, source) for job, source in args]
 
 
-def validate_file_with_rules(fname, rules):
-    with open_file_for_read(fname) as fd:
-        for rule in rules:
-            logging.debug('Validating %s with %s..', fname, rule)
-            fd.seek(0)
-            func = globals().get('_validate_' + rule)
-            if not func:
-                notify(rule, 'does not exist')
-                continue
-            options = CONFIG.get('options', {}).get(rule)
-            try:
-                if options:
-                    res = func(fd, options)
-                else:
-                    res = func(fd)
-            except Exception as e:
-                _error(fname, rule, func, 'ERROR validating {0}: {1}'.format(rule, e))
-            else:
-                if not res:
-                    _error(fname, rule, func)
-                elif type(res) == str:
-                    _error(fname, rule, func, res)
+def _batches(iterable, size):
+    '''generate lists of up to size consecutive items
 
+    >>> list(_batches(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    '''
 
-def validate_file(fname):
-    for exclude in CONFIG['exclude_dirs']:
-        if '/%s/' % exclude in fname:
-            return
-    head, tail = os.path.split(fname)
-    for exclude in CONFIG['exclude_files']:
-        if fnmatch.fnmatch(tail, exclude):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
             return
-    validate_file_dir_rules(fname)
-    for pattern, rules in CONFIG['rules'].items():
-        if fnmatch.fnmatch(fname, pattern):
-            validate_file_with_rules(fname, rules)
+        yield batch
 
 
-def validate_directory(path, exclude_patterns, include_patterns):
-    exclude_patterns = [os.path.join(path, pattern) for pattern in exclude_patterns or []]
-    include_patterns = [os.path.join(path, pattern) for pattern in include_patterns or []]
-    for root, dirnames, filenames in os.walk(path):
-        for exclude in CONFIG['exclude_dirs']:
-            if exclude in dirnames:
-                dirnames.remove(exclude)
-        for fname in filenames:
-            fname = os.path.join(root, fname)
-            match_excluded = any(fnmatch.fnmatch(fname, pattern) for pattern in exclude_patterns)
-            match_included = any(fnmatch.fnmatch(fname, pattern) for pattern in include_patterns)
+def _merge_result(result):
+    '''output the messages of a ValidationResult returned by a worker and record its errors'''
 
-            if exclude_patterns:
-                validate = not match_excluded or match_included
-            else:
-                validate = match_included or not include_patterns
+    for message in result.messages:
+        notify(message)
+    VALIDATION_ERRORS.extend(result.errors)
 
-            if validate:
-                validate_file(fname)
+
+def _run_jobs(func, args, jobs):
+    '''generate func(arg) for all args (in order), computed by a pool of jobs worker processes if jobs > 1
+
+    Only a few args per process are consumed ahead (see JOBS_AHEAD), i.e. args can be read lazily.
+    '''
+
+    if jobs <= 1:
+        for arg in args:
+            yield func(arg)
+        return
+    if any('pep8' in rules for rules in CONFIG['rules'].values()):
+        # the workers inherit the style guide (see get_pep8_style)
+        get_pep8_style(CONFIG.get('options', {}).get('pep8') or {})
+    pool = multiprocessing.Pool(jobs, _init_worker, (CONFIG, get_tool_slots()))
+    try:
+        # pool.imap would consume all args at once (e.g. read all files from GIT or STDIN into memory)
+        pending = deque()
+        for arg in args:
+            pending.append(pool.apply_async(func, (arg, )))
+            if len(pending) > jobs * JOBS_AHEAD:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _file_job(item, index):
+    '''return the arguments of _validate_file_job for a file name, DirEntry or (in-memory) SourceFile'''
+
+    if isinstance(item, SourceFile):
+        return item.name, item.data, None, None, None
+    fname = getattr(item, 'path', item)
+    if not index:
+        return fname, None, None, None, None
+    return fname, None, index.entries.get(fname), index.racy_limit, (item.stat() if hasattr(item, 'stat') else None)
+
+
+def validate_files(fnames, jobs=1):
+    '''validate the given files (names, DirEntry or SourceFile objects) using a pool of jobs processes if jobs > 1
+
+    Results of the workers are merged in the order of fnames, i.e. output and VALIDATION_ERRORS are the same as
+    when validating serially. Files are looked up in the FileIndex (if configured) to skip unchanged files.
+    '''
+
+    index = get_file_index()
+    batches = _batches((_file_job(item, index) for item in fnames), BATCH_SIZE)
+    if jobs <= 1 and not index and not _thread_pool():
+        global NAILGUN_PORT
+        for batch in batches:
+            NAILGUN_PORT = _nailgun_port(batch, 0)
+            for job, source in zip(batch, prefetch_batch(batch)):
+                validate_file(job[0], source)
+        return
+    get_nailgun_pool(jobs)
+    args = ((batch, _nailgun_port(batch, i)) for i, batch in enumerate(batches))
+    for results in _run_jobs(_validate_batch_job, args, jobs):
+        for fname, entry, result in results:
+            _merge_result(result)
+            if index:
+                index.update(fname, entry)
+
+
+def _fix_with_rule(rule, src, dst=None):
+    '''return dst (default: a new StringIO) with the contents of src fixed by the given rule'''
+
+    func = globals()['_fix_' + rule]
+    options = CONFIG.get('options', {}).get(rule)
+    if dst is None:
+        dst = StringIO()
+    if isinstance(dst, (StringIO, BytesIO)):
+        # batched results are looked up by file name
+        dst.name = getattr(src, 'name', None)
+    src.seek(0)
+    if options:
+        func(src, dst, options)
+    else:
+        func(src, dst)
+    return dst
+
+
+def prefetch_fixes(rules_by_file):
+    '''run the batched rules (see prefetch_batch) once for all files to fix
+
+    The input of a batched rule is the file contents fixed by the preceding rules of the file.
+    '''
+
+    global NAILGUN_PORT
+    BATCH_RESULTS.clear()
+    NAILGUN_PORT = _nailgun_port([(fname, ) for fname in rules_by_file if 'jalopy' in rules_by_file[fname]], 0)
+    for rule in _batch_rules():
+        if '_fix_' + rule not in globals():
+            continue
+        batch = []
+        for fname, rules in sorted(rules_by_file.items()):
+            if rule not in rules:
+                continue
+            try:
+                with open_file_for_read(fname) as fd:
+                    src = fd
+                    for preceding in rules[:rules.index(rule)]:
+                        if '_fix_' + preceding in globals():
+                            src = _fix_with_rule(preceding, src)
+                    src.seek(0)
+                    batch.append(SourceFile(fname, src.read()))
+            except Exception:
+                # reported when fixing the file
+                continue
+        _run_batch(rule, batch)
 
 
 def fix_file(fname, rules):
     was_fixed = True
+    dirname, basename = os.path.split(fname)
     if CONFIG.get('create_backup', True):
-        dirname, basename = os.path.split(fname)
         shutil.copy2(fname, os.path.join(dirname, CONFIG['backup_filename'].format(original=basename)))  # creates a backup
-    with open_file_for_read(fname) as fd:
-        dst = fd
-        for rule in rules:
-            func = globals().get('_fix_' + rule)
-            if func:
-                notify('{0}: Trying to fix {1}..'.format(fname, rule))
-                options = CONFIG.get('options', {}).get(rule)
-                src = dst
-                dst = StringIO()
-                src.seek(0)
-                try:
-                    if options:
-                        func(src, dst, options)
-                    else:
-                        func(src, dst)
-                    was_fixed &= True
-                except Exception as e:
-                    was_fixed = False
-                    notify('{0}: ERROR fixing {1}: {2}'.format(fname, rule, e))
-
-    fixed = (dst.getvalue() if hasattr(dst, 'getvalue') else '')
-    # if the length of the fixed code is 0 we don't write the fixed version because either:
-    # a) is not worth it
-    # b) some fix functions destroyed the code
-    if was_fixed and len(fixed) > 0:
-        with open_file_for_write(fname) as fd:
-            fd.write(fixed.encode())
+    # temporary files next to fname receiving the output of the BYTES_FIXES rules (the last one replaces fname)
+    temporary = []
+    try:
+        with open_file_for_read(fname) as fd:
+            dst = fd
+            for rule in rules:
+                if '_fix_' + rule in globals():
+                    notify('{0}: Trying to fix {1}..'.format(fname, rule))
+                    try:
+                        if rule in BYTES_FIXES and not CONFIG['filter_mode']:
+                            temporary.append(tempfile.NamedTemporaryFile(
+                                dir=os.path.dirname(os.path.realpath(fname)), prefix='.' + basename, suffix='.cvfix',
+                                delete=False))
+                            dst = _fix_with_rule(rule, dst, temporary[-1])
+                        else:
+                            dst = _fix_with_rule(rule, dst, (BytesIO() if rule in BYTES_FIXES else None))
+                        was_fixed &= True
+                    except Exception as e:
+                        was_fixed = False
+                        notify('{0}: ERROR fixing {1}: {2}'.format(fname, rule, e))
+
+        if temporary and dst is temporary[-1]:
+            # the fixed contents are not read into memory, the temporary file is renamed into place
+            fixed_size = dst.tell()
+        else:
+            fixed = (dst.getvalue() if hasattr(dst, 'getvalue') else '')
+            fixed_size = len(fixed)
+        # if the length of the fixed code is 0 we don't write the fixed version because either:
+        # a) is not worth it
+        # b) some fix functions destroyed the code
+        if not was_fixed or fixed_size == 0:
+            notify('{0}: ERROR fixing file. File remained unchanged'.format(fname))
+            return False
+        if temporary and dst is temporary[-1]:
+            dst.close()
+            shutil.copymode(fname, dst.name)
+            os.rename(dst.name, os.path.realpath(fname))
+            temporary.pop()
+        else:
+            with open_file_for_write(fname) as fd:
+                if isinstance(fixed, bytes) and CONFIG['filter_mode']:
+                    getattr(fd, 'buffer', fd).write(fixed)
+                else:
+                    fd.write(fixed if isinstance(fixed, bytes) else fixed.encode())
         return True
-    else:
-        notify('{0}: ERROR fixing file. File remained unchanged'.format(fname))
-        return False
+    finally:
+        for tmp in temporary:
+            tmp.close()
+            os.unlink(tmp.name)
 
 
-def fix_files():
-    rules_by_file = defaultdict(list)
-    for fname, rule in VALIDATION_ERRORS:
-        rules_by_file[fname].append(rule)
+def fix_files(rules_by_file=None):
+    '''fix the given files ({file name: rules}, default: all files with validation errors)'''
+
+    if rules_by_file is None:
+        rules_by_file = defaultdict(list)
+        for fname, rule in VALIDATION_ERRORS:
+            rules_by_file[fname].append(rule)
+    prefetch_fixes(rules_by_file)
     for fname, rules in rules_by_file.items():
         fix_file(fname, rules)
 
@@ -919,7 +3424,152 @@ def get_dirs(path):
         return []
 
 
-def main():
+class _FrameWriter(io.RawIOBase):
+
+    '''raw file object sending everything written as frames of the given type over a socket (see serve)'''
+
+    def __init__(self, conn, frame_type):
+        io.RawIOBase.__init__(self)
+        self.conn = conn
+        self.frame_type = frame_type
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = memoryview(data).tobytes()
+        self.conn.sendall(struct.pack('>cI', self.frame_type, len(data)) + data)
+        return len(data)
+
+
+def _frame_stream(conn, frame_type):
+    if running_on_py3:
+        return io.TextIOWrapper(io.BufferedWriter(_FrameWriter(conn, frame_type)), 'utf-8', line_buffering=True)
+    return io.BufferedWriter(_FrameWriter(conn, frame_type))
+
+
+def _handle_request(conn, nailgun_ports=None):
+    '''run main() for the request read from connection conn (in a forked child process)
+
+    Jalopy runs on the given nailgun_ports of the servers managed by the server process. The request is a JSON line with argv, cwd and environment of the client followed by its STDIN. Output is sent
+    back as frames: type "o" (STDOUT) or "e" (STDERR), 4 bytes length and the data. The last frame has type "x" and
+    the exit code as 4 bytes payload.
+    '''
+
+    global NAILGUN_PORTS
+    NAILGUN_PORTS = nailgun_ports
+    stdin = conn.makefile('rb')
+    request = json.loads(stdin.readline().decode('utf-8'))
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    sys.stdin = (io.TextIOWrapper(stdin, 'utf-8') if running_on_py3 else stdin)
+    sys.stdout = _frame_stream(conn, b'o')
+    sys.stderr = _frame_stream(conn, b'e')
+    try:
+        main(request['argv'])
+        code = 0
+    except SystemExit as e:
+        code = e.code
+        if code is None:
+            code = 0
+        elif not isinstance(code, int):
+            print(code, file=sys.stderr)
+            code = 1
+    except:
+        traceback.print_exc()
+        code = 1
+    if NAILGUN_POOL:
+        # only stops a pool started for the options of this request (see NailgunPool.stop)
+        NAILGUN_POOL.stop()
+    for stream in sys.stdout, sys.stderr:
+        try:
+            stream.flush()
+        except ValueError:
+            # already closed (--fix --filter writes to STDOUT with a "with" statement)
+            pass
+    conn.sendall(struct.pack('>cIi', b'x', 4, code))
+
+
+def _warm_up():
+    '''import the Python modules and look up the tool versions used by rules, compile the default rule globs'''
+
+    for rule in TOOL_VERSIONS:
+        _tool_version(rule)
+    for module in 'autopep8', 'pyflakes.checker':
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    for kind in PARSER_BACKENDS:
+        get_backend(kind)
+    compile_globs(list(CONFIG['rules']))
+    compile_globs(CONFIG['exclude_files'])
+
+
+def serve(path, jobs=1):
+    '''listen on Unix socket path and handle each request (see codevalidator_client) in a forked child process
+
+    Imported modules, configuration, compiled globs and tool versions are loaded once and shared by all requests.
+    The nailgun servers (one per job, see NailgunPool) are started and kept running by this process.
+    '''
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(path):
+        try:
+            sock.connect(path)
+        except socket.error:
+            # stale socket of a server which is not running anymore
+            os.unlink(path)
+        else:
+            # do not keep the forked handler of the running server waiting for a request
+            sock.close()
+            raise ExecutionError('Server is already running on {0}'.format(path))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    _warm_up()
+    pool = get_nailgun_pool(jobs)
+    sock.bind(path)
+    sock.listen(64)
+    notify('Listening on {0}'.format(path))
+    try:
+        while True:
+            conn, _ = sock.accept()
+            # (re)started if necessary and kept from stopping while requests come in
+            nailgun_ports = (pool.ports() if pool else None)
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    sock.close()
+                    _handle_request(conn, nailgun_ports)
+                finally:
+                    os._exit(0)
+            conn.close()
+            # reap finished children
+            try:
+                while os.waitpid(-1, os.WNOHANG)[0]:
+                    pass
+            except OSError:
+                pass
+    finally:
+        sock.close()
+        os.unlink(path)
+
+
+def _git_flag(argv):
+    '''return the command line arguments with a bare --git (without "=REV_RANGE") taking no value
+
+    Otherwise the following argument would be used as revision range, e.g. the pathspec of "--git src".
+
+    >>> _git_flag(['--git', 'src', '--', '--git'])
+    ['--git=--cached', 'src', '--', '--git']
+    '''
+
+    end = (argv.index('--') if '--' in argv else len(argv))
+    return [('--git=--cached' if arg == '--git' and i < end else arg) for i, arg in enumerate(argv)]
+
+
+def main(argv=None):
+    global SERVER_CONFIG
     parser = argparse.ArgumentParser(description='Validate source code files and optionally reformat them.')
     parser.add_argument('-r', '--recursive', action='store_true', help='process given directories recursively')
     parser.add_argument('-c', '--config',
@@ -931,12 +3581,48 @@ def main():
     parser.add_argument('--filter', action='store_true',
                         help='special mode to read from STDIN and write to STDOUT, uses provided file name to find matching rules'
                         )
+    parser.add_argument('--use-ignore-files', action='store_true',
+                        help='for -r: skip files ignored by .gitignore or .cvignore files')
     parser.add_argument('-e', '--exclude',  nargs='+', help='file patterns to exclude (only works with -r)')
     parser.add_argument('-i', '--include',  nargs='+', help='file patterns to include (only works with -r)')
-    parser.add_argument('files', metavar='FILES', nargs='+', help='list of source files to validate')
-    args = parser.parse_args()
-
-    for path in DEFAULT_CONFIG_PATHS:
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='cache rule results in DIR and reuse them for files with unchanged contents')
+    parser.add_argument('--index', metavar='FILE',
+                        help='record validated files in index FILE and skip files unchanged since the last run')
+    parser.add_argument('--git', metavar='REV_RANGE', nargs='?', const='--cached',
+                        help='validate the files changed in a GIT revision range (given as --git=REV_RANGE, e.g. '
+                        '--git=origin/master..HEAD, default: staged changes) straight from the object store, FILES are '
+                        'optional pathspecs')
+    parser.add_argument('--cached', '--staged', action='store_true', help='for --git: validate the staged changes')
+    parser.add_argument('--stdin', metavar='FORMAT', choices=sorted(STDIN_FORMATS),
+                        help='validate the files of a manifest ("<length> <path>" line followed by the contents for '
+                        'each file) or tar stream read from STDIN, e.g. for repository hooks')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=1,
+                        help='validate N files in parallel (0: one job per CPU, default: 1)')
+    parser.add_argument('--threads', metavar='N', type=int,
+                        help='validate N files concurrently in each job while external tools run (default: 4)')
+    parser.add_argument('--server', metavar='SOCKET',
+                        help='run as server on Unix socket SOCKET and handle requests of codevalidator_client')
+    parser.add_argument('--backends', action='store_true',
+                        help='print the parser used for JSON, XML and YAML files and exit')
+    parser.add_argument('files', metavar='FILES', nargs='*', help='list of source files to validate')
+    args = parser.parse_args(_git_flag(sys.argv[1:] if argv is None else argv))
+    if args.backends:
+        for line in backends_report():
+            print(line)
+        return
+    if args.cached:
+        if args.git not in (None, '--cached'):
+            parser.error('--cached cannot be combined with a revision range')
+        args.git = '--cached'
+    if args.git is None and args.stdin is None and not args.files and not args.server:
+        parser.error('no FILES given')
+    if args.stdin is not None and (args.files or args.git is not None):
+        parser.error('--stdin cannot be combined with FILES or --git')
+    if (args.git is not None or args.stdin is not None) and (args.fix or args.filter):
+        parser.error('--git and --stdin cannot be combined with --fix or --filter')
+
+    for path in ([] if SERVER_CONFIG else DEFAULT_CONFIG_PATHS):
         config_file = os.path.expanduser(path)
         if os.path.isfile(config_file) and not args.config:
             args.config = config_file
@@ -949,6 +3635,25 @@ def main():
             logging.basicConfig(level=logging.DEBUG, format='%(levelname)s %(message)s')
     if args.no_backup:
         CONFIG['create_backup'] = False
+    if args.cache_dir:
+        CONFIG['cache_dir'] = args.cache_dir
+    if args.index:
+        CONFIG['index_file'] = args.index
+    if args.use_ignore_files:
+        CONFIG['use_ignore_files'] = True
+    if args.threads is not None:
+        CONFIG['threads'] = args.threads
+
+    if args.server:
+        SERVER_CONFIG = args.config
+        try:
+            serve(args.server, args.jobs or multiprocessing.cpu_count())
+        except ExecutionError as e:
+            notify(e)
+            sys.exit(2)
+        except KeyboardInterrupt:
+            pass
+        return
 
     if args.filter:
         if len(args.files) > 1:
@@ -974,13 +3679,31 @@ def main():
                         stdout.write(stdin.read())
     else:
 
-        for f in args.files:
-            if args.recursive and os.path.isdir(f):
-                validate_directory(f, args.exclude, args.include)
-            elif args.apply:
-                fix_file(f, args.apply)
-            else:
-                validate_file(f)
+        fnames = []
+        if args.git is not None:
+            fnames.append(iter_git_sources(args.git, args.files))
+        elif args.stdin is not None:
+            fnames.append(STDIN_FORMATS[args.stdin](getattr(sys.stdin, 'buffer', sys.stdin)))
+        else:
+            applied = OrderedDict()
+            for f in args.files:
+                if args.recursive and os.path.isdir(f):
+                    fnames.append(walk_directory(f, args.exclude, args.include))
+                elif args.apply:
+                    applied[f] = args.apply
+                else:
+                    fnames.append([f])
+            if applied:
+                fix_files(applied)
+        try:
+            validate_files(itertools.chain.from_iterable(fnames), args.jobs or multiprocessing.cpu_count())
+        except ExecutionError as e:
+            notify(e)
+            sys.exit(2)
+        if get_result_cache():
+            get_result_cache().prune()
+        if get_file_index():
+            get_file_index().save()
         if VALIDATION_ERRORS:
             if args.fix:
                 fix_files()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Thin client for a codevalidator server (codevalidator.py --server SOCKET)
+
+Forwards arguments, working directory, environment and STDIN to the server and writes the streamed output,
+the exit code is the one of the server side run. Without a running server codevalidator is run in-process.
+The socket is read from the CODEVALIDATOR_SOCKET environment variable (default: ~/.codevalidator.sock).
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+DEFAULT_SOCKET = '~/.codevalidator.sock'
+
+CHUNK_SIZE = 65536
+
+
+def _read_exactly(fd, size):
+    data = fd.read(size)
+    if len(data) != size:
+        raise EOFError('Connection closed by server')
+    return data
+
+
+def _send_stdin(sock):
+    '''copy our STDIN to the server (unless it is a terminal) and signal its end'''
+
+    try:
+        if not sys.stdin.isatty():
+            while True:
+                # unbuffered, a blocked read must not keep the interpreter from exiting
+                data = os.read(sys.stdin.fileno(), CHUNK_SIZE)
+                if not data:
+                    break
+                sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+    except (IOError, OSError, ValueError):
+        # the server is done and closed the connection
+        pass
+
+
+def run(sock, argv):
+    '''run codevalidator with arguments argv on the server connected to sock, returns the exit code'''
+
+    request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+    sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+    sender = threading.Thread(target=_send_stdin, args=(sock, ))
+    sender.daemon = True
+    sender.start()
+    outputs = {b'o': sys.stdout, b'e': sys.stderr}
+    responses = sock.makefile('rb')
+    while True:
+        frame_type, length = struct.unpack('>cI', _read_exactly(responses, 5))
+        data = _read_exactly(responses, length)
+        if frame_type == b'x':
+            return struct.unpack('>i', data)[0]
+        output = outputs[frame_type]
+        getattr(output, 'buffer', output).write(data)
+        output.flush()
+
+
+def main(argv=None):
+    argv = (sys.argv[1:] if argv is None else argv)
+    path = os.path.expanduser(os.environ.get('CODEVALIDATOR_SOCKET', DEFAULT_SOCKET))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        # no server running
+        import codevalidator
+        codevalidator.main(argv)
+        sys.exit(0)
+    try:
+        code = run(sock, argv)
+    except (EOFError, socket.error) as e:
+        sys.stderr.write('codevalidator_client: {0}\n'.format(e))
+        code = 2
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -565,15 +565,17 @@ def wrap_lines(lines, width, initial_indent=NULL, subsequent_indent=NULL):
 
        # 2007 May 25
 
-    DOC_WRAPPER.width = width
-    DOC_WRAPPER.initial_indent = initial_indent
-    DOC_WRAPPER.subsequent_indent = subsequent_indent
+    wrapper = textwrap.TextWrapper(width=width, initial_indent=initial_indent, subsequent_indent=subsequent_indent,
+                                   expand_tabs=DOC_WRAPPER.expand_tabs,
+                                   replace_whitespace=DOC_WRAPPER.replace_whitespace,
+                                   fix_sentence_endings=DOC_WRAPPER.fix_sentence_endings,
+                                   break_long_words=DOC_WRAPPER.break_long_words)  # Not shared by concurrent runs.
     result = [line.strip() for line in lines]
     result = '\n'.join(result)
     pgraphs = PGRAPH_PATTERN.split(result)
     result = []
     while pgraphs:
-        pgraph = DOC_WRAPPER.fill(pgraphs.pop(ZERO))
+        pgraph = wrapper.fill(pgraphs.pop(ZERO))
         result.extend(pgraph.splitlines())
         if pgraphs:
             result.append(NULL)
@@ -677,7 +679,7 @@ class OutputUnit(object):
 
     """
 
-    def __init__(self, file_out):
+    def __init__(self, file_out, newline='\n'):
         object.__init__(self)
         self.is_file_like = hasattr(file_out, 'write')  # 2007 Jan 22
         if self.is_file_like:
@@ -686,7 +688,7 @@ class OutputUnit(object):
             self.unit = codecs.open(os.path.expanduser(file_out), 'wb', CODING)
         self.blank_line_count = 1
         self.margin = LEFT_MARGIN
-        self.newline = INPUT.newline  # 2006 Dec 05
+        self.newline = newline  # 2006 Dec 05
         self.lineno = ZERO  # 2006 Dec 14
         self.buffer = NULL
         self.chunks = None  # 2009 Oct 26
@@ -886,7 +888,7 @@ class Comments(dict):
 
     """
 
-    def __init__(self):
+    def __init__(self, input_unit, output_unit):
 
         def quote_original(token_type, original):  # 2007 May 01
             if token_type in [tokenize.STRING]:
@@ -979,8 +981,9 @@ class Comments(dict):
                 pass
             return
 
+        self.output = output_unit
         self.literal_pool = {}  # 2007 Jan 14
-        lines = tokenize.generate_tokens(INPUT.readline)
+        lines = tokenize.generate_tokens(input_unit.readline)
         lines = merge_concatenated_strings(lines)  # 2010 Sep 08
         for (
             token_type,
@@ -995,7 +998,7 @@ class Comments(dict):
             erow, ecol = end
             if token_type in [tokenize.COMMENT, tokenize.NL]:
                 original = token_string
-                original = original.decode(INPUT.coding)
+                original = original.decode(input_unit.coding)
                 original = original.replace('\t', DOC_TAB_REPLACEMENT)  # 2007 May 24
                 original = original.strip()
                 if SHEBANG_PATTERN.match(original) is not None:
@@ -1014,7 +1017,7 @@ class Comments(dict):
             elif token_type in [tokenize.NUMBER, tokenize.STRING]:
                                                                     # 2007 Jan 14
                 try:
-                    original = token_string.strip().decode(INPUT.coding, 'backslashreplace')
+                    original = token_string.strip().decode(input_unit.coding, 'backslashreplace')
                     decoded = eval(original)  # 2007 May 01
                     encoded = repr(decoded)
                     if encoded == original or encoded == force_quote(original, double=False):
@@ -1073,17 +1076,17 @@ class Comments(dict):
             if self.prev_lineno in self:
                 scol, token_string = self[self.prev_lineno]
                 if on1 and is_blank_line_needed():
-                    OUTPUT.put_blank_line(1)
+                    self.output.put_blank_line(1)
                 if is_blank():
                     if KEEP_BLANK_LINES:
-#                        OUTPUT.put_blank_line(2)
+#                        self.output.put_blank_line(2)
                         text.append([NA, NULL])  # 2007 May 25
                 else:
                     if scol == NA:  # 2007 May 25
 
                         # Output the Shebang and Coding-Spec.
 
-                        OUTPUT.line_init().line_more(token_string).line_term()
+                        self.output.line_init().line_more(token_string).line_term()
                     else:
                         text.append([scol, token_string])  # 2007 May 25
                 on1 = False
@@ -1113,18 +1116,18 @@ class Comments(dict):
                     text.append([NA, NULL])
         for scol, line in text:  # 2007 May 25
             if scol == NA:
-                OUTPUT.put_blank_line(2)
+                self.output.put_blank_line(2)
             else:
-                OUTPUT.line_init()
+                self.output.line_init()
                 margin_string = margin(scol)
                 if margin_string == '# ' and line.startswith('#'):  # 2010 Mar 10
-                    OUTPUT.line_more('#')  # 2010 Mar 10
+                    self.output.line_more('#')  # 2010 Mar 10
                 else:
-                    OUTPUT.line_more(margin(scol))
-                OUTPUT.line_more(line)
-                OUTPUT.line_term()
+                    self.output.line_more(margin(scol))
+                self.output.line_more(line)
+                self.output.line_term()
         if text and is_blank_line_needed() and not fin:
-            OUTPUT.put_blank_line(3)
+            self.output.put_blank_line(3)
         return self
 
     def put_inline(self, lineno):
@@ -1134,7 +1137,7 @@ class Comments(dict):
             return result
 
         def new_line():
-            OUTPUT.put(OUTPUT.newline)
+            self.output.put(self.output.newline)
             return
 
         text = []  # 2007 May 25
@@ -1146,22 +1149,22 @@ class Comments(dict):
                 else:
                     text.append(token_string)  # 2007 May 25
             self.prev_lineno += 1
-        OUTPUT.line_term(pause=True)  # 2007 May 25
-        col = OUTPUT.pos + 2
+        self.output.line_term(pause=True)  # 2007 May 25
+        col = self.output.pos + 2
         if WRAP_DOC_STRINGS:
             line_length = COL_LIMIT - (col + len(COMMENT_PREFIX))
             line_length = max(line_length, 20)
             text = wrap_lines(text, width=line_length)
         for line in text[:1]:
-            OUTPUT.put(SPACE * 2)
-            OUTPUT.put(COMMENT_PREFIX)
-            OUTPUT.put(line)
+            self.output.put(SPACE * 2)
+            self.output.put(COMMENT_PREFIX)
+            self.output.put(line)
             new_line()
         for line in text[1:]:
-            OUTPUT.line_init()
-            OUTPUT.line_more(margin(col))
-            OUTPUT.line_more(line)
-            OUTPUT.line_term()
+            self.output.line_init()
+            self.output.line_more(margin(col))
+            self.output.line_more(line)
+            self.output.line_term()
         if text:
             pass
         else:
@@ -1187,7 +1190,7 @@ class Name(list):  # 2006 Dec 14
             list.append(self, item)
         return
 
-    def rept_collision(self, key):
+    def rept_collision(self, key, lineno):
         self.append(key)  # 2006 Dec 17
         if len(self) == 1:
             pass
@@ -1195,11 +1198,11 @@ class Name(list):  # 2006 Dec 14
             pass
         else:
             sys.stderr.write("Error:  %s ambiguously replaced by '%s' at line %i.\n" % (str(self), self.new,
-                             OUTPUT.lineno + 1))
+                             lineno + 1))
             self.is_reported = True
         return self
 
-    def rept_external(self, expr):
+    def rept_external(self, expr, lineno):
         if isinstance(expr, NodeName):
             expr = expr.name.str
         else:
@@ -1210,7 +1213,7 @@ class Name(list):  # 2006 Dec 14
             pass
         else:
             sys.stderr.write("Warning:  '%s.%s,' defined elsewhere, replaced by '.%s' at line %i.\n" % (expr,
-                             self[ZERO], self.new, OUTPUT.lineno + 1))
+                             self[ZERO], self.new, lineno + 1))
         return self
 
 
@@ -1223,6 +1226,11 @@ class NameSpace(list):
 
     """
 
+    def __init__(self, output_unit):
+        list.__init__(self)
+        self.output = output_unit
+        return
+
     def push_scope(self):
         self.insert(ZERO, {})
         return self
@@ -1273,7 +1281,7 @@ class NameSpace(list):
             name = rule(name, module=module)  # 2006 Dec 19
         name = Name(name)  # 2006 Dec 14
         name.append(key)
-        name.rept_external(expr)
+        name.rept_external(expr, self.output.lineno)
         return name.new
 
     def make_keyword_name(self, name):
@@ -1290,7 +1298,7 @@ class NameSpace(list):
         for scope in self:
             if key in scope:
                 name = scope[key]
-                name.rept_collision(key)  # 2006 Dec 14
+                name.rept_collision(key, self.output.lineno)  # 2006 Dec 14
                 name = name.new
                 break
         return name
@@ -1303,11 +1311,32 @@ class NameSpace(list):
         return len(self) == 1
 
 
-def transform(indent, lineno, node):
+class Context(object):
+
+    """State of one *tidy_up* run: input, output, comments and names.
+
+    Every node keeps the context it was transformed in, so several
+    runs may proceed concurrently (in threads) and a failed run leaves
+    nothing behind.
+
+    """
+
+    def __init__(self, file_in, file_out):
+        object.__init__(self)
+        self.input = InputUnit(file_in)
+        self.output = OutputUnit(file_out, self.input.newline)
+        self.comments = Comments(self.input, self.output)
+        self.name_space = NameSpace(self.output)
+        self.input_coding = self.input.coding
+        return
+
+
+def transform(ctx, indent, lineno, node):
     """Convert the nodes in the abstract syntax tree returned by the
     *compiler* module to objects with *put* methods.
 
-    The kinds of nodes are a Python Version Dependency.
+    The kinds of nodes are a Python Version Dependency.  The nodes
+    keep the *Context* ctx of the run.
 
     """
 
@@ -1328,63 +1357,64 @@ def transform(indent, lineno, node):
     if isinstance_(node, 'Node') and node.lineno is not None:
         lineno = node.lineno
     if isinstance_(node, 'Add'):
-        result = NodeAdd(indent, lineno, node.left, node.right)
+        result = NodeAdd(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'And'):
-        result = NodeAnd(indent, lineno, node.nodes)
+        result = NodeAnd(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'AssAttr'):
-        result = NodeAsgAttr(indent, lineno, node.expr, node.attrname, node.flags)
+        result = NodeAsgAttr(ctx, indent, lineno, node.expr, node.attrname, node.flags)
     elif isinstance_(node, 'AssList'):
-        result = NodeAsgList(indent, lineno, node.nodes)
+        result = NodeAsgList(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'AssName'):
-        result = NodeAsgName(indent, lineno, node.name, node.flags)
+        result = NodeAsgName(ctx, indent, lineno, node.name, node.flags)
     elif isinstance_(node, 'AssTuple'):
-        result = NodeAsgTuple(indent, lineno, node.nodes)
+        result = NodeAsgTuple(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Assert'):
-        result = NodeAssert(indent, lineno, node.test, node.fail)
+        result = NodeAssert(ctx, indent, lineno, node.test, node.fail)
     elif isinstance_(node, 'Assign'):
-        result = NodeAssign(indent, lineno, node.nodes, node.expr)
+        result = NodeAssign(ctx, indent, lineno, node.nodes, node.expr)
     elif isinstance_(node, 'AugAssign'):
-        result = NodeAugAssign(indent, lineno, node.node, node.op, node.expr)
+        result = NodeAugAssign(ctx, indent, lineno, node.node, node.op, node.expr)
     elif isinstance_(node, 'Backquote'):
-        result = NodeBackquote(indent, lineno, node.expr)
+        result = NodeBackquote(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'Bitand'):
-        result = NodeBitAnd(indent, lineno, node.nodes)
+        result = NodeBitAnd(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Bitor'):
-        result = NodeBitOr(indent, lineno, node.nodes)
+        result = NodeBitOr(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Bitxor'):
-        result = NodeBitXor(indent, lineno, node.nodes)
+        result = NodeBitXor(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Break'):
-        result = NodeBreak(indent, lineno)
+        result = NodeBreak(ctx, indent, lineno)
     elif isinstance_(node, 'CallFunc'):
-        result = NodeCallFunc(indent, lineno, node.node, node.args, node.star_args, node.dstar_args)
+        result = NodeCallFunc(ctx, indent, lineno, node.node, node.args, node.star_args, node.dstar_args)
     elif isinstance_(node, 'Class'):
-        result = NodeClass(indent, lineno, node.name, node.bases, node.doc, node.code)
+        result = NodeClass(ctx, indent, lineno, node.name, node.bases, node.doc, node.code)
     elif isinstance_(node, 'Compare'):
-        result = NodeCompare(indent, lineno, node.expr, node.ops)
+        result = NodeCompare(ctx, indent, lineno, node.expr, node.ops)
     elif isinstance_(node, 'Const'):
-        result = NodeConst(indent, lineno, node.value)
+        result = NodeConst(ctx, indent, lineno, node.value)
     elif isinstance_(node, 'Continue'):
-        result = NodeContinue(indent, lineno)
+        result = NodeContinue(ctx, indent, lineno)
     elif isinstance_(node, 'Decorators'):
-        result = NodeDecorators(indent, lineno, node.nodes)
+        result = NodeDecorators(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Dict'):
-        result = NodeDict(indent, lineno, node.items)
+        result = NodeDict(ctx, indent, lineno, node.items)
     elif isinstance_(node, 'Discard'):
-        result = NodeDiscard(indent, lineno, node.expr)
+        result = NodeDiscard(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'Div'):
-        result = NodeDiv(indent, lineno, node.left, node.right)
+        result = NodeDiv(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Ellipsis'):
-        result = NodeEllipsis(indent, lineno)
+        result = NodeEllipsis(ctx, indent, lineno)
     elif isinstance_(node, 'Exec'):
-        result = NodeExec(indent, lineno, node.expr, node.locals, node.globals)
+        result = NodeExec(ctx, indent, lineno, node.expr, node.locals, node.globals)
     elif isinstance_(node, 'FloorDiv'):
-        result = NodeFloorDiv(indent, lineno, node.left, node.right)
+        result = NodeFloorDiv(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'For'):
-        result = NodeFor(indent, lineno, node.assign, node.list, node.body, node.else_)
+        result = NodeFor(ctx, indent, lineno, node.assign, node.list, node.body, node.else_)
     elif isinstance_(node, 'From'):
-        result = NodeFrom(indent, lineno, node.modname, node.names, node.level)
+        result = NodeFrom(ctx, indent, lineno, node.modname, node.names, node.level)
     elif isinstance_(node, 'Function'):
         result = NodeFunction(
+            ctx,
             indent,
             lineno,
             getattr(node, 'decorators', None),
@@ -1396,95 +1426,95 @@ def transform(indent, lineno, node):
             node.code,
         )
     elif isinstance_(node, 'GenExpr'):
-        result = NodeGenExpr(indent, lineno, node.code)
+        result = NodeGenExpr(ctx, indent, lineno, node.code)
     elif isinstance_(node, 'GenExprFor'):
-        result = NodeGenExprFor(indent, lineno, node.assign, node.iter, node.ifs)
+        result = NodeGenExprFor(ctx, indent, lineno, node.assign, node.iter, node.ifs)
     elif isinstance_(node, 'GenExprIf'):
-        result = NodeGenExprIf(indent, lineno, node.test)
+        result = NodeGenExprIf(ctx, indent, lineno, node.test)
     elif isinstance_(node, 'GenExprInner'):
-        result = NodeGenExprInner(indent, lineno, node.expr, node.quals)
+        result = NodeGenExprInner(ctx, indent, lineno, node.expr, node.quals)
     elif isinstance_(node, 'Getattr'):
-        result = NodeGetAttr(indent, lineno, node.expr, node.attrname)
+        result = NodeGetAttr(ctx, indent, lineno, node.expr, node.attrname)
     elif isinstance_(node, 'Global'):
-        result = NodeGlobal(indent, lineno, node.names)
+        result = NodeGlobal(ctx, indent, lineno, node.names)
     elif isinstance_(node, 'If'):
-        result = NodeIf(indent, lineno, node.tests, node.else_)
+        result = NodeIf(ctx, indent, lineno, node.tests, node.else_)
     elif isinstance_(node, 'IfExp'):
-        result = NodeIfExp(indent, lineno, node.test, node.then, node.else_)
+        result = NodeIfExp(ctx, indent, lineno, node.test, node.then, node.else_)
     elif isinstance_(node, 'Import'):
-        result = NodeImport(indent, lineno, node.names)
+        result = NodeImport(ctx, indent, lineno, node.names)
     elif isinstance_(node, 'Invert'):
-        result = NodeInvert(indent, lineno, node.expr)
+        result = NodeInvert(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'Keyword'):
-        result = NodeKeyword(indent, lineno, node.name, node.expr)
+        result = NodeKeyword(ctx, indent, lineno, node.name, node.expr)
     elif isinstance_(node, 'Lambda'):
-        result = NodeLambda(indent, lineno, node.argnames, node.defaults, node.flags, node.code)
+        result = NodeLambda(ctx, indent, lineno, node.argnames, node.defaults, node.flags, node.code)
     elif isinstance_(node, 'LeftShift'):
-        result = NodeLeftShift(indent, lineno, node.left, node.right)
+        result = NodeLeftShift(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'List'):
-        result = NodeList(indent, lineno, node.nodes)
+        result = NodeList(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'ListComp'):
-        result = NodeListComp(indent, lineno, node.expr, node.quals)
+        result = NodeListComp(ctx, indent, lineno, node.expr, node.quals)
     elif isinstance_(node, 'ListCompFor'):
-        result = NodeListCompFor(indent, lineno, node.assign, node.list, node.ifs)
+        result = NodeListCompFor(ctx, indent, lineno, node.assign, node.list, node.ifs)
     elif isinstance_(node, 'ListCompIf'):
-        result = NodeListCompIf(indent, lineno, node.test)
+        result = NodeListCompIf(ctx, indent, lineno, node.test)
     elif isinstance_(node, 'Mod'):
-        result = NodeMod(indent, lineno, node.left, node.right)
+        result = NodeMod(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Module'):
-        result = NodeModule(indent, lineno, node.doc, node.node)
+        result = NodeModule(ctx, indent, lineno, node.doc, node.node)
     elif isinstance_(node, 'Mul'):
-        result = NodeMul(indent, lineno, node.left, node.right)
+        result = NodeMul(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Name'):
-        result = NodeName(indent, lineno, node.name)
+        result = NodeName(ctx, indent, lineno, node.name)
     elif isinstance_(node, 'Not'):
-        result = NodeNot(indent, lineno, node.expr)
+        result = NodeNot(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'Or'):
-        result = NodeOr(indent, lineno, node.nodes)
+        result = NodeOr(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Pass'):
-        result = NodePass(indent, lineno)
+        result = NodePass(ctx, indent, lineno)
     elif isinstance_(node, 'Power'):
-        result = NodePower(indent, lineno, node.left, node.right)
+        result = NodePower(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Print'):
-        result = NodePrint(indent, lineno, node.nodes, node.dest)
+        result = NodePrint(ctx, indent, lineno, node.nodes, node.dest)
     elif isinstance_(node, 'Printnl'):
-        result = NodePrintnl(indent, lineno, node.nodes, node.dest)
+        result = NodePrintnl(ctx, indent, lineno, node.nodes, node.dest)
     elif isinstance_(node, 'Raise'):
-        result = NodeRaise(indent, lineno, node.expr1, node.expr2, node.expr3)
+        result = NodeRaise(ctx, indent, lineno, node.expr1, node.expr2, node.expr3)
     elif isinstance_(node, 'Return'):
-        result = NodeReturn(indent, lineno, node.value)
+        result = NodeReturn(ctx, indent, lineno, node.value)
     elif isinstance_(node, 'RightShift'):
-        result = NodeRightShift(indent, lineno, node.left, node.right)
+        result = NodeRightShift(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Slice'):
-        result = NodeSlice(indent, lineno, node.expr, node.flags, node.lower, node.upper)
+        result = NodeSlice(ctx, indent, lineno, node.expr, node.flags, node.lower, node.upper)
     elif isinstance_(node, 'Sliceobj'):
-        result = NodeSliceobj(indent, lineno, node.nodes)
+        result = NodeSliceobj(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Stmt'):
-        result = NodeStmt(indent, lineno, node.nodes)
+        result = NodeStmt(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'Sub'):
-        result = NodeSub(indent, lineno, node.left, node.right)
+        result = NodeSub(ctx, indent, lineno, node.left, node.right)
     elif isinstance_(node, 'Subscript'):
-        result = NodeSubscript(indent, lineno, node.expr, node.flags, node.subs)
+        result = NodeSubscript(ctx, indent, lineno, node.expr, node.flags, node.subs)
     elif isinstance_(node, 'TryExcept'):
-        result = NodeTryExcept(indent, lineno, node.body, node.handlers, node.else_)
+        result = NodeTryExcept(ctx, indent, lineno, node.body, node.handlers, node.else_)
     elif isinstance_(node, 'TryFinally'):
-        result = NodeTryFinally(indent, lineno, node.body, node.final)
+        result = NodeTryFinally(ctx, indent, lineno, node.body, node.final)
     elif isinstance_(node, 'Tuple'):
-        result = NodeTuple(indent, lineno, node.nodes)
+        result = NodeTuple(ctx, indent, lineno, node.nodes)
     elif isinstance_(node, 'UnaryAdd'):
-        result = NodeUnaryAdd(indent, lineno, node.expr)
+        result = NodeUnaryAdd(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'UnarySub'):
-        result = NodeUnarySub(indent, lineno, node.expr)
+        result = NodeUnarySub(ctx, indent, lineno, node.expr)
     elif isinstance_(node, 'While'):
-        result = NodeWhile(indent, lineno, node.test, node.body, node.else_)
+        result = NodeWhile(ctx, indent, lineno, node.test, node.body, node.else_)
     elif isinstance_(node, 'With'):
-        result = NodeWith(indent, lineno, node.expr, node.vars, node.body)
+        result = NodeWith(ctx, indent, lineno, node.expr, node.vars, node.body)
     elif isinstance_(node, 'Yield'):
-        result = NodeYield(indent, lineno, node.value)
+        result = NodeYield(ctx, indent, lineno, node.value)
     elif isinstance(node, basestring):
-        result = NodeStr(indent, lineno, node)
+        result = NodeStr(ctx, indent, lineno, node)
     elif isinstance(node, int):
-        result = NodeInt(indent, lineno, node)
+        result = NodeInt(ctx, indent, lineno, node)
     else:
         result = node
     return result
@@ -1498,8 +1528,9 @@ class Node(object):
 
     tag = 'Generic node'
 
-    def __init__(self, indent, lineno):
+    def __init__(self, ctx, indent, lineno):
         object.__init__(self)
+        self.ctx = ctx
         self.indent = indent
         self.lineno = lineno
         if DEBUG:
@@ -1507,23 +1538,23 @@ class Node(object):
         return
 
     def line_init(self, need_blank_line=ZERO):
-        if COMMENTS.prev_lineno > ZERO:  # 2010 Sep 08
-            OUTPUT.put_blank_line(41, count=need_blank_line)  # 2010 Sep 08
+        if self.ctx.comments.prev_lineno > ZERO:  # 2010 Sep 08
+            self.ctx.output.put_blank_line(41, count=need_blank_line)  # 2010 Sep 08
             need_blank_line -= 1  # 2010 Sep 08
-        COMMENTS.merge(self.get_lineno())
-        OUTPUT.put_blank_line(4, count=need_blank_line)
-        OUTPUT.line_init(self.indent, self.get_lineno())
+        self.ctx.comments.merge(self.get_lineno())
+        self.ctx.output.put_blank_line(4, count=need_blank_line)
+        self.ctx.output.line_init(self.indent, self.get_lineno())
         return self
 
     def line_more(self, chunk=NULL, tab_set=False, tab_clear=False, can_split_str=False, can_split_after=False,
                   can_break_after=False):
 
-        OUTPUT.line_more(chunk, tab_set, tab_clear, can_split_str, can_split_after, can_break_after)
+        self.ctx.output.line_more(chunk, tab_set, tab_clear, can_split_str, can_split_after, can_break_after)
         return self
 
     def line_term(self, lineno=ZERO):
         lineno = max(self.get_hi_lineno(), self.get_lineno())  # , lineno)  # 2006 Dec 01
-        COMMENTS.put_inline(lineno)
+        self.ctx.comments.put_inline(lineno)
         return self
 
     def put(self, can_split=False):
@@ -1547,11 +1578,11 @@ class Node(object):
         return self.get_lineno()
 
     def inc_margin(self):
-        OUTPUT.inc_margin()
+        self.ctx.output.inc_margin()
         return self
 
     def dec_margin(self):
-        OUTPUT.dec_margin()
+        self.ctx.output.dec_margin()
         return self
 
     def marshal_names(self):
@@ -1644,8 +1675,8 @@ class NodeStr(Node):
 
     tag = 'Str'
 
-    def __init__(self, indent, lineno, str):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno, str):
+        Node.__init__(self, ctx, indent, lineno)
         self.set_as_str(str)
         return
 
@@ -1665,7 +1696,7 @@ class NodeStr(Node):
             pass
         else:
             try:
-                self.str = self.str.decode(INPUT.coding)
+                self.str = self.str.decode(self.ctx.input_coding)
             except UnicodeError:
                 pass
             try:
@@ -1675,7 +1706,7 @@ class NodeStr(Node):
         return self
 
     def get_as_repr(self):  # 2007 May 01
-        original_values = COMMENTS.literal_pool.get(repr(self.get_as_str()), [])  # 2010 Mar 10
+        original_values = self.ctx.comments.literal_pool.get(repr(self.get_as_str()), [])  # 2010 Mar 10
         if len(original_values) == 1:
             result, lineno = original_values[ZERO]
         else:
@@ -1690,7 +1721,7 @@ class NodeStr(Node):
 
         def fix_newlines(text):  # 2010 Mar 10
             lines = text.splitlines()
-            result = OUTPUT.newline.join(lines)  # 2006 Dec 05
+            result = self.ctx.output.newline.join(lines)  # 2006 Dec 05
             return result
 
         doc = self.get_as_repr()  # 2010 Mar 10
@@ -1698,10 +1729,10 @@ class NodeStr(Node):
         if LEFTJUST_DOC_STRINGS:
             lines = leftjust_lines(doc.strip().splitlines())  # 2007 May 25
             lines.extend([NULL, NULL])
-            margin = '%s%s' % (OUTPUT.newline, INDENTATION * self.indent)  # 2006 Dec 05
+            margin = '%s%s' % (self.ctx.output.newline, INDENTATION * self.indent)  # 2006 Dec 05
             doc = margin.join(lines)
         if WRAP_DOC_STRINGS:  # 2007 May 25
-            margin = '%s%s' % (OUTPUT.newline, INDENTATION * self.indent)  # 2006 Dec 05
+            margin = '%s%s' % (self.ctx.output.newline, INDENTATION * self.indent)  # 2006 Dec 05
             line_length = COL_LIMIT - len(INDENTATION) * self.indent
             line_length = max(line_length, 20)
             lines = wrap_lines(doc.strip().splitlines(), width=line_length)
@@ -1711,7 +1742,7 @@ class NodeStr(Node):
         doc = fix_newlines(doc)  # 2010 Mar 10
         self.put_multi_line(doc)
         self.line_term()
-        OUTPUT.put_blank_line(5)
+        self.ctx.output.put_blank_line(5)
         return self
 
     def put_lit(self, can_split=False):
@@ -1723,7 +1754,7 @@ class NodeStr(Node):
         else:
             lines = NEW_LINE_PATTERN.split(lit)
             if len(lines) > MAX_LINES_BEFORE_SPLIT_LIT:
-                lit = OUTPUT.newline.join(lines)  # 2006 Dec 05
+                lit = self.ctx.output.newline.join(lines)  # 2006 Dec 05
                 self.put_multi_line(lit)
             else:
                 self.line_more(lit, can_split_str=CAN_SPLIT_STRINGS, can_split_after=can_split)
@@ -1751,8 +1782,8 @@ class NodeInt(Node):
 
     tag = 'Int'
 
-    def __init__(self, indent, lineno, int):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno, int):
+        Node.__init__(self, ctx, indent, lineno)
         self.int = int
         return
 
@@ -1761,7 +1792,7 @@ class NodeInt(Node):
         return self
 
     def get_as_repr(self):
-        original_values = COMMENTS.literal_pool.get(repr(self.int), [])  # 2010 Mar 10
+        original_values = self.ctx.comments.literal_pool.get(repr(self.int), [])  # 2010 Mar 10
         if len(original_values) == 1:
             result, lineno = original_values[ZERO]
         else:
@@ -1777,10 +1808,10 @@ class NodeAdd(NodeOprAssoc):  # 2010 Mar 10
 
     tag = 'Add'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -1802,9 +1833,9 @@ class NodeAnd(NodeOprAssoc):  # 2010 Mar 10
 
     tag = 'And'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -1828,11 +1859,11 @@ class NodeAsgAttr(NodeOpr):
 
     tag = 'AsgAttr'
 
-    def __init__(self, indent, lineno, expr, attrname, flags):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.attrname = transform(indent, lineno, attrname)
-        self.flags = transform(indent, lineno, flags)
+    def __init__(self, ctx, indent, lineno, expr, attrname, flags):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.attrname = transform(ctx, indent, lineno, attrname)
+        self.flags = transform(ctx, indent, lineno, flags)
         return
 
     def put(self, can_split=False):
@@ -1850,7 +1881,7 @@ class NodeAsgAttr(NodeOpr):
         else:
             self.put_expr(self.expr, can_split=can_split)
         self.line_more('.')
-        self.line_more(NAME_SPACE.make_attr_name(self.expr, self.attrname))
+        self.line_more(self.ctx.name_space.make_attr_name(self.expr, self.attrname))
         if DEBUG:
             self.line_more(' /* AsgAttr flags:  ')
             self.flags.put()
@@ -1871,9 +1902,9 @@ class NodeAsgList(Node):
 
     tag = 'AsgList'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -1921,10 +1952,10 @@ class NodeAsgName(Node):
 
     tag = 'AsgName'
 
-    def __init__(self, indent, lineno, name, flags):
-        Node.__init__(self, indent, lineno)
-        self.name = transform(indent, lineno, name)
-        self.flags = transform(indent, lineno, flags)
+    def __init__(self, ctx, indent, lineno, name, flags):
+        Node.__init__(self, ctx, indent, lineno)
+        self.name = transform(ctx, indent, lineno, name)
+        self.flags = transform(ctx, indent, lineno, flags)
         return
 
     def put(self, can_split=False):
@@ -1932,7 +1963,7 @@ class NodeAsgName(Node):
         if is_del:
             self.line_init()
             self.line_more('del ')
-        self.line_more(NAME_SPACE.get_name(self.name))
+        self.line_more(self.ctx.name_space.get_name(self.name))
         if DEBUG:
             self.line_more(' /* AsgName flags:  ')
             self.flags.put()
@@ -1942,10 +1973,10 @@ class NodeAsgName(Node):
         return self
 
     def make_local_name(self):
-        if NAME_SPACE.has_name(self.name):
+        if self.ctx.name_space.has_name(self.name):
             pass
         else:
-            NAME_SPACE.make_local_name(self.name)
+            self.ctx.name_space.make_local_name(self.name)
         return self
 
     def get_hi_lineno(self):
@@ -1960,9 +1991,9 @@ class NodeAsgTuple(Node):
 
     tag = 'AsgTuple'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False, is_paren_required=True):  # 2010 Mar 10
@@ -2022,10 +2053,10 @@ class NodeAssert(Node):
 
     tag = 'Assert'
 
-    def __init__(self, indent, lineno, test, fail):
-        Node.__init__(self, indent, lineno)
-        self.test = transform(indent, lineno, test)
-        self.fail = transform(indent, lineno, fail)
+    def __init__(self, ctx, indent, lineno, test, fail):
+        Node.__init__(self, ctx, indent, lineno)
+        self.test = transform(ctx, indent, lineno, test)
+        self.fail = transform(ctx, indent, lineno, fail)
         return
 
     def put(self, can_split=False):
@@ -2057,10 +2088,10 @@ class NodeAssign(Node):
 
     tag = 'Assign'
 
-    def __init__(self, indent, lineno, nodes, expr):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, nodes, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -2099,11 +2130,11 @@ class NodeAugAssign(Node):
 
     tag = 'AugAssign'
 
-    def __init__(self, indent, lineno, node, op, expr):
-        Node.__init__(self, indent, lineno)
-        self.node = transform(indent, lineno, node)
-        self.op = transform(indent, lineno, op)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, node, op, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.node = transform(ctx, indent, lineno, node)
+        self.op = transform(ctx, indent, lineno, op)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -2131,9 +2162,9 @@ class NodeBackquote(Node):
 
     tag = 'Backquote'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -2154,9 +2185,9 @@ class NodeBitAnd(NodeOprAssoc):  # 2010 Mar 10
 
     tag = 'BitAnd'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -2180,9 +2211,9 @@ class NodeBitOr(NodeOprAssoc):  # 2010 Mar 01
 
     tag = 'BitOr'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -2206,9 +2237,9 @@ class NodeBitXor(NodeOprAssoc):  # 2010 Mar 01
 
     tag = 'BitXor'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -2232,8 +2263,8 @@ class NodeBreak(Node):
 
     tag = 'Break'
 
-    def __init__(self, indent, lineno):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno):
+        Node.__init__(self, ctx, indent, lineno)
         return
 
     def put(self, can_split=False):
@@ -2251,12 +2282,12 @@ class NodeCallFunc(Node):
 
     tag = 'CallFunc'
 
-    def __init__(self, indent, lineno, node, args, star_args, dstar_args):
-        Node.__init__(self, indent, lineno)
-        self.node = transform(indent, lineno, node)
-        self.args = [transform(indent, lineno, arg) for arg in args]
-        self.star_args = transform(indent, lineno, star_args)
-        self.dstar_args = transform(indent, lineno, dstar_args)
+    def __init__(self, ctx, indent, lineno, node, args, star_args, dstar_args):
+        Node.__init__(self, ctx, indent, lineno)
+        self.node = transform(ctx, indent, lineno, node)
+        self.args = [transform(ctx, indent, lineno, arg) for arg in args]
+        self.star_args = transform(ctx, indent, lineno, star_args)
+        self.dstar_args = transform(ctx, indent, lineno, dstar_args)
         if len(self.args) == 1:
             arg = self.args[ZERO]
             if isinstance(arg, NodeGenExpr):
@@ -2373,22 +2404,22 @@ class NodeClass(Node):
 
     tag = 'Class'
 
-    def __init__(self, indent, lineno, name, bases, doc, code):
-        Node.__init__(self, indent, lineno)
-        self.name = transform(indent, lineno, name)
-        self.bases = [transform(indent, lineno, base) for base in bases]
-        self.doc = transform(indent + 1, lineno, doc)
-        self.code = transform(indent + 1, lineno, code)
+    def __init__(self, ctx, indent, lineno, name, bases, doc, code):
+        Node.__init__(self, ctx, indent, lineno)
+        self.name = transform(ctx, indent, lineno, name)
+        self.bases = [transform(ctx, indent, lineno, base) for base in bases]
+        self.doc = transform(ctx, indent + 1, lineno, doc)
+        self.code = transform(ctx, indent + 1, lineno, code)
         return
 
     def put(self, can_split=False):
-        if NAME_SPACE.is_global():  # 2010 Sep 08
+        if self.ctx.name_space.is_global():  # 2010 Sep 08
             spacing = 2
         else:
             spacing = 1
         self.line_init(need_blank_line=spacing)
         self.line_more('class ')
-        self.line_more(NAME_SPACE.get_name(self.name))
+        self.line_more(self.ctx.name_space.get_name(self.name))
         if self.bases:
             self.line_more('(')
             for base in self.bases[:1]:
@@ -2403,24 +2434,24 @@ class NodeClass(Node):
             pass
         else:
             self.doc.put_doc(need_blank_line=1)
-        OUTPUT.put_blank_line(6)
+        self.ctx.output.put_blank_line(6)
         self.push_scope()
         self.code.marshal_names()
         self.code.put()
         self.pop_scope()
-        OUTPUT.put_blank_line(7, count=spacing)
+        self.ctx.output.put_blank_line(7, count=spacing)
         return self
 
     def push_scope(self):
-        NAME_SPACE.push_scope()
+        self.ctx.name_space.push_scope()
         return self
 
     def pop_scope(self):
-        NAME_SPACE.pop_scope()
+        self.ctx.name_space.pop_scope()
         return self
 
     def marshal_names(self):
-        NAME_SPACE.make_class_name(self.name)
+        self.ctx.name_space.make_class_name(self.name)
         return self
 
     def get_hi_lineno(self):
@@ -2438,10 +2469,10 @@ class NodeCompare(NodeOprNotAssoc):
 
     tag = 'Compare'
 
-    def __init__(self, indent, lineno, expr, ops):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.ops = [(op, transform(indent, lineno, ex)) for (op, ex) in ops]
+    def __init__(self, ctx, indent, lineno, expr, ops):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.ops = [(op, transform(ctx, indent, lineno, ex)) for (op, ex) in ops]
         return
 
     def put(self, can_split=False):
@@ -2465,9 +2496,9 @@ class NodeConst(Node):
 
     tag = 'Const'
 
-    def __init__(self, indent, lineno, value):
-        Node.__init__(self, indent, lineno)
-        self.value = transform(indent, lineno, value)
+    def __init__(self, ctx, indent, lineno, value):
+        Node.__init__(self, ctx, indent, lineno)
+        self.value = transform(ctx, indent, lineno, value)
         return
 
     def put(self, can_split=False):
@@ -2486,7 +2517,7 @@ class NodeConst(Node):
         return isinstance(self.value, NodeStr)
 
     def get_as_repr(self):  # 2007 May 01
-        original_values = COMMENTS.literal_pool.get(repr(self.value), [])  # 2010 Mar 10
+        original_values = self.ctx.comments.literal_pool.get(repr(self.value), [])  # 2010 Mar 10
         if len(original_values) == 1:
             result, lineno = original_values[ZERO]
         else:
@@ -2502,8 +2533,8 @@ class NodeContinue(Node):
 
     tag = 'Continue'
 
-    def __init__(self, indent, lineno):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno):
+        Node.__init__(self, ctx, indent, lineno)
         return
 
     def put(self, can_split=False):
@@ -2520,9 +2551,9 @@ class NodeDecorators(Node):
 
     """
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, spacing=ZERO, can_split=False):
@@ -2546,9 +2577,9 @@ class NodeDict(Node):
 
     tag = 'Dict'
 
-    def __init__(self, indent, lineno, items):
-        Node.__init__(self, indent, lineno)
-        self.items = [(transform(indent, lineno, key), transform(indent, lineno, value)) for (key, value) in items]
+    def __init__(self, ctx, indent, lineno, items):
+        Node.__init__(self, ctx, indent, lineno)
+        self.items = [(transform(ctx, indent, lineno, key), transform(ctx, indent, lineno, value)) for (key, value) in items]
         return
 
     def put(self, can_split=False):
@@ -2599,9 +2630,9 @@ class NodeDiscard(Node):
 
     tag = 'Discard'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -2632,10 +2663,10 @@ class NodeDiv(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'Div'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -2653,8 +2684,8 @@ class NodeEllipsis(Node):
 
     tag = 'Ellipsis'
 
-    def __init__(self, indent, lineno):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno):
+        Node.__init__(self, ctx, indent, lineno)
         return
 
     def put(self, can_split=False):
@@ -2670,11 +2701,11 @@ class NodeExec(Node):
 
     tag = 'Exec'
 
-    def __init__(self, indent, lineno, expr, locals, globals):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.locals = transform(indent, lineno, locals)
-        self.globals = transform(indent, lineno, globals)
+    def __init__(self, ctx, indent, lineno, expr, locals, globals):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.locals = transform(ctx, indent, lineno, locals)
+        self.globals = transform(ctx, indent, lineno, globals)
         return
 
     def put(self, can_split=False):
@@ -2715,12 +2746,12 @@ class NodeFor(Node):
 
     tag = 'For'
 
-    def __init__(self, indent, lineno, assign, list, body, else_):
-        Node.__init__(self, indent, lineno)
-        self.assign = transform(indent, lineno, assign)
-        self.list = transform(indent, lineno, list)
-        self.body = transform(indent + 1, lineno, body)
-        self.else_ = transform(indent + 1, lineno, else_)
+    def __init__(self, ctx, indent, lineno, assign, list, body, else_):
+        Node.__init__(self, ctx, indent, lineno)
+        self.assign = transform(ctx, indent, lineno, assign)
+        self.list = transform(ctx, indent, lineno, list)
+        self.body = transform(ctx, indent + 1, lineno, body)
+        self.else_ = transform(ctx, indent + 1, lineno, else_)
         return
 
     def put(self, can_split=False):
@@ -2768,10 +2799,10 @@ class NodeFloorDiv(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'FloorDiv'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -2793,10 +2824,10 @@ class NodeFrom(Node):
 
     tag = 'From'
 
-    def __init__(self, indent, lineno, modname, names, level):
-        Node.__init__(self, indent, lineno)
-        self.modname = transform(indent, lineno, modname)
-        self.names = [(transform(indent, lineno, identifier), transform(indent, lineno, name)) for (identifier,
+    def __init__(self, ctx, indent, lineno, modname, names, level):
+        Node.__init__(self, ctx, indent, lineno)
+        self.modname = transform(ctx, indent, lineno, modname)
+        self.names = [(transform(ctx, indent, lineno, identifier), transform(ctx, indent, lineno, name)) for (identifier,
                       name) in names]
         self.level = level
         return
@@ -2828,9 +2859,9 @@ class NodeFrom(Node):
     def marshal_names(self):
         for identifier, name in self.names:
             if name is None:
-                NAME_SPACE.make_imported_name(identifier)
+                self.ctx.name_space.make_imported_name(identifier)
             else:
-                NAME_SPACE.make_local_name(name)
+                self.ctx.name_space.make_local_name(name)
         return self
 
     def get_hi_lineno(self):
@@ -2853,6 +2884,7 @@ class NodeFunction(Node):
 
     def __init__(
         self,
+        ctx,
         indent,
         lineno,
         decorators,
@@ -2864,14 +2896,14 @@ class NodeFunction(Node):
         code,
     ):
 
-        Node.__init__(self, indent, lineno)
-        self.decorators = transform(indent, lineno, decorators)
-        self.name = transform(indent, lineno, name)
+        Node.__init__(self, ctx, indent, lineno)
+        self.decorators = transform(ctx, indent, lineno, decorators)
+        self.name = transform(ctx, indent, lineno, name)
         self.argnames = self.walk(argnames, self.xform)
-        self.defaults = [transform(indent, lineno, default) for default in defaults]
-        self.flags = transform(indent, lineno, flags)
-        self.doc = transform(indent + 1, lineno, doc)
-        self.code = transform(indent + 1, lineno, code)
+        self.defaults = [transform(ctx, indent, lineno, default) for default in defaults]
+        self.flags = transform(ctx, indent, lineno, flags)
+        self.doc = transform(ctx, indent + 1, lineno, doc)
+        self.code = transform(ctx, indent + 1, lineno, code)
         return
 
     def walk(self, tuple_, func, need_tuple=False):
@@ -2884,7 +2916,7 @@ class NodeFunction(Node):
         return result
 
     def xform(self, node):
-        result = transform(self.indent, self.lineno, node)
+        result = transform(self.ctx, self.indent, self.lineno, node)
         return result
 
     def pair_up(self, args, defaults):
@@ -2914,7 +2946,7 @@ class NodeFunction(Node):
             pass
         else:
             self.line_more(stars)
-        tuple_ = self.walk(arg, NAME_SPACE.get_name, need_tuple=True)
+        tuple_ = self.walk(arg, self.ctx.name_space.get_name, need_tuple=True)
         tuple_ = str(tuple_)
         tuple_ = tuple_.replace("'", NULL).replace(',)', ', )')
         self.line_more(tuple_)
@@ -2927,7 +2959,7 @@ class NodeFunction(Node):
 
     def put(self, can_split=False):
 
-        if NAME_SPACE.is_global():
+        if self.ctx.name_space.is_global():
             spacing = 2
         else:
             spacing = 1
@@ -2938,11 +2970,11 @@ class NodeFunction(Node):
             spacing = ZERO
         self.line_init(need_blank_line=spacing)
         self.line_more('def ')
-        self.line_more(NAME_SPACE.get_name(self.name))
+        self.line_more(self.ctx.name_space.get_name(self.name))
         self.push_scope()
         parms = self.pair_up(self.argnames, self.defaults)
         for arg, default, stars in parms:
-            self.walk(arg, NAME_SPACE.make_formal_param_name)
+            self.walk(arg, self.ctx.name_space.make_formal_param_name)
         self.code.marshal_names()
         self.line_more('(', tab_set=True)
         if len(parms) > MAX_SEPS_FUNC_DEF:  # 2007 May 24
@@ -2983,19 +3015,19 @@ class NodeFunction(Node):
             self.doc.put_doc()
         self.code.put()
         self.pop_scope()
-        OUTPUT.put_blank_line(8, count=spacing)
+        self.ctx.output.put_blank_line(8, count=spacing)
         return self
 
     def push_scope(self):
-        NAME_SPACE.push_scope()
+        self.ctx.name_space.push_scope()
         return self
 
     def pop_scope(self):
-        NAME_SPACE.pop_scope()
+        self.ctx.name_space.pop_scope()
         return self
 
     def marshal_names(self):
-        NAME_SPACE.make_function_name(self.name)
+        self.ctx.name_space.make_function_name(self.name)
         return self
 
 
@@ -3003,9 +3035,10 @@ class NodeLambda(NodeFunction):
 
     tag = 'Lambda'
 
-    def __init__(self, indent, lineno, argnames, defaults, flags, code):
+    def __init__(self, ctx, indent, lineno, argnames, defaults, flags, code):
         NodeFunction.__init__(
             self,
+            ctx,
             indent,
             lineno,
             None,
@@ -3025,7 +3058,7 @@ class NodeLambda(NodeFunction):
         if parms:
             self.line_more(' ')
         for arg, default, stars in parms:
-            self.walk(arg, NAME_SPACE.make_formal_param_name)
+            self.walk(arg, self.ctx.name_space.make_formal_param_name)
         for arg, default, stars in parms[:1]:
             self.put_parm(arg, default, stars, can_split=False)
         for arg, default, stars in parms[1:]:
@@ -3055,9 +3088,9 @@ class NodeGenExpr(Node):
 
     tag = 'GenExpr'
 
-    def __init__(self, indent, lineno, code):
-        Node.__init__(self, indent, lineno)
-        self.code = transform(indent, lineno, code)
+    def __init__(self, ctx, indent, lineno, code):
+        Node.__init__(self, ctx, indent, lineno)
+        self.code = transform(ctx, indent, lineno, code)
         self.need_parens = True
         return
 
@@ -3081,10 +3114,10 @@ class NodeGenExprInner(Node):
 
     tag = 'GenExprInner'
 
-    def __init__(self, indent, lineno, expr, quals):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.quals = [transform(indent, lineno, qual) for qual in quals]
+    def __init__(self, ctx, indent, lineno, expr, quals):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.quals = [transform(ctx, indent, lineno, qual) for qual in quals]
         return
 
     def put(self, can_split=False):
@@ -3097,11 +3130,11 @@ class NodeGenExprInner(Node):
         return self
 
     def push_scope(self):
-        NAME_SPACE.push_scope()
+        self.ctx.name_space.push_scope()
         return self
 
     def pop_scope(self):
-        NAME_SPACE.pop_scope()
+        self.ctx.name_space.pop_scope()
         return self
 
     def marshal_names(self):
@@ -3122,11 +3155,11 @@ class NodeGenExprFor(Node):
 
     tag = 'GenExprFor'
 
-    def __init__(self, indent, lineno, assign, list, ifs):
-        Node.__init__(self, indent, lineno)
-        self.assign = transform(indent, lineno, assign)
-        self.list = transform(indent, lineno, list)
-        self.ifs = [transform(indent, lineno, if_) for if_ in ifs]
+    def __init__(self, ctx, indent, lineno, assign, list, ifs):
+        Node.__init__(self, ctx, indent, lineno)
+        self.assign = transform(ctx, indent, lineno, assign)
+        self.list = transform(ctx, indent, lineno, list)
+        self.ifs = [transform(ctx, indent, lineno, if_) for if_ in ifs]
         return
 
     def put(self, can_split=False):
@@ -3158,9 +3191,9 @@ class NodeGenExprIf(Node):
 
     tag = 'GenExprIf'
 
-    def __init__(self, indent, lineno, test):
-        Node.__init__(self, indent, lineno)
-        self.test = transform(indent, lineno, test)
+    def __init__(self, ctx, indent, lineno, test):
+        Node.__init__(self, ctx, indent, lineno)
+        self.test = transform(ctx, indent, lineno, test)
         return
 
     def put(self, can_split=False):
@@ -3181,10 +3214,10 @@ class NodeGetAttr(NodeOpr):
 
     tag = 'GetAttr'
 
-    def __init__(self, indent, lineno, expr, attrname):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.attrname = transform(indent, lineno, attrname)
+    def __init__(self, ctx, indent, lineno, expr, attrname):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.attrname = transform(ctx, indent, lineno, attrname)
         return
 
     def put(self, can_split=False):
@@ -3198,7 +3231,7 @@ class NodeGetAttr(NodeOpr):
         else:
             self.put_expr(self.expr, can_split=can_split)
         self.line_more('.')
-        self.line_more(NAME_SPACE.make_attr_name(self.expr, self.attrname))
+        self.line_more(self.ctx.name_space.make_attr_name(self.expr, self.attrname))
         return self
 
     def get_hi_lineno(self):
@@ -3209,25 +3242,25 @@ class NodeGlobal(Node):
 
     tag = 'Global'
 
-    def __init__(self, indent, lineno, names):
-        Node.__init__(self, indent, lineno)
-        self.names = [transform(indent, lineno, name) for name in names]
+    def __init__(self, ctx, indent, lineno, names):
+        Node.__init__(self, ctx, indent, lineno)
+        self.names = [transform(ctx, indent, lineno, name) for name in names]
         return
 
     def put(self, can_split=False):
         self.line_init()
         self.line_more('global ')
         for name in self.names[:1]:
-            self.line_more(NAME_SPACE.get_name(name))
+            self.line_more(self.ctx.name_space.get_name(name))
         for name in self.names[1:]:
             self.line_more(LIST_SEP, can_break_after=True)
-            self.line_more(NAME_SPACE.get_name(name))
+            self.line_more(self.ctx.name_space.get_name(name))
         self.line_term()
         return self
 
     def marshal_names(self):
         for name in self.names:
-            NAME_SPACE.make_global_name(name)
+            self.ctx.name_space.make_global_name(name)
         return self
 
     def get_hi_lineno(self):
@@ -3242,10 +3275,10 @@ class NodeIf(Node):
 
     tag = 'If'
 
-    def __init__(self, indent, lineno, tests, else_):
-        Node.__init__(self, indent, lineno)
-        self.tests = [(transform(indent, lineno, expr), transform(indent + 1, lineno, stmt)) for (expr, stmt) in tests]
-        self.else_ = transform(indent + 1, lineno, else_)
+    def __init__(self, ctx, indent, lineno, tests, else_):
+        Node.__init__(self, ctx, indent, lineno)
+        self.tests = [(transform(ctx, indent, lineno, expr), transform(ctx, indent + 1, lineno, stmt)) for (expr, stmt) in tests]
+        self.else_ = transform(ctx, indent + 1, lineno, else_)
         return
 
     def put(self, can_split=False):
@@ -3294,11 +3327,11 @@ class NodeIfExp(Node):
 
     tag = 'IfExp'
 
-    def __init__(self, indent, lineno, test, then, else_):
-        Node.__init__(self, indent, lineno)
-        self.test = transform(indent, lineno, test)
-        self.then = transform(indent, lineno, then)
-        self.else_ = transform(indent, lineno, else_)
+    def __init__(self, ctx, indent, lineno, test, then, else_):
+        Node.__init__(self, ctx, indent, lineno)
+        self.test = transform(ctx, indent, lineno, test)
+        self.then = transform(ctx, indent, lineno, then)
+        self.else_ = transform(ctx, indent, lineno, else_)
         return
 
     def put(self, can_split=False):
@@ -3319,9 +3352,9 @@ class NodeImport(Node):
 
     tag = 'Import'
 
-    def __init__(self, indent, lineno, names):
-        Node.__init__(self, indent, lineno)
-        self.names = [(transform(indent, lineno, identifier), transform(indent, lineno, name)) for (identifier,
+    def __init__(self, ctx, indent, lineno, names):
+        Node.__init__(self, ctx, indent, lineno)
+        self.names = [(transform(ctx, indent, lineno, identifier), transform(ctx, indent, lineno, name)) for (identifier,
                       name) in names]
         return
 
@@ -3348,7 +3381,7 @@ class NodeImport(Node):
             if name is None:
                 pass
             else:
-                NAME_SPACE.make_local_name(name)
+                self.ctx.name_space.make_local_name(name)
         return self
 
     def get_hi_lineno(self):
@@ -3369,9 +3402,9 @@ class NodeInvert(NodeOpr):
 
     tag = 'Invert'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -3391,14 +3424,14 @@ class NodeKeyword(Node):
 
     tag = 'Keyword'
 
-    def __init__(self, indent, lineno, name, expr):
-        Node.__init__(self, indent, lineno)
-        self.name = transform(indent, lineno, name)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, name, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.name = transform(ctx, indent, lineno, name)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
-        self.line_more(NAME_SPACE.make_keyword_name(self.name))
+        self.line_more(self.ctx.name_space.make_keyword_name(self.name))
         self.line_more(FUNCTION_PARAM_ASSIGNMENT)  # 2007 May 25
         self.expr.put(can_split=can_split)
         return self
@@ -3415,10 +3448,10 @@ class NodeLeftShift(NodeOprLeftAssoc):  # 2010 Mar 01
 
     tag = 'LeftShift'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -3440,9 +3473,9 @@ class NodeList(Node):
 
     tag = 'List'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -3485,10 +3518,10 @@ class NodeListComp(Node):
 
     tag = 'ListComp'
 
-    def __init__(self, indent, lineno, expr, quals):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.quals = [transform(indent, lineno, qual) for qual in quals]
+    def __init__(self, ctx, indent, lineno, expr, quals):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.quals = [transform(ctx, indent, lineno, qual) for qual in quals]
         return
 
     def put(self, can_split=False):
@@ -3503,11 +3536,11 @@ class NodeListComp(Node):
         return self
 
     def push_scope(self):
-        NAME_SPACE.push_scope()
+        self.ctx.name_space.push_scope()
         return self
 
     def pop_scope(self):
-        NAME_SPACE.pop_scope()
+        self.ctx.name_space.pop_scope()
         return self
 
     def marshal_names(self):
@@ -3528,11 +3561,11 @@ class NodeListCompFor(Node):
 
     tag = 'ListCompFor'
 
-    def __init__(self, indent, lineno, assign, list, ifs):
-        Node.__init__(self, indent, lineno)
-        self.assign = transform(indent, lineno, assign)
-        self.list = transform(indent, lineno, list)
-        self.ifs = [transform(indent, lineno, if_) for if_ in ifs]
+    def __init__(self, ctx, indent, lineno, assign, list, ifs):
+        Node.__init__(self, ctx, indent, lineno)
+        self.assign = transform(ctx, indent, lineno, assign)
+        self.list = transform(ctx, indent, lineno, list)
+        self.ifs = [transform(ctx, indent, lineno, if_) for if_ in ifs]
         return
 
     def put(self, can_split=False):
@@ -3564,9 +3597,9 @@ class NodeListCompIf(Node):
 
     tag = 'ListCompIf'
 
-    def __init__(self, indent, lineno, test):
-        Node.__init__(self, indent, lineno)
-        self.test = transform(indent, lineno, test)
+    def __init__(self, ctx, indent, lineno, test):
+        Node.__init__(self, ctx, indent, lineno)
+        self.test = transform(ctx, indent, lineno, test)
         return
 
     def put(self, can_split=False):
@@ -3587,10 +3620,10 @@ class NodeMod(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'Mod'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -3614,10 +3647,10 @@ class NodeModule(Node):
 
     tag = 'Module'
 
-    def __init__(self, indent, lineno, doc, node):
-        Node.__init__(self, indent, lineno)
-        self.doc = transform(indent, lineno, doc)
-        self.node = transform(indent, lineno, node)
+    def __init__(self, ctx, indent, lineno, doc, node):
+        Node.__init__(self, ctx, indent, lineno)
+        self.doc = transform(ctx, indent, lineno, doc)
+        self.node = transform(ctx, indent, lineno, node)
         return
 
     def put(self, can_split=False):
@@ -3636,11 +3669,11 @@ class NodeModule(Node):
         return self
 
     def push_scope(self):
-        NAME_SPACE.push_scope()
+        self.ctx.name_space.push_scope()
         return self
 
     def pop_scope(self):
-        NAME_SPACE.pop_scope()
+        self.ctx.name_space.pop_scope()
         return self
 
     def marshal_names(self):
@@ -3659,10 +3692,10 @@ class NodeMul(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'Mul'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -3684,20 +3717,20 @@ class NodeName(Node):
 
     tag = 'Name'
 
-    def __init__(self, indent, lineno, name):
-        Node.__init__(self, indent, lineno)
-        self.name = transform(indent, lineno, name)
+    def __init__(self, ctx, indent, lineno, name):
+        Node.__init__(self, ctx, indent, lineno)
+        self.name = transform(ctx, indent, lineno, name)
         return
 
     def put(self, can_split=False):
-        self.line_more(NAME_SPACE.get_name(self.name))
+        self.line_more(self.ctx.name_space.get_name(self.name))
         return self
 
     def make_local_name(self):
-        if NAME_SPACE.has_name(self.name):
+        if self.ctx.name_space.has_name(self.name):
             pass
         else:
-            NAME_SPACE.make_local_name(self.name)
+            self.ctx.name_space.make_local_name(self.name)
         return self
 
     def get_hi_lineno(self):
@@ -3712,9 +3745,9 @@ class NodeNot(NodeOpr):
 
     tag = 'Not'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -3734,9 +3767,9 @@ class NodeOr(NodeOprAssoc):  # 2010 Mar 10
 
     tag = 'Or'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -3760,8 +3793,8 @@ class NodePass(Node):
 
     tag = 'Pass'
 
-    def __init__(self, indent, lineno):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno):
+        Node.__init__(self, ctx, indent, lineno)
         return
 
     def put(self, can_split=False):
@@ -3779,10 +3812,10 @@ class NodePower(NodeOprRightAssoc):  # 2010 Mar 10
 
     tag = 'Power'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -3804,10 +3837,10 @@ class NodePrint(Node):
 
     tag = 'Print'
 
-    def __init__(self, indent, lineno, nodes, dest):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
-        self.dest = transform(indent, lineno, dest)
+    def __init__(self, ctx, indent, lineno, nodes, dest):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
+        self.dest = transform(ctx, indent, lineno, dest)
         return
 
     def put(self, can_split=False):
@@ -3845,10 +3878,10 @@ class NodePrintnl(Node):
 
     tag = 'Printnl'
 
-    def __init__(self, indent, lineno, nodes, dest):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
-        self.dest = transform(indent, lineno, dest)
+    def __init__(self, ctx, indent, lineno, nodes, dest):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
+        self.dest = transform(ctx, indent, lineno, dest)
         return
 
     def put(self, can_split=False):
@@ -3888,11 +3921,11 @@ class NodeRaise(Node):
 
     tag = 'Raise'
 
-    def __init__(self, indent, lineno, expr1, expr2, expr3):
-        Node.__init__(self, indent, lineno)
-        self.expr1 = transform(indent, lineno, expr1)
-        self.expr2 = transform(indent, lineno, expr2)
-        self.expr3 = transform(indent, lineno, expr3)
+    def __init__(self, ctx, indent, lineno, expr1, expr2, expr3):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr1 = transform(ctx, indent, lineno, expr1)
+        self.expr2 = transform(ctx, indent, lineno, expr2)
+        self.expr3 = transform(ctx, indent, lineno, expr3)
         return
 
     def put(self, can_split=False):
@@ -3940,9 +3973,9 @@ class NodeReturn(Node):
 
     tag = 'Return'
 
-    def __init__(self, indent, lineno, value):
-        Node.__init__(self, indent, lineno)
-        self.value = transform(indent, lineno, value)
+    def __init__(self, ctx, indent, lineno, value):
+        Node.__init__(self, ctx, indent, lineno)
+        self.value = transform(ctx, indent, lineno, value)
         return
 
     def has_value(self):
@@ -3974,10 +4007,10 @@ class NodeRightShift(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'RightShift'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -3999,12 +4032,12 @@ class NodeSlice(NodeOpr):
 
     tag = 'Slice'
 
-    def __init__(self, indent, lineno, expr, flags, lower, upper):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.flags = transform(indent, lineno, flags)
-        self.lower = transform(indent, lineno, lower)
-        self.upper = transform(indent, lineno, upper)
+    def __init__(self, ctx, indent, lineno, expr, flags, lower, upper):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.flags = transform(ctx, indent, lineno, flags)
+        self.lower = transform(ctx, indent, lineno, lower)
+        self.upper = transform(ctx, indent, lineno, upper)
         return
 
     def has_value(self, node):
@@ -4057,9 +4090,9 @@ class NodeSliceobj(Node):
 
     tag = 'Sliceobj'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def has_value(self, node):
@@ -4091,9 +4124,9 @@ class NodeStmt(Node):
 
     tag = 'Stmt'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False):
@@ -4124,10 +4157,10 @@ class NodeSub(NodeOprLeftAssoc):  # 2010 Mar 10
 
     tag = 'Sub'
 
-    def __init__(self, indent, lineno, left, right):
-        Node.__init__(self, indent, lineno)
-        self.left = transform(indent, lineno, left)
-        self.right = transform(indent, lineno, right)
+    def __init__(self, ctx, indent, lineno, left, right):
+        Node.__init__(self, ctx, indent, lineno)
+        self.left = transform(ctx, indent, lineno, left)
+        self.right = transform(ctx, indent, lineno, right)
         return
 
     def put(self, can_split=False):
@@ -4149,11 +4182,11 @@ class NodeSubscript(NodeOpr):
 
     tag = 'Subscript'
 
-    def __init__(self, indent, lineno, expr, flags, subs):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.flags = transform(indent, lineno, flags)
-        self.subs = [transform(indent, lineno, sub) for sub in subs]
+    def __init__(self, ctx, indent, lineno, expr, flags, subs):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.flags = transform(ctx, indent, lineno, flags)
+        self.subs = [transform(ctx, indent, lineno, sub) for sub in subs]
         return
 
     def put(self, can_split=False):
@@ -4199,12 +4232,12 @@ class NodeTryExcept(Node):
 
     tag = 'TryExcept'
 
-    def __init__(self, indent, lineno, body, handlers, else_):
-        Node.__init__(self, indent, lineno)
-        self.body = transform(indent + 1, lineno, body)
-        self.handlers = [(transform(indent, lineno, expr), transform(indent, lineno, target), transform(indent + 1,
+    def __init__(self, ctx, indent, lineno, body, handlers, else_):
+        Node.__init__(self, ctx, indent, lineno)
+        self.body = transform(ctx, indent + 1, lineno, body)
+        self.handlers = [(transform(ctx, indent, lineno, expr), transform(ctx, indent, lineno, target), transform(ctx, indent + 1,
                          lineno, suite)) for (expr, target, suite) in handlers]
-        self.else_ = transform(indent + 1, lineno, else_)
+        self.else_ = transform(ctx, indent + 1, lineno, else_)
         self.has_finally = False
         return
 
@@ -4261,14 +4294,14 @@ class NodeTryFinally(Node):
 
     tag = 'TryFinally'
 
-    def __init__(self, indent, lineno, body, final):
-        Node.__init__(self, indent, lineno)
+    def __init__(self, ctx, indent, lineno, body, final):
+        Node.__init__(self, ctx, indent, lineno)
         if isinstance(body, compiler.ast.TryExcept):
-            self.body = transform(indent, lineno, body)
+            self.body = transform(ctx, indent, lineno, body)
             self.body.has_finally = True
         else:
-            self.body = transform(indent + 1, lineno, body)
-        self.final = transform(indent + 1, lineno, final)
+            self.body = transform(ctx, indent + 1, lineno, body)
+        self.final = transform(ctx, indent + 1, lineno, final)
         return
 
     def put(self, can_split=False):
@@ -4296,9 +4329,9 @@ class NodeTuple(Node):
 
     tag = 'Tuple'
 
-    def __init__(self, indent, lineno, nodes):
-        Node.__init__(self, indent, lineno)
-        self.nodes = [transform(indent, lineno, node) for node in nodes]
+    def __init__(self, ctx, indent, lineno, nodes):
+        Node.__init__(self, ctx, indent, lineno)
+        self.nodes = [transform(ctx, indent, lineno, node) for node in nodes]
         return
 
     def put(self, can_split=False, is_paren_required=True):  # 2010 Mar 10
@@ -4357,9 +4390,9 @@ class NodeUnaryAdd(NodeOpr):
 
     tag = 'UnaryAdd'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -4379,9 +4412,9 @@ class NodeUnarySub(NodeOpr):
 
     tag = 'UnarySub'
 
-    def __init__(self, indent, lineno, expr):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
+    def __init__(self, ctx, indent, lineno, expr):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
         return
 
     def put(self, can_split=False):
@@ -4401,11 +4434,11 @@ class NodeWhile(Node):
 
     tag = 'While'
 
-    def __init__(self, indent, lineno, test, body, else_):
-        Node.__init__(self, indent, lineno)
-        self.test = transform(indent, lineno, test)
-        self.body = transform(indent + 1, lineno, body)
-        self.else_ = transform(indent + 1, lineno, else_)
+    def __init__(self, ctx, indent, lineno, test, body, else_):
+        Node.__init__(self, ctx, indent, lineno)
+        self.test = transform(ctx, indent, lineno, test)
+        self.body = transform(ctx, indent + 1, lineno, body)
+        self.else_ = transform(ctx, indent + 1, lineno, else_)
         return
 
     def put(self, can_split=False):
@@ -4444,11 +4477,11 @@ class NodeWith(Node):
 
     tag = 'With'
 
-    def __init__(self, indent, lineno, expr, vars, body):
-        Node.__init__(self, indent, lineno)
-        self.expr = transform(indent, lineno, expr)
-        self.vars = transform(indent, lineno, vars)
-        self.body = transform(indent + 1, lineno, body)
+    def __init__(self, ctx, indent, lineno, expr, vars, body):
+        Node.__init__(self, ctx, indent, lineno)
+        self.expr = transform(ctx, indent, lineno, expr)
+        self.vars = transform(ctx, indent, lineno, vars)
+        self.body = transform(ctx, indent + 1, lineno, body)
         return
 
     def put(self, can_split=False):
@@ -4490,9 +4523,9 @@ class NodeYield(Node):
 
     tag = 'Yield'
 
-    def __init__(self, indent, lineno, value):
-        Node.__init__(self, indent, lineno)
-        self.value = transform(indent, lineno, value)
+    def __init__(self, ctx, indent, lineno, value):
+        Node.__init__(self, ctx, indent, lineno)
+        self.value = transform(ctx, indent, lineno, value)
         return
 
     def put(self, can_split=False):
@@ -4556,18 +4589,13 @@ def tidy_up(file_in=sys.stdin, file_out=sys.stdout):  # 2007 Jan 22
 
     """
 
-    global INPUT, OUTPUT, COMMENTS, NAME_SPACE, INPUT_CODING  # 2007 May 23
-    INPUT = InputUnit(file_in)
-    OUTPUT = OutputUnit(file_out)
-    COMMENTS = Comments()
-    NAME_SPACE = NameSpace()
-    module = compiler.parse(str(INPUT))
-    module = transform(indent=ZERO, lineno=ZERO, node=module)
-    INPUT_CODING = INPUT.coding  # 2007 May 23
-    del INPUT
+    ctx = Context(file_in, file_out)
+    module = compiler.parse(str(ctx.input))
+    module = transform(ctx, indent=ZERO, lineno=ZERO, node=module)
+    ctx.input = None  # The buffered input is not needed anymore.
     module.push_scope().marshal_names().put().pop_scope()
-    COMMENTS.merge(fin=True)
-    OUTPUT.close()
+    ctx.comments.merge(fin=True)
+    ctx.output.close()
     return
 
 
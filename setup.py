@@ -61,9 +61,10 @@ if __name__ == '__main__':
             author='Henning Jacobs',
             author_email='henning@jacobs1.de',
             url='https://github.com/hjacobs/codevalidator',
-            py_modules=['codevalidator'],
+            py_modules=['codevalidator', 'codevalidator_client'],
             packages=['pythontidy'],
-            entry_points={'console_scripts': ['codevalidator = codevalidator:main']},
+            entry_points={'console_scripts': ['codevalidator = codevalidator:main',
+                                            'codevalidator-client = codevalidator_client:main']},
             extras_require={'YAML': ['PyYAML'], 'XML': ['lxml'], 'Python': ['pep8', 'autopep8', 'pyflakes']},
             tests_require=['pytest-cov', 'pytest>=2.7.2'],
             cmdclass=cmdclass,
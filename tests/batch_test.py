@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def batched_rules(monkeypatch):
+    '''two batched rules "first" and "second", each waiting until both run'''
+
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.txt': ['first', 'second']})
+    monkeypatch.setitem(codevalidator.CONFIG, 'threads', 2)
+    monkeypatch.setattr(codevalidator, 'THREAD_POOL', None)
+    barrier = threading.Barrier(2, timeout=10) if hasattr(threading, 'Barrier') else None
+    calls = []
+
+    def batched(rule):
+        def batch(sources):
+            calls.append((rule, [source.name for source in sources]))
+            if barrier:
+                # fails with BrokenBarrierError if the rules run one after the other
+                barrier.wait()
+            return [rule + ' ' + source.data.decode() for source in sources]
+        return batch
+
+    for rule in 'first', 'second':
+        monkeypatch.setattr(codevalidator, '_batch_' + rule, batched(rule), raising=False)
+    return calls
+
+
+def test_prefetch_batch(tmpdir, batched_rules):
+    paths = []
+    for name in 'a.txt', 'b.txt', 'c.py':
+        tmpdir.join(name).write(name[0])
+        paths.append(str(tmpdir.join(name)))
+    jobs = [codevalidator._file_job(path, None) for path in paths]
+    sources = codevalidator.prefetch_batch(jobs)
+    assert [source and source.data for source in sources] == [b'a', b'b', None]
+    assert sorted(batched_rules) == [('first', paths[:2]), ('second', paths[:2])]
+    for rule in 'first', 'second':
+        for source in sources[:2]:
+            key = (rule, source.name, source.digest)
+            assert codevalidator.BATCH_RESULTS[key] == rule + ' ' + source.data.decode()
+
+
+def test_single_file_is_not_batched(tmpdir, batched_rules):
+    tmpdir.join('a.txt').write('a')
+    codevalidator.prefetch_batch([codevalidator._file_job(str(tmpdir.join('a.txt')), None)])
+    assert batched_rules == []
+    assert codevalidator.BATCH_RESULTS == {}
+
+
+def test_timed_out_batch_is_not_rerun(tmpdir, monkeypatch):
+    runs = tmpdir.join('runs')
+    hang = tmpdir.join('hang')
+    hang.write('#!/bin/sh\necho run >> {0}\nsleep 10\n'.format(runs))
+    hang.chmod(0o755)
+
+    @codevalidator.linter(lambda options: [str(hang)], lambda output, stderr, paths: [])
+    def validate(fd, options=None):
+        return codevalidator.run_linter('hang', fd, options)
+
+    monkeypatch.setattr(codevalidator, '_validate_hang', validate, raising=False)
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.txt': ['hang']})
+    monkeypatch.setitem(codevalidator.CONFIG, 'rule_limits', {'hang': {'timeout': 0.5}})
+    paths = []
+    for name in 'abcd':
+        tmpdir.join(name + '.txt').write(name)
+        paths.append(str(tmpdir.join(name + '.txt')))
+    jobs = [codevalidator._file_job(path, None) for path in paths]
+    with codevalidator.collect_results() as result:
+        for path, source in zip(paths, codevalidator.prefetch_batch(jobs)):
+            codevalidator.validate_file_with_rules(path, ['hang'], source)
+    assert runs.read() == 'run\n'
+    assert result.errors == [(path, 'hang') for path in paths]
+    assert all(message.startswith('TIMEOUT validating hang') for rule, message, details in result.verdicts)
@@ -0,0 +1,53 @@
+import pytest
+
+import codevalidator
+
+
+def check(fd):
+    codevalidator._detail('checked {0}'.format(fd.name) if b'name' in fd.read() else 'checked', 1)
+    return False
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch, fine_rule):
+    monkeypatch.setitem(codevalidator.CONFIG, 'cache_dir', str(tmpdir.join('cache')))
+    monkeypatch.setattr(codevalidator, 'RESULT_CACHE', None)
+    return fine_rule(check)
+
+
+def validate(path):
+    with codevalidator.collect_results() as result:
+        codevalidator.validate_file_with_rules(str(path), ['fine'])
+    (rule, message, details), = result.verdicts
+    return details
+
+
+def test_hit_after_rename(tmpdir, cache):
+    first = tmpdir.join('a.txt')
+    first.write('contents')
+    assert validate(first) == [('checked', 1, None)]
+    second = tmpdir.join('b.txt')
+    first.rename(second)
+    assert validate(second) == [('checked', 1, None)]
+    assert cache == [str(first)]
+
+
+def test_miss_for_changed_contents(tmpdir, cache):
+    path = tmpdir.join('a.txt')
+    path.write('contents')
+    validate(path)
+    path.write('changed')
+    validate(path)
+    assert cache == [str(path)] * 2
+
+
+def test_details_naming_the_file(tmpdir, cache):
+    first = tmpdir.join('a.txt')
+    first.write('name')
+    second = tmpdir.join('b.txt')
+    second.write('name')
+    assert validate(first) == [('checked {0}'.format(first), 1, None)]
+    # not replayed for another file with the same contents
+    assert validate(second) == [('checked {0}'.format(second), 1, None)]
+    assert validate(second) == [('checked {0}'.format(second), 1, None)]
+    assert cache == [str(first), str(second)]
@@ -0,0 +1,24 @@
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def fine_rule(monkeypatch):
+    '''return a function installing check(fd) as validation function of the rule "fine"
+
+    The function returns the list of file names the rule was called for.
+    '''
+
+    calls = []
+
+    def install(check):
+        @codevalidator.message('is not fine')
+        def _validate_fine(fd, options={}):
+            calls.append(fd.name)
+            return check(fd)
+
+        monkeypatch.setattr(codevalidator, '_validate_fine', _validate_fine, raising=False)
+        return calls
+
+    return install
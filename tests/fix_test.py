@@ -0,0 +1,36 @@
+import pytest
+
+import codevalidator
+
+etree = pytest.importorskip('lxml.etree')
+
+FORMATTED = b"<?xml version='1.0' encoding='UTF-8'?>\n<a>\n    <b>x</b>\n    <c/>\n</a>\n"
+
+
+@pytest.fixture(params=[0, 8 * 1024 * 1024], ids=['stream', 'tree'])
+def xml_stream_size(request, monkeypatch):
+    monkeypatch.setattr(codevalidator, 'XML_STREAM_SIZE', request.param)
+
+
+def test_fix_xmlfmt(tmpdir, monkeypatch, xml_stream_size):
+    monkeypatch.setitem(codevalidator.CONFIG, 'create_backup', False)
+    path = tmpdir.join('a.xml')
+    path.write_binary(b'<a><b>x</b>\n<c/></a>')
+    path.chmod(0o640)
+    with codevalidator.collect_results():
+        assert codevalidator.fix_file(str(path), ['xmlfmt'])
+    assert path.read_binary() == FORMATTED
+    assert path.stat().mode & 0o777 == 0o640
+    # the temporary file was renamed into place
+    assert tmpdir.listdir() == [path]
+
+
+def test_fix_xmlfmt_error(tmpdir, monkeypatch, xml_stream_size):
+    monkeypatch.setitem(codevalidator.CONFIG, 'create_backup', False)
+    path = tmpdir.join('a.xml')
+    path.write_binary(b'<a><b>x</b>')
+    with codevalidator.collect_results() as result:
+        assert not codevalidator.fix_file(str(path), ['xmlfmt'])
+    assert result.messages[-1] == '{0}: ERROR fixing file. File remained unchanged'.format(path)
+    assert path.read_binary() == b'<a><b>x</b>'
+    assert tmpdir.listdir() == [path]
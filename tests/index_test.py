@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def run(tmpdir, monkeypatch, fine_rule):
+    '''validate (all) files of tmpdir with the "fine" rule for *.txt and a FileIndex, returns the files read by the rule'''
+
+    monkeypatch.setitem(codevalidator.CONFIG, 'index_file', str(tmpdir.join('.index')))
+    monkeypatch.setitem(codevalidator.CONFIG, 'rules', {'*.txt': ['fine']})
+    monkeypatch.setitem(codevalidator.CONFIG, 'threads', 1)
+    monkeypatch.setattr(codevalidator, 'VALIDATION_ERRORS', [])
+    calls = fine_rule(lambda fd: fd.read() == b'fine')
+
+    def run(paths=None):
+        del calls[:]
+        del codevalidator.VALIDATION_ERRORS[:]
+        # a new run loads the index again
+        monkeypatch.setattr(codevalidator, 'FILE_INDEX', None)
+        if paths is None:
+            paths = tmpdir.listdir(lambda path: path.isfile())
+        with codevalidator.collect_results():
+            codevalidator.validate_files(sorted(str(path) for path in paths))
+        codevalidator.get_file_index().save()
+        return list(calls), list(codevalidator.VALIDATION_ERRORS)
+
+    return run
+
+
+def write(path, data, age=60):
+    '''write the file with a modification time in the past (i.e. not racily clean)'''
+
+    path.write_binary(data)
+    mtime = time.time() - age
+    os.utime(str(path), (mtime, mtime))
+
+
+def test_unchanged_files_are_not_read(tmpdir, run):
+    write(tmpdir.join('a.txt'), b'fine')
+    write(tmpdir.join('b.txt'), b'bad')
+    a, b = str(tmpdir.join('a.txt')), str(tmpdir.join('b.txt'))
+    assert run() == ([a, b], [(b, 'fine')])
+    # the recorded errors are reported again
+    assert run() == ([], [(b, 'fine')])
+
+
+def test_changed_file(tmpdir, run):
+    write(tmpdir.join('a.txt'), b'fine')
+    run()
+    write(tmpdir.join('a.txt'), b'bad!', age=30)
+    a = str(tmpdir.join('a.txt'))
+    assert run() == ([a], [(a, 'fine')])
+
+
+def test_racily_clean_file_is_compared_by_contents(tmpdir, run):
+    # modified after the index is written
+    write(tmpdir.join('a.txt'), b'fine', age=-60)
+    a = str(tmpdir.join('a.txt'))
+    assert run() == ([a], [])
+    assert run() == ([], [])
+    write(tmpdir.join('a.txt'), b'bad!', age=-60)
+    assert run() == ([a], [(a, 'fine')])
+
+
+def test_config_change_discards_entries(tmpdir, run, monkeypatch):
+    write(tmpdir.join('a.txt'), b'fine')
+    run()
+    monkeypatch.setitem(codevalidator.CONFIG, 'options', {'fine': {'strict': True}})
+    assert run() == ([str(tmpdir.join('a.txt'))], [])
+
+
+def indexed(tmpdir):
+    return sorted(os.path.basename(fname) for fname in codevalidator.FileIndex(str(tmpdir.join('.index'))).entries)
+
+
+def test_deleted_files_are_pruned(tmpdir, run):
+    write(tmpdir.join('a.txt'), b'fine')
+    write(tmpdir.join('b.txt'), b'fine')
+    run()
+    assert indexed(tmpdir) == ['a.txt', 'b.txt']
+    # files not validated in a run are kept while they exist
+    run([tmpdir.join('a.txt')])
+    assert indexed(tmpdir) == ['a.txt', 'b.txt']
+    tmpdir.join('b.txt').remove()
+    run([tmpdir.join('a.txt')])
+    assert indexed(tmpdir) == ['a.txt']
+
+
+def test_files_without_rules_are_not_read(tmpdir, run, monkeypatch):
+    write(tmpdir.join('a.txt'), b'fine')
+    write(tmpdir.join('b.dat'), b'data')
+    read = []
+    read_source = codevalidator.read_source
+    monkeypatch.setattr(codevalidator, 'read_source', lambda fname: read.append(fname) or read_source(fname))
+    run()
+    run()
+    assert read == [str(tmpdir.join('a.txt'))]
+    assert indexed(tmpdir) == ['a.txt']
@@ -0,0 +1,88 @@
+import subprocess
+
+import pytest
+
+import codevalidator
+
+
+def test_run_jobs_in_order():
+    assert list(codevalidator._run_jobs(abs, range(0, -20, -1), 2)) == list(range(20))
+
+
+def test_run_jobs_consumes_args_lazily():
+    consumed = []
+
+    def args():
+        for i in range(100):
+            consumed.append(i)
+            yield i
+
+    results = codevalidator._run_jobs(abs, args(), 2)
+    assert next(results) == 0
+    # one arg more than the submitted ones is read before the first result is merged
+    assert len(consumed) == 2 * codevalidator.JOBS_AHEAD + 1
+    assert list(results) == list(range(1, 100))
+
+
+@pytest.fixture
+def repo(tmpdir, monkeypatch):
+    '''GIT repository with an initial commit in the current directory'''
+
+    def git(*args):
+        subprocess.check_call(['git'] + list(args), stdout=subprocess.PIPE)
+
+    monkeypatch.chdir(tmpdir)
+    git('init', '-q')
+    git('config', 'user.name', 'test')
+    git('config', 'user.email', 'test@example.org')
+    tmpdir.join('a.txt').write('a\n')
+    tmpdir.join('b.txt').write('b\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'initial')
+    return git
+
+
+def sources(revisions, pathspecs=None):
+    return [(source.name, source.data) for source in codevalidator.iter_git_sources(revisions, pathspecs)]
+
+
+def test_git_sources(tmpdir, repo):
+    tmpdir.join('a.txt').write('changed\n')
+    tmpdir.mkdir('dir').join('c d.txt').write('new\n')
+    repo('add', '.')
+    assert sources('--cached') == [('a.txt', b'changed\n'), ('dir/c d.txt', b'new\n')]
+    assert sources('--cached', ['dir']) == [('dir/c d.txt', b'new\n')]
+    # the working tree is not read
+    tmpdir.join('a.txt').write('not staged\n')
+    repo('commit', '-q', '-m', 'change')
+    repo('rm', '-q', 'b.txt')
+    repo('commit', '-q', '-m', 'remove')
+    assert sources('HEAD~2') == [('a.txt', b'changed\n'), ('dir/c d.txt', b'new\n')]
+    assert sources('HEAD~2..HEAD~1') == [('a.txt', b'changed\n'), ('dir/c d.txt', b'new\n')]
+    assert sources('HEAD~1..HEAD') == []
+
+
+def test_git_error(repo):
+    with pytest.raises(codevalidator.ExecutionError):
+        sources('unknown..HEAD')
+
+
+def test_git_command_line(tmpdir, repo, capsys):
+    tmpdir.join('a.txt').write('a\tb\n')
+    tmpdir.mkdir('dir').join('c.txt').write('c\td\n')
+    repo('add', '.')
+    for argv in ['--git', '--cached'], ['--git'], ['--staged', '--git']:
+        with pytest.raises(SystemExit):
+            codevalidator.main(argv)
+        assert capsys.readouterr().out == 'a.txt: contains tabs\ndir/c.txt: contains tabs\n'
+    # FILES are pathspecs, not the revision range
+    with pytest.raises(SystemExit):
+        codevalidator.main(['--git', 'dir'])
+    assert capsys.readouterr().out == 'dir/c.txt: contains tabs\n'
+    repo('commit', '-q', '-m', 'tabs')
+    with pytest.raises(SystemExit):
+        codevalidator.main(['--git=HEAD~1..HEAD', 'dir'])
+    assert capsys.readouterr().out == 'dir/c.txt: contains tabs\n'
+    with pytest.raises(SystemExit) as excinfo:
+        codevalidator.main(['--git=HEAD~1', '--cached'])
+    assert excinfo.value.code == 2
@@ -0,0 +1,81 @@
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def large(monkeypatch):
+    '''treat all files as large files'''
+
+    monkeypatch.setattr(codevalidator, 'LARGE_FILE_SIZE', 0)
+    monkeypatch.setattr(codevalidator, 'CHUNK_SIZE', 4)
+    monkeypatch.setattr(codevalidator, 'JSON_STREAM_SIZE', 0)
+
+
+def validate(path, rules):
+    source = codevalidator.read_source(str(path))
+    with codevalidator.collect_results() as result:
+        codevalidator.validate_file_with_rules(str(path), rules, source)
+    return source, result
+
+
+def test_json_is_not_read_into_memory(tmpdir, large):
+    path = tmpdir.join('a.json')
+    path.write_binary(b'{"a": [1, 2, {"b": null}],\n "c": "\xc3\xa4"}\n')
+    source, result = validate(path, codevalidator.DEFAULT_RULES + ['json'])
+    assert not result.errors
+    assert source._data is None
+
+
+def test_json_error(tmpdir, large):
+    path = tmpdir.join('a.json')
+    path.write_binary(b'{"a": [1, 2,],\t\n "c": 3} ')
+    source, result = validate(path, codevalidator.DEFAULT_RULES + ['json'])
+    assert result.errors == [(str(path), 'notabs'), (str(path), 'notrailingws'), (str(path), 'json')]
+    assert result.verdicts[-1][2] == [('Expecting value at byte offset 12', 1, 13)]
+    assert source._data is None
+
+
+def test_read_on_first_use(tmpdir, large):
+    path = tmpdir.join('a.txt')
+    path.write_binary(b'line 1\nline 2\n')
+    source = codevalidator.read_source(str(path))
+    assert source.size == 14
+    assert source.digest == codevalidator._digest(b'line 1\nline 2\n')
+    assert source._data is None
+    assert list(source) == [b'line 1\n', b'line 2\n']
+    assert source.data == b'line 1\nline 2\n'
+
+
+def test_xml_is_not_read_into_memory(tmpdir, large, monkeypatch):
+    pytest.importorskip('lxml')
+    monkeypatch.setattr(codevalidator, 'XML_STREAM_SIZE', 0)
+    path = tmpdir.join('a.xml')
+    path.write_binary(b"<?xml version='1.0' encoding='UTF-8'?>\n<a>\n    <b>x</b>\n  <c/>\n</a>\n")
+    source, result = validate(path, codevalidator.DEFAULT_RULES + ['xml', 'xmlfmt'])
+    assert result.errors == [(str(path), 'xmlfmt')]
+    assert result.verdicts[-1][2] == [('differs from the pretty-printed XML', 4, None)]
+    assert source._data is None
+
+
+def test_xml_error(tmpdir, large):
+    path = tmpdir.join('a.xml')
+    path.write_binary(b'<a>\n<b></a>\n')
+    source, result = validate(path, ['xml'])
+    assert result.verdicts[-1][2] == [('ParseError: mismatched tag: line 2, column 5', None, None)]
+    assert source._data is None
+
+
+def failing_chunks(first):
+    '''generate the chunk first and fail if more is read'''
+
+    yield first
+    raise AssertionError('read past the failing chunk')
+
+
+def test_scan_stops_when_all_rules_failed():
+    rules = ['nocr', 'notabs', 'notrailingws']
+    assert codevalidator.scan_chunks(failing_chunks(b'a\tb \r\n'), rules) == dict.fromkeys(rules, False)
+    with pytest.raises(AssertionError):
+        # notabs can still fail
+        codevalidator.scan_chunks(failing_chunks(b'ab \r\n'), rules)
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+
+import pytest
+
+import codevalidator
+
+# listens on the address given as last argument like the nailgun server
+FAKE_JAVA = '''#!{python}
+import socket
+import sys
+host, port = sys.argv[-1].split(':')
+sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+sock.bind((host, int(port)))
+sock.listen(5)
+while True:
+    sock.accept()[0].close()
+'''
+
+
+@pytest.fixture
+def options(tmpdir, monkeypatch):
+    '''jalopy options with a fake java binary'''
+
+    java = tmpdir.join('java')
+    java.write(FAKE_JAVA.format(python=sys.executable))
+    java.chmod(0o755)
+    options = {'nailgun_jar': str(tmpdir.join('nailgun.jar')), 'java_bin': str(java)}
+    monkeypatch.setitem(codevalidator.CONFIG, 'options', {'jalopy': options})
+    monkeypatch.setattr(codevalidator, 'NAILGUN_POOL', None)
+    return options
+
+
+@pytest.fixture
+def pool(options):
+    pool = codevalidator.NailgunPool(options, 2)
+    yield pool
+    pool.stop()
+
+
+def test_port(pool):
+    port = pool.port(0)
+    assert codevalidator._accepts_connections(port)
+    # all servers are started at once
+    assert all(server is not None for server in pool.servers)
+    assert pool.port(2) == pool.port(0) == port
+    assert pool.port(1) not in (None, port)
+
+
+def test_restart(pool):
+    port = pool.port(0)
+    process = pool.servers[0][0]
+    process.kill()
+    process.wait()
+    new_port = pool.port(0)
+    assert new_port != port
+    assert codevalidator._accepts_connections(new_port)
+
+
+def test_failed_start(pool, options, monkeypatch):
+    monkeypatch.setattr(codevalidator, 'NAILGUN_START_TIMEOUT', 1)
+    options['java_bin'] = '/bin/false'
+    assert pool.port(0) is None
+    assert pool.servers[0] is None
+
+
+def test_stop(pool):
+    pool.port(0)
+    processes = [server[0] for server in pool.servers]
+    pool.owner = os.getpid() + 1
+    # forked children do not stop the servers of their parent
+    pool.stop()
+    assert all(process.poll() is None for process in processes)
+    pool.owner = os.getpid()
+    pool.stop()
+    assert pool.servers == [None, None]
+    assert all(process.poll() is not None for process in processes)
+
+
+def test_idle_timeout(pool, options):
+    options['nailgun_idle_timeout'] = 0.2
+    pool.port(0)
+    processes = [server[0] for server in pool.servers]
+    time.sleep(1)
+    assert pool.servers == [None, None]
+    assert all(process.poll() is not None for process in processes)
+
+
+def test_nailgun_port(options):
+    assert codevalidator._nailgun_port([('a.txt', )], 0) is None
+    port = codevalidator._nailgun_port([('a.txt', ), ('A.java', )], 0)
+    try:
+        assert port == codevalidator.get_nailgun_pool().port(0)
+    finally:
+        codevalidator.NAILGUN_POOL.stop()
+
+
+def test_not_managed(options):
+    del options['nailgun_jar']
+    assert codevalidator.get_nailgun_pool() is None
+    assert codevalidator._nailgun_port([('A.java', )], 0) is None
@@ -0,0 +1,53 @@
+import sys
+from multiprocessing.pool import ThreadPool
+
+import pytest
+
+import codevalidator
+
+pytestmark = pytest.mark.skipif(codevalidator.running_on_py3, reason='PythonTidy supports Python 2 only')
+
+SOURCE = '''import sys
+key = lambda item: item[1]
+
+
+def first(items, default=None):
+    return sorted(items, key=lambda x: (key(x), x))[0] if items else default
+'''
+
+TIDY = '''#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import sys
+key = lambda item: item[1]
+
+
+def first(items, default=None):
+    return (sorted(items, key=lambda x: (key(x), x))[0] if items else default)
+
+
+'''
+
+
+def tidy(source):
+    from StringIO import StringIO
+    from pythontidy import PythonTidy
+    formatted = StringIO()
+    PythonTidy.tidy_up(StringIO(source), formatted)
+    return formatted.getvalue()
+
+
+def test_lambda():
+    assert tidy(SOURCE) == TIDY
+
+
+def test_concurrent_runs():
+    sources = [SOURCE, 'x = {1: 2}\n', 'def f(a):\n    return a\n'] * 4
+    expected = [tidy(source) for source in sources]
+    with pytest.raises(Exception):
+        # a failed run does not leave state behind
+        tidy('def f(:\n')
+    pool = ThreadPool(4)
+    try:
+        assert pool.map(tidy, sources) == expected
+    finally:
+        pool.close()
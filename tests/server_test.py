@@ -0,0 +1,170 @@
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import pytest
+
+import codevalidator
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def listening(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+# nailgun server recording its process ID in the file "started"
+FAKE_JAVA = '''#!{python}
+import os
+import socket
+import sys
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'started'), 'a') as f:
+    f.write('{{0}}\\n'.format(os.getpid()))
+host, port = sys.argv[-1].split(':')
+sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+sock.bind((host, int(port)))
+sock.listen(5)
+while True:
+    sock.accept()[0].close()
+'''
+
+# "ng --nailgun-port PORT Jalopy --loglevel WARN --flatdest DIR FILES", records the port and copies the files
+FAKE_NG = '''#!/bin/sh
+echo "$2" >> "$(dirname "$0")/ports"
+dest="$7"
+shift 7
+cp "$@" "$dest"
+'''
+
+
+@pytest.fixture
+def nailgun(tmpdir):
+    '''configuration (in ~/.codevalidatorrc) of a managed nailgun server with fake java and ng binaries'''
+
+    for name, script in ('java', FAKE_JAVA.format(python=sys.executable)), ('ng', FAKE_NG):
+        tmpdir.join(name).write(script)
+        tmpdir.join(name).chmod(0o755)
+    options = {'nailgun_jar': str(tmpdir.join('nailgun.jar')), 'java_bin': str(tmpdir.join('java')),
+               'ng_bin': str(tmpdir.join('ng'))}
+    tmpdir.join('.codevalidatorrc').write(json.dumps({'rules': {'*.java': ['jalopy']},
+                                                       'options': {'jalopy': options}}))
+
+
+@pytest.fixture
+def server(tmpdir):
+    '''path of the socket of a running codevalidator server'''
+
+    path = str(tmpdir.join('cv.sock'))
+    if tmpdir.join('stale').check():
+        # socket file left behind by a server which is not running anymore
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+    po = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'codevalidator.py'), '--server', path],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=dict(os.environ, HOME=str(tmpdir)),
+                          # SIGINT is ignored when running in background, the server is stopped with Ctrl-C
+                          preexec_fn=lambda: signal.signal(signal.SIGINT, signal.SIG_DFL))
+    try:
+        for i in range(100):
+            if listening(path):
+                break
+            time.sleep(0.1)
+        yield path
+    finally:
+        po.send_signal(signal.SIGINT)
+        po.communicate()
+    assert not os.path.exists(path)
+
+
+def run(args, env=None, input=b''):
+    po = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    output, stderr = po.communicate(input)
+    return po.returncode, output, stderr
+
+
+def direct_and_client(tmpdir, server, argv, input=b''):
+    env = dict(os.environ, HOME=str(tmpdir), CODEVALIDATOR_SOCKET=server)
+    direct = run([sys.executable, os.path.join(BASE_DIR, 'codevalidator.py')] + argv, env, input)
+    client = run([sys.executable, os.path.join(BASE_DIR, 'codevalidator_client.py')] + argv, env, input)
+    return direct, client
+
+
+def test_client_output_and_exit_code(tmpdir, server, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join('a.json').write('{"a":\t1}\n')
+    tmpdir.join('b.json').write('{"a": 1}\n')
+    direct, client = direct_and_client(tmpdir, server, ['-v', 'a.json', 'b.json'])
+    assert direct[0] == 1
+    assert b'a.json: contains tabs' in direct[1]
+    assert client == direct
+    direct, client = direct_and_client(tmpdir, server, ['b.json'])
+    assert client == direct == (0, b'', b'')
+
+
+def test_client_stdin(tmpdir, server):
+    direct, client = direct_and_client(tmpdir, server, ['--stdin', 'manifest'], b'5 a.json\n{"a"}')
+    assert b'a.json: is not valid JSON' in direct[1]
+    assert client == direct
+
+
+def test_protocol(tmpdir, server):
+    '''the request is a JSON line followed by STDIN, the response frames of output and the exit code'''
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(server)
+    request = {'argv': ['--stdin', 'manifest'], 'cwd': str(tmpdir), 'env': {'HOME': str(tmpdir)}}
+    sock.sendall(json.dumps(request).encode('utf-8') + b'\n' + b'3 a.txt\na\tb')
+    sock.shutdown(socket.SHUT_WR)
+    responses = sock.makefile('rb')
+    frames = []
+    while True:
+        frame_type, length = struct.unpack('>cI', responses.read(5))
+        frames.append((frame_type, responses.read(length)))
+        if frame_type == b'x':
+            break
+    sock.close()
+    assert b''.join(data for frame_type, data in frames if frame_type == b'o') == b'a.txt: contains tabs\n'
+    assert frames[-1] == (b'x', struct.pack('>i', 1))
+
+
+@pytest.fixture
+def stale(tmpdir):
+    tmpdir.join('stale').write('')
+
+
+def test_stale_socket(tmpdir, stale, server):
+    direct, client = direct_and_client(tmpdir, server, ['--stdin', 'manifest'], b'3 a.txt\na\tb')
+    assert client == direct == (1, b'a.txt: contains tabs\n', b'')
+
+
+def test_already_running(server):
+    with pytest.raises(codevalidator.ExecutionError) as excinfo:
+        codevalidator.serve(server)
+    assert 'Server is already running on {0}'.format(server) in str(excinfo.value)
+    assert listening(server)
+
+
+def test_nailgun_servers_are_kept(tmpdir, nailgun, server):
+    tmpdir.join('A.java').write('class A {}\n')
+    env = dict(os.environ, HOME=str(tmpdir), CODEVALIDATOR_SOCKET=server)
+    client = [sys.executable, os.path.join(BASE_DIR, 'codevalidator_client.py'), str(tmpdir.join('A.java'))]
+    assert run(client, env) == (0, b'', b'')
+    # the configuration was loaded by the server
+    tmpdir.join('.codevalidatorrc').write('invalid')
+    assert run(client, env) == (0, b'', b'')
+    ports = tmpdir.join('ports').read().split()
+    assert len(ports) == 2 and ports[0] == ports[1]
+    pid, = [int(pid) for pid in tmpdir.join('started').read().split()]
+    os.kill(pid, 0)
@@ -0,0 +1,104 @@
+import io
+import os
+import subprocess
+import sys
+import tarfile
+
+import pytest
+
+import codevalidator
+
+FILES = [('a.txt', b'foo\n'), ('dir/b c.py', b'\x00\xff\nx = 1\n'), ('empty', b'')]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SVNLOOK = '''#!/bin/sh
+# "svnlook changed|cat -t TXN REPOS [FILE]" of a transaction changing the files in directory REPOS
+echo "$@" >> "$4/../calls"
+case "$1" in
+    changed) printf 'U   a.txt\\nA   dir/\\nA   dir/b.json\\nD   deleted.txt\\n' ;;
+    cat) cat "$4/$5" ;;
+    *) exit 1 ;;
+esac
+'''
+
+
+def test_manifest_round_trip():
+    manifest = b''.join(str(len(data)).encode() + b' ' + name.encode() + b'\n' + data for name, data in FILES)
+    sources = list(codevalidator.iter_manifest_sources(io.BytesIO(manifest)))
+    assert [(source.name, source.data) for source in sources] == FILES
+
+
+def test_truncated_manifest():
+    with pytest.raises(codevalidator.ExecutionError):
+        list(codevalidator.iter_manifest_sources(io.BytesIO(b'10 a.txt\nfoo')))
+
+
+@pytest.mark.parametrize('header', [b'abc foo.txt', b'3', b'3 ', b'-1 a.txt'])
+def test_invalid_manifest_header(header):
+    with pytest.raises(codevalidator.ExecutionError) as excinfo:
+        list(codevalidator.iter_manifest_sources(io.BytesIO(b'1 a.txt\na' + header + b'\nfoo')))
+    assert str(excinfo.value).endswith(': ' + header.decode())
+
+
+def test_invalid_manifest_exit_code(capsys, monkeypatch):
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(b'abc foo.txt\n')))
+    with pytest.raises(SystemExit) as excinfo:
+        codevalidator.main(['--stdin', 'manifest'])
+    assert excinfo.value.code == 2
+    assert 'Invalid manifest header' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('mode', ['w', 'w:gz'])
+def test_tar_round_trip(mode):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode=mode) as tar:
+        info = tarfile.TarInfo('dir')
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        for name, data in FILES:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    archive.seek(0)
+    sources = list(codevalidator.iter_tar_sources(archive))
+    assert [(source.name, source.data) for source in sources] == FILES
+
+
+@pytest.fixture
+def hook(tmpdir):
+    '''run the SVN pre-commit hook with a fake svnlook, returns (exit code, output, svnlook calls)'''
+
+    bin_dir = tmpdir.mkdir('bin')
+    bin_dir.join('svnlook').write(SVNLOOK)
+    bin_dir.join('svnlook').chmod(0o755)
+    bin_dir.join('codevalidator.py').write('#!/bin/sh\nexec {0} {1} "$@"\n'.format(
+        sys.executable, os.path.join(BASE_DIR, 'codevalidator.py')))
+    bin_dir.join('codevalidator.py').chmod(0o755)
+    repos = tmpdir.mkdir('repos')
+    repos.mkdir('dir')
+    env = dict(os.environ, SVNLOOK=str(bin_dir.join('svnlook')), HOME=str(tmpdir),
+               PATH=str(bin_dir) + os.pathsep + os.environ['PATH'])
+
+    def run(files):
+        for name, data in files.items():
+            repos.join(name).write_binary(data)
+        po = subprocess.Popen(['bash', os.path.join(BASE_DIR, 'tools', 'pre-commit-hook.sh'), str(repos), '1-1'],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+        output, stderr = po.communicate()
+        return po.returncode, stderr.decode('utf-8'), tmpdir.join('calls').read().splitlines()
+
+    return run
+
+
+def test_pre_commit_hook(hook):
+    returncode, output, calls = hook({'a.txt': b'foo\n', 'dir/b.json': b'{}\t\n'})
+    assert returncode == 2
+    assert 'dir/b.json: contains tabs' in output
+    assert 'a.txt' not in output
+    # the contents of each file are read once (the length is taken from them)
+    assert [call.split()[0] for call in calls] == ['changed', 'cat', 'cat']
+
+
+def test_pre_commit_hook_valid(hook):
+    assert hook({'a.txt': b'foo\n', 'dir/b.json': b'{}\n'})[:2] == (0, '')
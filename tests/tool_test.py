@@ -0,0 +1,68 @@
+import subprocess
+import time
+
+import pytest
+
+import codevalidator
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    rule_limits = {'*': {'timeout': 600}}
+    monkeypatch.setitem(codevalidator.CONFIG, 'rule_limits', rule_limits)
+    return rule_limits
+
+
+@pytest.fixture
+def popen_options(monkeypatch):
+    '''keyword arguments of the started processes'''
+
+    options = []
+    popen = subprocess.Popen
+
+    def record(*args, **kwargs):
+        options.append(kwargs)
+        return popen(*args, **kwargs)
+
+    monkeypatch.setattr(subprocess, 'Popen', record)
+    return options
+
+
+def test_run_tool(limits):
+    assert codevalidator.run_tool(['cat'], 'test', input=b'abc') == (0, b'abc', b'')
+    assert not codevalidator.RUNNING_TOOLS
+
+
+def test_timeout_kills_process_group(limits):
+    limits['test'] = {'timeout': 0.5}
+    start = time.time()
+    with pytest.raises(codevalidator.ToolTimeoutError) as excinfo:
+        # the background sleep keeps the output pipe open unless the process group is killed
+        codevalidator.run_tool(['sh', '-c', 'sleep 30 & sleep 30'], 'test')
+    assert time.time() - start < 10
+    assert 'sh killed after timeout of 0.5 seconds' in str(excinfo.value)
+
+
+def test_preexec_fn_only_for_resource_limits(limits, popen_options):
+    codevalidator.run_tool(['true'], 'test')
+    assert 'preexec_fn' not in popen_options[-1] or not codevalidator.running_on_py3
+    limits['test'] = {'memory': 1024 ** 3, 'cpu': 60}
+    returncode, output, stderr = codevalidator.run_tool(['sh', '-c', 'ulimit -v; ulimit -t'], 'test')
+    assert 'preexec_fn' in popen_options[-1]
+    assert output.split() == [b'1048576', b'60']
+
+
+def test_keyboard_interrupt_kills_tool(limits, monkeypatch):
+    started = []
+
+    class InterruptedPopen(subprocess.Popen):
+
+        def communicate(self, input=None):
+            started.append(self)
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(subprocess, 'Popen', InterruptedPopen)
+    with pytest.raises(KeyboardInterrupt):
+        codevalidator.run_tool(['sleep', '30'], 'test')
+    assert started[0].poll() is not None
+    assert not codevalidator.RUNNING_TOOLS
@@ -0,0 +1,17 @@
+import sys
+
+import codevalidator
+
+
+def test_missing_yaml_is_not_cached(tmpdir, monkeypatch):
+    monkeypatch.setitem(codevalidator.CONFIG, 'cache_dir', str(tmpdir.join('cache')))
+    monkeypatch.setattr(codevalidator, 'RESULT_CACHE', None)
+    # importing a module set to None in sys.modules raises ImportError
+    monkeypatch.setitem(sys.modules, 'yaml', None)
+    path = tmpdir.join('a.yaml')
+    path.write('a: b\n')
+    with codevalidator.collect_results() as result:
+        codevalidator.validate_file_with_rules(str(path), ['yaml'])
+    assert result.incomplete
+    assert result.messages[0].startswith('{0}: ERROR validating yaml: '.format(path))
+    assert not tmpdir.join('cache').check()
@@ -1,11 +1,14 @@
 #!/bin/bash
 # codevalidator.py SVN pre-commit hook (move this file to svnrepo/hooks/pre-commit)
 # codevalidator.py must be in PATH!
+#
+# The changed files are streamed from the transaction into a single codevalidator.py process
+# (see --stdin manifest), each file is read once into a temporary file to get its length.
 
 REPOS="$1"
 TXN="$2"
 
-SVNLOOK=/usr/bin/svnlook
+SVNLOOK=${SVNLOOK:-/usr/bin/svnlook}
 
 FILES=`$SVNLOOK changed -t "$TXN" "$REPOS" | grep -E '^(U|A)' | cut -b5- | grep -vE '/$'`
 
@@ -13,26 +16,18 @@ if [ -z "${FILES}" ]; then
     exit 0
 fi
 
-tmpdir=`mktemp -d /tmp/codevalidator.XXXXX`
-tmpnam_prefix="$tmpdir/"
+CONTENTS=`mktemp` || exit 1
+trap 'rm -f "${CONTENTS}"' EXIT
 
-cv_files=""
-for FILE in ${FILES}; do
-    tmpnam_src="${tmpnam_prefix}${FILE}"
-    dir=`dirname "$tmpnam_src"`
-    mkdir -p "$dir"
-    $SVNLOOK cat -t "$TXN" "$REPOS" "${FILE}" >"${tmpnam_src}"
-    cv_files="${cv_files} ${tmpnam_src}"
-done;
+# manifest: "<length> <path>" line followed by the file contents for each file
+messages=`echo "${FILES}" | while IFS= read -r FILE; do
+    $SVNLOOK cat -t "$TXN" "$REPOS" "${FILE}" > "${CONTENTS}"
+    echo "$(( $(wc -c < "${CONTENTS}") )) ${FILE}"
+    cat "${CONTENTS}"
+done | codevalidator.py -v --stdin manifest 2>&1`
 
-if [ -z "${cv_files}" ]; then
-    exit 0
-fi
-
-if (! codevalidator.py -v ${cv_files} >"${tmpnam_prefix}messages") then
+if [ $? -ne 0 ]; then
     echo "codevalidator.py found validation errors:" 1>&2
-    cat "${tmpnam_prefix}messages" | sed "s,${tmpnam_prefix},," 1>&2
-    rm -rf $tmpdir
+    echo "${messages}" 1>&2
     exit 2
 fi
-rm -rf $tmpdir